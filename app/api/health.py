@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from .routes import services
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz() -> JSONResponse:
+    """存活探针：进程能响应即为健康；初始化彻底失败时返回 503，交给编排系统重启。"""
+    return JSONResponse(services.status(), status_code=503 if services.failed else 200)
+
+
+@router.get("/readyz")
+async def readyz() -> JSONResponse:
+    """就绪探针：模型加载、连接与预热完成前返回 503，负载均衡不会把请求转发过来。"""
+    return JSONResponse(services.status(), status_code=200 if services.ready else 503)
+
+
+__all__ = ["router"]
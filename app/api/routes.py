@@ -1,42 +1,70 @@
 from __future__ import annotations
 import os
+import json
 import logging
-from typing import List
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, TypeVar
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 from ..models.api import ChatRequest, ChatResponse, CollectionList, DocumentCitation, ModelList, ModelInfo
+from ..services.catalog import CollectionCatalog
 from ..services.chat_history import ChatSessionManager
-from ..services.rag import RAGService
+from ..services.lifecycle import ServiceLifecycle, ServiceNotReady
+from ..services.metrics import metrics
+
+if TYPE_CHECKING:
+    from ..services.rag import RAGService
 
 logger = logging.getLogger(__name__)
 
 
 router = APIRouter()
-rag_service = RAGService()
-chat_sessions = ChatSessionManager()
+# RAGService、会话存储与集合目录由应用 lifespan 在后台线程中创建，见 app/main.py
+services = ServiceLifecycle()
+T = TypeVar("T")
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(payload: ChatRequest) -> ChatResponse:
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+time_to_first_token = metrics.histogram("chat_time_to_first_token_seconds", TTFT_BUCKETS)
+
+
+def _require(getter: Callable[[], T]) -> T:
+    try:
+        return getter()
+    except ServiceNotReady as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "5"}) from exc
+
+
+def _rag_service() -> "RAGService":
+    return _require(services.rag)
+
+
+def _chat_sessions() -> ChatSessionManager:
+    return _require(services.chat_sessions)
+
+
+def _catalog() -> CollectionCatalog:
+    return _require(services.catalog)
+
+
+async def _resolve_collection(
+    rag_service: "RAGService", chat_sessions: ChatSessionManager, payload: ChatRequest
+) -> str:
     requested_collection = payload.collection
     active_collection = (
         requested_collection
-        or chat_sessions.get_collection(payload.session_id)
+        or await chat_sessions.aget_collection(payload.session_id)
         or rag_service.vector_store.collection_name
     )
-    chat_sessions.set_collection(payload.session_id, active_collection)
+    await chat_sessions.aset_collection(payload.session_id, active_collection)
+    return active_collection
 
-    history = chat_sessions.get_history(payload.session_id)
-    documents = rag_service.retrieve(
-        payload.query,
-        top_k=payload.top_k,
-        collection_name=active_collection,
-    )
-    answer = rag_service.generate(payload.query, documents, history, payload.model_name)
-    chat_sessions.append(payload.session_id, payload.query, answer)
 
-    citations: List[DocumentCitation] = [
+def _build_citations(documents: List[Dict[str, Any]]) -> List[DocumentCitation]:
+    return [
         DocumentCitation(
             book_title=doc["book_title"],
             chapter_title=doc["chapter_title"],
@@ -47,6 +75,8 @@ async def chat_endpoint(payload: ChatRequest) -> ChatResponse:
         for doc in documents
     ]
 
+
+def _log_interaction(payload: ChatRequest, active_collection: str, answer: str) -> None:
     logger.info(
         "Session %s | Collection %s | Model %s | User: %s | Answer length: %s | TOP_k: %s",
         payload.session_id,
@@ -57,23 +87,129 @@ async def chat_endpoint(payload: ChatRequest) -> ChatResponse:
         payload.top_k
     )
 
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(payload: ChatRequest) -> ChatResponse:
+    started = time.perf_counter()
+    rag_service = _rag_service()
+    chat_sessions = _chat_sessions()
+    active_collection = await _resolve_collection(rag_service, chat_sessions, payload)
+
+    history = await chat_sessions.aget_history(payload.session_id)
+    # 只有无历史上下文的提问才使用语义答案缓存，避免多轮对话串味
+    embedding, cached, documents = await rag_service.aprepare_context(
+        payload.query, payload.top_k, active_collection, not history, payload.model_name, payload.book_title
+    )
+    if cached is not None:
+        answer = cached.answer
+    else:
+        answer = await rag_service.agenerate(payload.query, documents, history, payload.model_name)
+        if not history and embedding is not None:
+            await rag_service.astore_answer(
+                embedding,
+                active_collection,
+                payload.model_name,
+                payload.top_k,
+                answer,
+                documents,
+                time.perf_counter() - started,
+                payload.book_title,
+            )
+    await chat_sessions.aappend(payload.session_id, payload.query, answer)
+
+    citations = _build_citations(documents)
+    _log_interaction(payload, active_collection, answer)
+
     return ChatResponse(answer=answer, citations=citations)
 
 
+@router.post("/chat/stream")
+async def chat_stream_endpoint(payload: ChatRequest) -> StreamingResponse:
+    """
+    以 SSE 流式返回回答：先发送 citations 事件，再逐段发送 token 事件，
+    结束时发送 done 事件（包含完整回答），并写入会话历史与日志。
+    """
+    started = time.perf_counter()
+    rag_service = _rag_service()
+    chat_sessions = _chat_sessions()
+    active_collection = await _resolve_collection(rag_service, chat_sessions, payload)
+
+    history = await chat_sessions.aget_history(payload.session_id)
+    embedding, cached, documents = await rag_service.aprepare_context(
+        payload.query, payload.top_k, active_collection, not history, payload.model_name, payload.book_title
+    )
+    citations = _build_citations(documents)
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse("citations", {"citations": [citation.model_dump() for citation in citations]})
+
+        if cached is not None:
+            answer = cached.answer
+            time_to_first_token.observe(time.perf_counter() - started)
+            yield _sse("token", {"delta": answer})
+        else:
+            fragments: List[str] = []
+            try:
+                async for delta in rag_service.astream_generate(payload.query, documents, history, payload.model_name):
+                    if not fragments:
+                        time_to_first_token.observe(time.perf_counter() - started)
+                    fragments.append(delta)
+                    yield _sse("token", {"delta": delta})
+            except Exception:
+                logger.exception("Streaming generation failed for session %s", payload.session_id)
+                yield _sse("error", {"message": "生成回答时出错"})
+                return
+
+            answer = "".join(fragments).strip()
+            if not answer:
+                from ..services.rag import FALLBACK_ANSWER
+
+                logger.warning("Empty streamed response from LLM, returning fallback message")
+                answer = FALLBACK_ANSWER
+                yield _sse("token", {"delta": answer})
+            if not history and embedding is not None:
+                await rag_service.astore_answer(
+                    embedding,
+                    active_collection,
+                    payload.model_name,
+                    payload.top_k,
+                    answer,
+                    documents,
+                    time.perf_counter() - started,
+                    payload.book_title,
+                )
+        await chat_sessions.aappend(payload.session_id, payload.query, answer)
+        _log_interaction(payload, active_collection, answer)
+        yield _sse("done", {"answer": answer})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/collections", response_model=CollectionList)
 async def list_collections() -> CollectionList:
-    collections = []
-    for name in rag_service.vector_store.list_collections():
-        try:
-            novels = rag_service.vector_store.list_books(name)
-        except Exception as exc:  # pragma: no cover - defensive logging
-            logger.warning("Failed to read books from collection %s: %s", name, exc)
-            novels = []
-        collections.append({"name": name, "novels": novels})
-
+    rag_service = _rag_service()
+    # Milvus 客户端是同步的，放到线程池里执行，避免阻塞事件循环
+    collections = await run_in_threadpool(_collect_collections, rag_service, _catalog())
     return CollectionList(collections=collections, active_collection=rag_service.vector_store.collection_name)
 
 
+def _collect_collections(rag_service: "RAGService", catalog: CollectionCatalog) -> List[Dict[str, Any]]:
+    # 书目来自上传时维护的目录，只有目录中没有的集合才会扫描一次向量库
+    overview = catalog.overview(rag_service.vector_store)
+    return [
+        {"name": name, "novels": [book.book_title for book in books]}
+        for name, books in overview.items()
+    ]
+
+
 @router.get("/models", response_model=ModelList)
 async def list_models() -> ModelList:
     """
@@ -98,4 +234,11 @@ async def list_models() -> ModelList:
         active_model=default_model,
     )
 
-__all__ = ["router"]
+
+@router.get("/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    """返回进程内的运行指标（如查询 embedding 合批大小分布），用于调参。"""
+    return metrics.snapshot()
+
+
+__all__ = ["router", "services"]
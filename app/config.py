@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -8,6 +8,23 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
+    # Vector store backend
+    vector_store_backend: str = Field("milvus", description="Vector store backend: 'milvus' or 'local' (in-process NumPy index)")
+    local_vector_dir: Path = Field(Path("data/vector_store"), description="Directory holding collections of the local vector store")
+    vector_storage_dtype: str = Field("float32", description="Milvus vector type of new collections: float32, float16 or bfloat16")
+    vector_truncate_dim: int = Field(0, description="Store only the first N embedding dimensions, renormalized (Matryoshka; 0 = full dimension)")
+    local_vector_dtype: str = Field("float32", description="Storage dtype of local vectors: float32 or float16")
+    local_vector_index: str = Field("flat", description="Local index type: 'flat' (exact) or 'ivf' (partitioned)")
+    local_ivf_nlist: int = Field(256, description="Number of IVF partitions of the local index")
+    local_ivf_nprobe: int = Field(16, description="IVF partitions scanned per local search")
+
+    # Retrieval configuration
+    retrieval_mode: str = Field("vector", description="Retrieval mode: 'vector' or 'hybrid' (BM25 bigram index fused with vectors)")
+    lexical_index_dir: Path = Field(Path("data/lexical_index"), description="Directory of the per-collection bigram BM25 indexes")
+    lexical_confident_max_terms: int = Field(6, description="Longest query (in bigrams) that may be answered by the lexical index alone")
+    lexical_confident_min_hits: int = Field(3, description="Chunks that must contain every query bigram before embedding is skipped")
+    rrf_k: int = Field(60, description="Rank offset used by reciprocal rank fusion")
+
     # Milvus configuration
     milvus_uri: str = Field("http://localhost:19530", description="Milvus URI, e.g. http://localhost:19530")
     milvus_token: Optional[str] = Field(None, description="Milvus token or API key if authentication is enabled")
@@ -15,12 +32,47 @@ class Settings(BaseSettings):
     milvus_database: str = Field("default", description="Milvus database name")
     milvus_consistency_level: str = Field("Bounded", description="Milvus consistency level")
     milvus_metric_type: str = Field("COSINE", description="Vector similarity metric type")
+    milvus_search_workers: int = Field(8, description="Size of the thread pool that runs blocking Milvus searches")
+    milvus_write_buffer_rows: int = Field(5000, description="Rows buffered per collection before a background insert is sent")
+    milvus_write_buffer_seconds: float = Field(2.0, description="Maximum age of buffered rows before they are sent anyway")
+    milvus_index_type: str = Field("IVF_FLAT", description="ANN index of new collections: FLAT, IVF_FLAT, IVF_SQ8, IVF_PQ, HNSW, DISKANN or AUTOINDEX")
+    milvus_index_params: Optional[Dict[str, Any]] = Field(None, description="Index build parameters as JSON, e.g. {\"nlist\": 1024} (default: per index type)")
+    milvus_search_params: Optional[Dict[str, Any]] = Field(None, description="Search parameters as JSON, e.g. {\"nprobe\": 32} or {\"ef\": 64} (default: per index type)")
+    index_profiles_path: Path = Field(Path("data/index_profiles.json"), description="Per-collection index profiles written on creation and by scripts/tune_index.py")
+    milvus_partition_key: bool = Field(False, description="Create new collections with book_title as partition key instead of one collection per book")
+    milvus_num_partitions: int = Field(64, description="Partitions of partition-key collections")
+    milvus_max_loaded_collections: int = Field(0, description="Collections kept loaded at once; least recently used ones are released (0 = unlimited)")
+    milvus_loaded_memory_mb: int = Field(0, description="Query node memory budget for loaded collections in MB (0 = unlimited)")
+    milvus_writes_in_flight: int = Field(2, description="Concurrent background inserts per collection during ingestion")
 
     # Embedding configuration
     embedding_model_path: Path = Field(Path("./models/qwen"), description="Local path to the Qwen embedding model directory")
     embedding_dim: int = Field(1536, description="Embedding dimension for the chosen model")
     chunk_size: int = Field(800, description="Number of characters per chunk inside a chapter")
     chunk_overlap: int = Field(120, description="Number of overlapping characters between chunks")
+    embedding_batch_size: int = Field(32, description="Number of texts per padded forward pass when embedding")
+    embedding_max_length: int = Field(2048, description="Maximum number of tokens per text fed to the embedding model")
+
+    embedding_workers: int = Field(0, description="Embedding worker processes used for bulk ingestion (0 = in-process)")
+    embedding_threads_per_worker: Optional[int] = Field(None, description="Intra-op threads per embedding worker (default: cores / workers)")
+    embedding_backend: str = Field("torch", description="Embedding inference backend: torch (fp32), int8 (dynamic quantization), bf16 (autocast) or onnx (ONNX Runtime)")
+    embedding_threads: Optional[int] = Field(None, description="Intra-op threads of the in-process embedding model (default: PyTorch's choice)")
+    embedding_onnx_dir: Path = Field(Path("data/embedding_onnx"), description="Directory where the onnx backend exports the embedding model")
+    embedding_parity_threshold: float = Field(0.99, description="Minimum cosine similarity to the fp32 vectors a non-fp32 backend must reach, else fp32 is used")
+    embedding_server_url: Optional[str] = Field(None, description="Shared embedding server used by API workers: unix:///path/to.sock or http://127.0.0.1:PORT (unset = load the model in-process)")
+    embedding_server_timeout_seconds: float = Field(30.0, description="Timeout of one request to the embedding server")
+    embedding_server_wait_seconds: float = Field(120.0, description="How long a starting worker waits for the embedding server to come up")
+    embedding_server_fallback: bool = Field(True, description="Load the model in-process when the embedding server is unreachable")
+    embedding_server_retry_seconds: float = Field(30.0, description="After a failure, use the in-process model this long before trying the server again")
+    chunk_cache_dir: Path = Field(Path("data/embedding_cache"), description="Directory of the content-addressed chunk embedding cache")
+    chunk_cache_max_entries: int = Field(2_000_000, description="Maximum number of cached chunk vectors (0 = unbounded)")
+    catalog_path: Path = Field(Path("data/catalog.sqlite3"), description="SQLite catalog of collections, books and chunk counts maintained by ingestion")
+    ingest_checkpoint_dir: Path = Field(Path("data/ingest_checkpoints"), description="Directory of per-book upload checkpoints used to resume interrupted ingestion")
+    query_batch_window_ms: float = Field(5.0, description="How long the query embedder waits to coalesce concurrent queries")
+    query_batch_max_size: int = Field(16, description="Maximum number of queries embedded in one coalesced batch")
+    query_cache_max_entries: int = Field(4096, description="Query vectors kept in the in-memory LRU cache (0 disables it)")
+    query_cache_ttl_seconds: float = Field(86400.0, description="Lifetime of cached query vectors in seconds (0 = no expiry)")
+    query_cache_path: Optional[Path] = Field(None, description="Optional SQLite file that persists query vectors across restarts")
 
     TOP_K: int = Field(10, description="query chunk to return")
     # LLM configuration
@@ -29,10 +81,33 @@ class Settings(BaseSettings):
     llm_api_key: str = Field("changeme", description="API key for the chat completion endpoint")
     llm_temperature: float = Field(0.3, description="Sampling temperature for the chat model")
     llm_max_tokens: int = Field(512, description="Maximum tokens to generate per response")
+    llm_timeout_seconds: float = Field(120.0, description="Timeout for a single LLM request")
+    llm_max_connections: int = Field(100, description="Maximum concurrent connections in the shared LLM HTTP pool")
+    llm_max_keepalive_connections: int = Field(20, description="Idle keep-alive connections kept in the LLM HTTP pool")
+
+    answer_cache_threshold: float = Field(0.95, description="Cosine similarity required to reuse a cached answer")
+    answer_cache_max_entries: int = Field(1024, description="Answers kept in the semantic answer cache (0 disables it)")
+    answer_cache_ttl_seconds: float = Field(3600.0, description="Lifetime of cached answers in seconds (0 = no expiry)")
+    answer_cache_version_ttl_seconds: float = Field(5.0, description="Seconds a collection's catalog version is reused before it is read again")
+
+    context_token_budget: int = Field(3000, description="Maximum prompt tokens spent on retrieved passages (0 = unlimited)")
+    context_tokenizer: Optional[str] = Field(None, description="Tokenizer name or path used to count context tokens (default: the embedding model)")
+    context_min_relative_score: float = Field(0.0, description="Drop chunks scoring below this fraction of the best hit (0 disables)")
+    context_score_gap: float = Field(0.3, description="Cut the ranking where relative score drops by more than this between neighbours (0 disables)")
+    context_min_documents: int = Field(3, description="Chunks always kept before score cutoffs apply")
 
     # Logging and service configuration
     log_directory: Path = Field(Path("logs"), description="Directory where interaction logs will be written")
     max_history_turns: int = Field(6, description="Maximum number of history turns to keep per session")
+    session_backend: str = Field("memory", description="Chat session store: memory (per worker), sqlite (shared on one host) or redis (shared across hosts)")
+    session_max_entries: int = Field(10000, description="Sessions kept before the least recently used are evicted (memory / sqlite; 0 = unlimited)")
+    session_max_memory_mb: float = Field(64.0, description="Memory cap of the in-memory session store in MB (0 = unlimited)")
+    session_ttl_seconds: float = Field(86400.0, description="Sessions idle for longer than this are dropped (0 = no expiry)")
+    session_sqlite_path: Path = Field(Path("data/sessions.sqlite3"), description="SQLite file of the sqlite session backend")
+    session_redis_url: str = Field("redis://127.0.0.1:6379/0", description="Redis-protocol server of the redis session backend")
+    session_key_prefix: str = Field("chat:session:", description="Key prefix of sessions stored in Redis")
+    startup_background_init: bool = Field(True, description="Load models and connect to the vector store in the background after the app starts (False: block startup until ready)")
+    startup_warmup: bool = Field(True, description="Run a warm-up query (embedding, context tokenizer, default collection search) before reporting ready")
 
 
 settings = Settings()
@@ -1,11 +1,26 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .api.routes import router as api_router
+from .api.health import router as health_router
+from .api.routes import router as api_router, services
+from .config import settings
 from .logger import configure_logging
 
-app = FastAPI(title="Novel RAG Service", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # 模型与向量库在后台初始化，服务先开始监听；/readyz 在就绪后才返回 200
+    services.start()
+    if not settings.startup_background_init:
+        await services.await_ready()
+    yield
+    await services.aclose()
+
+
+app = FastAPI(title="Novel RAG Service", version="0.1.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],      # 开发环境直接全放开
@@ -15,6 +30,7 @@ app.add_middleware(
 )
 configure_logging()
 app.include_router(api_router, prefix="/api")
+app.include_router(health_router)
 
 
 __all__ = ["app"]
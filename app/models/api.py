@@ -10,6 +10,8 @@ class NovelUploadResult(BaseModel):
     file_path: str
     file_hash: str
     chunks_indexed: int
+    chunks_reused: int = 0
+    chunks_deleted: int = 0
     skipped: bool = False
 
 
@@ -26,6 +28,10 @@ class ChatRequest(BaseModel):
         None,
         description="LLM model name selected from UI"
     )
+    book_title: Optional[str] = Field(
+        None,
+        description="Optional book title; restricts retrieval to that book of the collection.",
+    )
 
 
 class ModelInfo(BaseModel):
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+BucketKey = Tuple[str, str, int, str]
+
+
+@dataclass
+class CachedAnswer:
+    bucket: BucketKey
+    vector: np.ndarray
+    answer: str
+    documents: List[Dict[str, Any]]
+    created_at: float
+    generation_seconds: float
+    version: Optional[Hashable]
+
+
+class SemanticAnswerCache:
+    """Reuse answers for paraphrased questions against the same collection.
+
+    Entries are grouped by ``(collection, model_name, top_k, book_title)``. A lookup hits
+    when the cosine similarity between the new query vector and a cached one
+    reaches ``threshold``. Entries are evicted least-recently-used beyond
+    ``max_entries``, expire after ``ttl_seconds`` and are dropped when their
+    collection receives new records. ``version_fn`` (optional) returns a
+    collection fingerprint, such as the catalog's :meth:`version`; a hit whose
+    fingerprint changed since it was stored is discarded, which also catches
+    writes and deletes made by other processes such as the upload script.
+    Fingerprints are reused for ``version_ttl_seconds``, so a hit does not pay
+    for a lookup each time; a change made by another process can therefore be
+    missed for up to that long after it is recorded.
+    """
+
+    def __init__(
+        self,
+        threshold: float | None = None,
+        max_entries: int | None = None,
+        ttl_seconds: float | None = None,
+        version_fn: Callable[[str], Optional[Hashable]] | None = None,
+        version_ttl_seconds: float | None = None,
+    ) -> None:
+        self.threshold = threshold if threshold is not None else settings.answer_cache_threshold
+        self.max_entries = max(0, max_entries if max_entries is not None else settings.answer_cache_max_entries)
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.answer_cache_ttl_seconds
+        self.version_fn = version_fn
+        self.version_ttl = (
+            version_ttl_seconds if version_ttl_seconds is not None else settings.answer_cache_version_ttl_seconds
+        )
+        # collection -> (过期时间, 版本)；命中时不必每次都去读版本
+        self._versions: Dict[str, Tuple[float, Optional[Hashable]]] = {}
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._buckets: Dict[BucketKey, List[int]] = {}
+        self._matrices: Dict[BucketKey, np.ndarray] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm > 0 else array
+
+    def _version(self, collection: str) -> Optional[Hashable]:
+        if self.version_fn is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(collection)
+            if cached is not None and now < cached[0]:
+                return cached[1]
+        try:
+            version = self.version_fn(collection)
+        except Exception as exc:  # pragma: no cover - treat as unknown version
+            logger.warning("Failed to read version of collection %s: %s", collection, exc)
+            return None
+        with self._lock:
+            self._versions[collection] = (now + self.version_ttl, version)
+        return version
+
+    def lookup(
+        self,
+        vector: Sequence[float],
+        collection: str,
+        model_name: str,
+        top_k: int,
+        book_title: Optional[str] = None,
+    ) -> Optional[CachedAnswer]:
+        if not self.max_entries:
+            return None
+        bucket = (collection, model_name, top_k, book_title or "")
+        query = self._normalize(vector)
+        with self._lock:
+            ids = self._buckets.get(bucket)
+            if not ids:
+                self.misses += 1
+                return None
+            matrix = self._matrices.get(bucket)
+            if matrix is None:
+                matrix = np.stack([self._entries[entry_id].vector for entry_id in ids])
+                self._matrices[bucket] = matrix
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            entry_id = ids[best]
+            entry = self._entries[entry_id]
+            if float(scores[best]) < self.threshold:
+                self.misses += 1
+                return None
+            if self.ttl and time.time() - entry.created_at > self.ttl:
+                self._remove(entry_id)
+                self.misses += 1
+                return None
+
+        # 版本过期后需要重新读取，放在锁外执行
+        if entry.version is not None and self._version(collection) != entry.version:
+            with self._lock:
+                if entry_id in self._entries:
+                    self._remove(entry_id)
+                self.invalidations += 1
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if entry_id in self._entries:
+                self._entries.move_to_end(entry_id)
+            self.hits += 1
+            self.latency_saved += entry.generation_seconds
+        return entry
+
+    def store(
+        self,
+        vector: Sequence[float],
+        collection: str,
+        model_name: str,
+        top_k: int,
+        answer: str,
+        documents: List[Dict[str, Any]],
+        generation_seconds: float,
+        book_title: Optional[str] = None,
+    ) -> None:
+        if not self.max_entries:
+            return
+        bucket = (collection, model_name, top_k, book_title or "")
+        entry = CachedAnswer(
+            bucket=bucket,
+            vector=self._normalize(vector),
+            answer=answer,
+            documents=documents,
+            created_at=time.time(),
+            generation_seconds=generation_seconds,
+            version=self._version(collection),
+        )
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = entry
+            self._buckets.setdefault(bucket, []).append(entry_id)
+            self._matrices.pop(bucket, None)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_collection(self, collection: str) -> None:
+        with self._lock:
+            self._versions.pop(collection, None)
+            stale = [entry_id for entry_id, entry in self._entries.items() if entry.bucket[0] == collection]
+            for entry_id in stale:
+                self._remove(entry_id)
+            if stale:
+                self.invalidations += len(stale)
+                logger.info("Dropped %d cached answers for collection %s", len(stale), collection)
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._buckets.get(entry.bucket)
+        if ids is not None:
+            ids.remove(entry_id)
+            if not ids:
+                del self._buckets[entry.bucket]
+        self._matrices.pop(entry.bucket, None)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "latency_saved_seconds": self.latency_saved,
+            }
+
+
+__all__ = ["CachedAnswer", "SemanticAnswerCache"]
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from pymilvus import DataType, utility
+
+from .vector_store import MilvusVectorStore, VectorRecord
+
+logger = logging.getLogger(__name__)
+
+_FINAL_STATES = {"Completed", "Failed", "ImportCompleted", "ImportFailed", "ImportFailedAndCleaned"}
+SUCCESS_STATES = {"Completed", "ImportCompleted"}
+# 导入成功的文件移到集合目录下的这个子目录，再次提交时不会重复导入（批量导入不是 upsert）
+IMPORTED_DIR = "imported"
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("Bulk import mode requires pyarrow: pip install pyarrow") from exc
+    return pyarrow
+
+
+class ParquetBulkWriter:
+    """Write records as Parquet files for Milvus bulk insert instead of inserting rows.
+
+    Offers the same ``add`` / ``drain`` / ``flush`` / ``close`` surface as
+    :class:`~app.services.vector_store.BufferedWriter`, but files are only cut
+    by size or on ``drain`` / ``close``. Files land in
+    ``directory/<collection>/`` and must be copied to the object storage
+    bucket used by Milvus before they are submitted with :func:`submit_files`.
+    File names carry the run's start time, so a new run never reuses the
+    name of a part written (or already imported) by an earlier one.
+    """
+
+    def __init__(
+        self,
+        store: MilvusVectorStore,
+        collection_name: str,
+        directory: Path,
+        rows_per_file: int = 200_000,
+    ) -> None:
+        pa = _arrow()
+        self.store = store
+        self.collection_name = collection_name
+        self.directory = Path(directory) / collection_name
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rows_per_file = max(1, rows_per_file)
+        self.files: List[Path] = []
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, object]] = []
+        self._waiters: List[Future] = []
+        self._run = time.strftime("%Y%m%d-%H%M%S")
+        self._part = 0
+
+        types = {
+            DataType.INT64: pa.int64(),
+            DataType.VARCHAR: pa.string(),
+            DataType.FLOAT_VECTOR: pa.list_(pa.float32()),
+        }
+        fields = []
+        for field in store._schema(collection_name).fields:
+            if field.is_primary and field.auto_id:
+                continue
+            if field.dtype not in types:
+                raise ValueError(
+                    f"Bulk import does not support {field.dtype.name} field {field.name} of {collection_name}; "
+                    "upload float16/bfloat16 collections without --bulk_import"
+                )
+            fields.append(pa.field(field.name, types[field.dtype]))
+        self.schema = pa.schema(fields)
+
+    def add(self, records: Sequence[VectorRecord]) -> Future:
+        done: Future = Future()
+        with self._lock:
+            self._rows.extend(self.store._rows(records, self.collection_name))
+            self._waiters.append(done)
+            if len(self._rows) >= self.rows_per_file:
+                self._write_file_locked()
+        return done
+
+    def _write_file_locked(self) -> None:
+        if not self._rows:
+            return
+        pa = _arrow()
+        columns = {field.name: [row.get(field.name) for row in self._rows] for field in self.schema}
+        table = pa.Table.from_pydict(columns, schema=self.schema)
+        path = self.directory / f"part-{self._run}-{self._part:05d}.parquet"
+        pa.parquet.write_table(table, path)
+        self._part += 1
+        self.files.append(path)
+        logger.info("Wrote %d rows to %s", len(self._rows), path)
+        for waiter in self._waiters:
+            waiter.set_result(len(self._rows))
+        self._rows, self._waiters = [], []
+
+    def drain(self) -> None:
+        with self._lock:
+            self._write_file_locked()
+
+    def flush(self) -> None:
+        # 批量导入的数据要等提交导入任务后才可见，这里不必按书切文件
+        pass
+
+    def close(self, flush: bool = True) -> None:
+        if flush:
+            self.drain()
+
+
+def submit_files(collection_name: str, remote_paths: Sequence[str], poll_interval: float = 5.0) -> Dict[str, str]:
+    """Submit Parquet files (paths inside the Milvus bucket) and wait for each import task."""
+    tasks = {path: utility.do_bulk_insert(collection_name=collection_name, files=[path]) for path in remote_paths}
+    states: Dict[str, str] = {}
+    while len(states) < len(tasks):
+        for path, task_id in tasks.items():
+            if path in states:
+                continue
+            state = utility.get_bulk_insert_state(task_id)
+            if state.state_name in _FINAL_STATES:
+                states[path] = state.state_name
+                logger.info("Bulk import %s -> %s: %s (%d rows)", path, collection_name, state.state_name, state.row_count)
+                if state.failed_reason:
+                    logger.error("Bulk import %s failed: %s", path, state.failed_reason)
+        if len(states) < len(tasks):
+            time.sleep(poll_interval)
+    return states
+
+
+__all__ = ["IMPORTED_DIR", "ParquetBulkWriter", "SUCCESS_STATES", "submit_files"]
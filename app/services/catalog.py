@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+from ..config import settings
+
+if TYPE_CHECKING:
+    from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BookEntry:
+    book_title: str
+    chunk_count: int
+    file_hash: str
+    source_path: str = ""
+    updated_at: float = 0.0
+
+
+class CollectionCatalog:
+    """SQLite record of collection -> books -> chunk counts, kept up to date by ingestion.
+
+    Listing collections used to query every collection for its book titles;
+    the catalog answers that from one local table. Collections the catalog
+    has never seen (created by another tool, or before the catalog existed)
+    are scanned once by :meth:`overview` and recorded, and
+    ``scripts/reconcile_catalog.py`` rebuilds everything from the store.
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path or settings.catalog_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS collections (name TEXT PRIMARY KEY, reconciled_at REAL NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS books ("
+            "collection TEXT NOT NULL, book_title TEXT NOT NULL, chunk_count INTEGER NOT NULL, "
+            "file_hash TEXT NOT NULL, source_path TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (collection, book_title))"
+        )
+        self._db.commit()
+
+    # ------------------------------------------------------------------ writes
+    def record_book(
+        self,
+        collection_name: str,
+        book_title: str,
+        chunk_count: int,
+        file_hash: str,
+        source_path: str = "",
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO collections (name, reconciled_at) VALUES (?, ?)", (collection_name, time.time())
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO books (collection, book_title, chunk_count, file_hash, source_path, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (collection_name, book_title, chunk_count, file_hash, source_path, time.time()),
+            )
+            self._db.commit()
+
+    def remove_collection(self, collection_name: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM books WHERE collection = ?", (collection_name,))
+            self._db.execute("DELETE FROM collections WHERE name = ?", (collection_name,))
+            self._db.commit()
+
+    def reconcile(self, store: VectorStore, collection_name: str) -> int:
+        """Replace the catalog entry of one collection with a full scan of the store; returns the book count."""
+        started = time.perf_counter()
+        stats = store.book_stats(collection_name)
+        now = time.time()
+        rows = [
+            # 增量更新后一本书的分片可能来自多个文件版本，记录分片最多的那个
+            (collection_name, title, sum(files.values()), max(files, key=files.get), "", now)
+            for title, files in stats.items()
+            if title
+        ]
+        with self._lock:
+            self._db.execute("DELETE FROM books WHERE collection = ?", (collection_name,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO collections (name, reconciled_at) VALUES (?, ?)", (collection_name, now)
+            )
+            self._db.executemany(
+                "INSERT INTO books (collection, book_title, chunk_count, file_hash, source_path, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+        logger.info(
+            "目录已从存储重建集合 %s：%d 本，%d 个分片，用时 %.2fs",
+            collection_name,
+            len(rows),
+            sum(row[2] for row in rows),
+            time.perf_counter() - started,
+        )
+        return len(rows)
+
+    # ------------------------------------------------------------------- reads
+    def version(self, collection_name: str) -> Tuple[int, float, int]:
+        """Fingerprint of a collection's books that changes whenever ingestion records, replaces or removes one.
+
+        Every ``record_book`` stamps a new ``updated_at``, so a re-uploaded or
+        incrementally updated book changes the fingerprint even when its
+        chunk count stays the same.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*), COALESCE(MAX(updated_at), 0), COALESCE(SUM(chunk_count), 0) FROM books "
+                "WHERE collection = ?",
+                (collection_name,),
+            ).fetchone()
+        return tuple(row)
+
+    def collection_names(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT name FROM collections ORDER BY name")]
+
+    def books(self, collection_name: str) -> List[BookEntry]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT book_title, chunk_count, file_hash, source_path, updated_at FROM books "
+                "WHERE collection = ? ORDER BY book_title",
+                (collection_name,),
+            ).fetchall()
+        return [BookEntry(*row) for row in rows]
+
+    def overview(self, store: VectorStore, collection_names: Iterable[str] | None = None) -> Dict[str, List[BookEntry]]:
+        """Books of every collection in ``store``; only collections unknown to the catalog touch the store."""
+        names = list(collection_names) if collection_names is not None else store.list_collections()
+        known = set(self.collection_names())
+        for name in names:
+            if name not in known:
+                try:
+                    self.reconcile(store, name)
+                except Exception as exc:  # pragma: no cover - defensive logging
+                    logger.warning("Failed to read books from collection %s: %s", name, exc)
+        if collection_names is None:
+            # 已在存储中删除的集合不再展示
+            for name in known.difference(names):
+                self.remove_collection(name)
+        return {name: self.books(name) for name in names}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+__all__ = ["BookEntry", "CollectionCatalog"]
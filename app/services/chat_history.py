@@ -1,57 +1,119 @@
 from __future__ import annotations
 
-from collections import deque
+import asyncio
+import json
+import logging
 from dataclasses import dataclass, field
-from typing import Deque, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from ..config import settings
+from .metrics import metrics
+from .session_store import SessionStore, create_session_store
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+T = TypeVar("T")
 
 
 @dataclass
 class SessionState:
-    history: Deque[Dict[str, str]] = field(
-        default_factory=lambda: deque(maxlen=settings.max_history_turns)
-    )
+    """History of one session: ``(user, assistant)`` pairs plus the collection it talks to."""
+
+    turns: List[Turn] = field(default_factory=list)
     collection: Optional[str] = None
 
+    def encode(self) -> bytes:
+        # 紧凑的 JSON 数组 [collection, [[user, assistant], ...]]，不重复存键名
+        return json.dumps([self.collection, self.turns], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def decode(cls, data: bytes) -> "SessionState":
+        collection, turns = json.loads(data)
+        return cls(turns=[(user, assistant) for user, assistant in turns], collection=collection)
+
 
 class ChatSessionManager:
-    """In-memory multi-session history tracker with per-session collection preference."""
+    """Multi-session history tracker with per-session collection preference.
+
+    Sessions live in a :class:`SessionStore` (``SESSION_BACKEND``): the
+    in-memory store evicts by LRU, idle time and a memory cap; the SQLite and
+    Redis stores are shared by every uvicorn worker, so a session keeps its
+    history whichever worker serves the next request. Each update is a
+    read-modify-write of the whole session, which is safe as long as one
+    session does not send concurrent requests. Async handlers use the ``a*``
+    methods, which run SQLite / Redis calls in a worker thread.
+    """
 
-    def __init__(self) -> None:
-        self.sessions: Dict[str, SessionState] = {}
+    def __init__(self, store: SessionStore | None = None, max_turns: int | None = None) -> None:
+        self.store = store if store is not None else create_session_store()
+        self.max_turns = max_turns or settings.max_history_turns
+        metrics.register("chat_sessions", self.store.stats)
 
-    def _get_or_create_state(self, session_id: str) -> SessionState:
-        state = self.sessions.get(session_id)
-        if state is None:
-            state = SessionState()
-            self.sessions[session_id] = state
-        return state
+    def _load(self, session_id: str) -> Optional[SessionState]:
+        data = self.store.load(session_id)
+        if data is None:
+            return None
+        try:
+            return SessionState.decode(data)
+        except (ValueError, TypeError) as exc:
+            logger.warning("会话 %s 的数据无法解析，重新开始：%s", session_id, exc)
+            return None
+
+    def _save(self, session_id: str, state: SessionState) -> None:
+        state.turns = state.turns[-self.max_turns:]
+        self.store.save(session_id, state.encode())
 
     def get_history(self, session_id: str) -> List[Dict[str, str]]:
-        state = self.sessions.get(session_id)
+        state = self._load(session_id)
         if not state:
             return []
-        return list(state.history)
+        return [{"user": user, "assistant": assistant} for user, assistant in state.turns]
 
     def get_collection(self, session_id: str) -> Optional[str]:
-        state = self.sessions.get(session_id)
+        state = self._load(session_id)
         if not state:
             return None
         return state.collection
 
     def set_collection(self, session_id: str, collection: Optional[str]) -> None:
-        state = self._get_or_create_state(session_id)
-        if collection and state.collection and state.collection != collection:
-            state.history.clear()
+        state = self._load(session_id) or SessionState()
+        if state.collection == collection:
+            return
+        if collection and state.collection:
+            state.turns.clear()
         state.collection = collection
+        self._save(session_id, state)
 
     def append(self, session_id: str, user_message: str, assistant_message: str) -> None:
-        state = self._get_or_create_state(session_id)
-        state.history.append({"user": user_message, "assistant": assistant_message})
+        state = self._load(session_id) or SessionState()
+        state.turns.append((user_message, assistant_message))
+        self._save(session_id, state)
+
+    # ------------------------------------------------------------------ async
+    async def _offload(self, fn: Callable[..., T], *args: Any) -> T:
+        # SQLite 提交与 Redis 往返不能阻塞事件循环；内存存储直接调用即可
+        if not self.store.blocking:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def aget_history(self, session_id: str) -> List[Dict[str, str]]:
+        return await self._offload(self.get_history, session_id)
+
+    async def aget_collection(self, session_id: str) -> Optional[str]:
+        return await self._offload(self.get_collection, session_id)
+
+    async def aset_collection(self, session_id: str, collection: Optional[str]) -> None:
+        await self._offload(self.set_collection, session_id, collection)
+
+    async def aappend(self, session_id: str, user_message: str, assistant_message: str) -> None:
+        await self._offload(self.append, session_id, user_message, assistant_message)
 
     def clear(self, session_id: str) -> None:
-        self.sessions.pop(session_id, None)
+        self.store.delete(session_id)
+
+    def close(self) -> None:
+        self.store.close()
 
 
-__all__ = ["ChatSessionManager"]
+__all__ = ["ChatSessionManager", "SessionState"]
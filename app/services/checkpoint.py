@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestManifest:
+    """Progress of one file being written into one collection."""
+
+    collection_name: str
+    file_hash: str
+    book_title: str
+    batch_size: int
+    chunk_size: int
+    chunk_overlap: int
+    extra_collection_name: Optional[str] = None
+    # 开始写入前库中已有的章节快照；断点续传时不能重新查询，否则会把写了一半的新章节当成“未变化”
+    incremental: bool = False
+    existing_chapters: Dict[str, List] = field(default_factory=dict)
+    completed_batches: Dict[int, int] = field(default_factory=dict)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def rows_written(self) -> int:
+        return sum(self.completed_batches.values())
+
+
+class CheckpointStore:
+    """Local JSON manifests that let an interrupted upload resume at the first unfinished batch.
+
+    A manifest is created before the first batch of a file is written, updated
+    after every batch, and removed once the file is fully indexed, so an
+    existing manifest always means "partially uploaded".
+    """
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = Path(directory or settings.ingest_checkpoint_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path_for(self, collection_name: str, file_hash: str) -> Path:
+        key = hashlib.sha256(f"{collection_name}\0{file_hash}".encode("utf-8")).hexdigest()[:32]
+        return self.directory / f"{key}.json"
+
+    def load(self, collection_name: str, file_hash: str) -> Optional[IngestManifest]:
+        path = self.path_for(collection_name, file_hash)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            data["completed_batches"] = {int(index): rows for index, rows in data.get("completed_batches", {}).items()}
+            return IngestManifest(**data)
+        except (ValueError, TypeError) as exc:
+            logger.warning("断点文件 %s 已损坏，忽略：%s", path, exc)
+            return None
+
+    def save(self, manifest: IngestManifest) -> None:
+        with self._lock:
+            self._save_locked(manifest)
+
+    def _save_locked(self, manifest: IngestManifest) -> None:
+        manifest.updated_at = time.time()
+        path = self.path_for(manifest.collection_name, manifest.file_hash)
+        tmp_path = path.with_suffix(".tmp")
+        # 先写临时文件再原子替换，进程中途退出也不会留下半个 JSON
+        with tmp_path.open("w", encoding="utf-8") as file_obj:
+            json.dump(asdict(manifest), file_obj, ensure_ascii=False)
+            file_obj.flush()
+            os.fsync(file_obj.fileno())
+        os.replace(tmp_path, path)
+
+    def mark_batch(self, manifest: IngestManifest, index: int, rows: int) -> None:
+        # 写入在后台线程中完成，多个批次可能同时回调
+        with self._lock:
+            manifest.completed_batches[index] = rows
+            self._save_locked(manifest)
+
+    def remove(self, manifest: IngestManifest) -> None:
+        with self._lock:
+            self.path_for(manifest.collection_name, manifest.file_hash).unlink(missing_ok=True)
+
+    def pending(self) -> List[IngestManifest]:
+        manifests = []
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                continue
+            manifest = self.load(data["collection_name"], data["file_hash"])
+            if manifest is not None:
+                manifests.append(manifest)
+        return manifests
+
+
+__all__ = ["CheckpointStore", "IngestManifest"]
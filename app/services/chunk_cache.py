@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_MAX_VARIABLES = 500
+
+
+class ChunkEmbeddingCache:
+    """Content-addressed on-disk cache of chunk vectors.
+
+    Vectors live in an append-only float32 file that is read through
+    ``mmap``; a SQLite index maps ``sha256(model id, chunk text)`` to a row
+    slot and tracks when each entry was last used. When the cache grows past
+    ``max_entries`` the least recently used rows are dropped by compacting
+    the survivors into a new generation of the vector file.
+
+    The cache assumes a single writer process (the upload script); readers in
+    other processes see rows once their index transaction is committed.
+    """
+
+    INDEX_FILE = "index.sqlite3"
+
+    def __init__(
+        self,
+        directory: Path | None = None,
+        model_id: str | None = None,
+        dim: int | None = None,
+        max_entries: int | None = None,
+    ) -> None:
+        self.directory = Path(directory or settings.chunk_cache_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_id = model_id or str(Path(settings.embedding_model_path).resolve())
+        self.dim = dim or settings.embedding_dim
+        self.max_entries = max_entries if max_entries is not None else settings.chunk_cache_max_entries
+        self.row_bytes = self.dim * 4
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+
+        self._db = sqlite3.connect(str(self.directory / self.INDEX_FILE), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        if meta.get("dim") != str(self.dim):
+            if meta:
+                logger.info("Embedding dim changed (%s -> %s), resetting chunk cache", meta.get("dim"), self.dim)
+            self._reset(generation=int(meta.get("generation", 0)) + 1 if meta else 0)
+        else:
+            self.generation = int(meta["generation"])
+        self._repair_tail()
+
+    # ------------------------------------------------------------------ storage
+    def _vectors_path(self, generation: int | None = None) -> Path:
+        gen = self.generation if generation is None else generation
+        return self.directory / f"vectors-{gen}.f32"
+
+    def _reset(self, generation: int) -> None:
+        old_files = list(self.directory.glob("vectors-*.f32"))
+        with self._db:
+            self._db.execute("DELETE FROM entries")
+            self._db.execute("DELETE FROM meta")
+            self._db.executemany(
+                "INSERT INTO meta (name, value) VALUES (?, ?)",
+                [("dim", str(self.dim)), ("generation", str(generation))],
+            )
+        self.generation = generation
+        for path in old_files:
+            path.unlink(missing_ok=True)
+        self._vectors_path().touch()
+
+    def _repair_tail(self) -> None:
+        path = self._vectors_path()
+        path.touch(exist_ok=True)
+        size = path.stat().st_size
+        if size % self.row_bytes:
+            # 上次写入中途被打断，截掉不完整的尾行
+            with path.open("r+b") as file_obj:
+                file_obj.truncate(size - size % self.row_bytes)
+
+    def _rows_on_disk(self) -> int:
+        return self._vectors_path().stat().st_size // self.row_bytes
+
+    def _view(self) -> Optional[mmap.mmap]:
+        size = self._vectors_path().stat().st_size
+        if size == 0:
+            return None
+        if self._mmap is None or size != self._mapped_size:
+            self._close_map()
+            with self._vectors_path().open("rb") as file_obj:
+                self._mmap = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+        return self._mmap
+
+    def _close_map(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mapped_size = 0
+
+    def key_for(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------ public API
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        keys = [self.key_for(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            slots: Dict[str, int] = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _SQLITE_MAX_VARIABLES):
+                part = unique_keys[start:start + _SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(part))
+                slots.update(
+                    self._db.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part).fetchall()
+                )
+            if not slots:
+                self.misses += len(keys)
+                return results
+
+            view = self._view()
+            for index, key in enumerate(keys):
+                slot = slots.get(key)
+                if slot is None or view is None:
+                    continue
+                offset = slot * self.row_bytes
+                vector = array("f")
+                vector.frombytes(view[offset:offset + self.row_bytes])
+                results[index] = vector.tolist()
+
+            now = time.time()
+            with self._db:
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in slots])
+            found = sum(result is not None for result in results)
+            self.hits += found
+            self.misses += len(keys) - found
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        with self._lock:
+            pending: Dict[str, Sequence[float]] = {}
+            for text, vector in zip(texts, vectors):
+                if len(vector) != self.dim:
+                    raise ValueError(f"Embedding dimension mismatch: expected {self.dim}, got {len(vector)}")
+                pending.setdefault(self.key_for(text), vector)
+            if not pending:
+                return
+            keys = list(pending)
+            existing = set()
+            for start in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+                part = keys[start:start + _SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(part))
+                existing.update(
+                    row[0] for row in self._db.execute(f"SELECT key FROM entries WHERE key IN ({placeholders})", part)
+                )
+            new_keys = [key for key in keys if key not in existing]
+            if not new_keys:
+                return
+
+            first_slot = self._rows_on_disk()
+            payload = array("f")
+            for key in new_keys:
+                payload.extend(pending[key])
+            with self._vectors_path().open("ab") as file_obj:
+                file_obj.write(payload.tobytes())
+                file_obj.flush()
+                os.fsync(file_obj.fileno())
+
+            now = time.time()
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, first_slot + offset, now) for offset, key in enumerate(new_keys)],
+                )
+            count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if self.max_entries and count > self.max_entries:
+            # 超出上限时一次性淘汰到 90%，避免每批写入都触发压缩
+            self.prune(int(self.max_entries * 0.9))
+
+    def embed(self, texts: Sequence[str], embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return vectors for ``texts``, computing only those never seen before."""
+        cached = self.get_many(texts)
+        missing = list(dict.fromkeys(texts[index] for index, vector in enumerate(cached) if vector is None))
+        if missing:
+            computed = embed_fn(missing)
+            self.put_many(missing, computed)
+            by_text = dict(zip(missing, computed))
+            for index, vector in enumerate(cached):
+                if vector is None:
+                    cached[index] = by_text[texts[index]]
+        return cached  # type: ignore[return-value]
+
+    def prune(self, max_entries: int) -> int:
+        """Keep the ``max_entries`` most recently used rows and compact the vector file."""
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            survivors = self._db.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used DESC LIMIT ?", (max(0, max_entries),)
+            ).fetchall()
+            removed = total - len(survivors)
+            disk_rows = self._rows_on_disk()
+            if removed <= 0 and disk_rows == total:
+                return 0
+
+            survivors.sort(key=lambda row: row[1])
+            view = self._view()
+            new_generation = self.generation + 1
+            new_path = self._vectors_path(new_generation)
+            with new_path.open("wb") as file_obj:
+                for _, slot in survivors:
+                    offset = slot * self.row_bytes
+                    file_obj.write(view[offset:offset + self.row_bytes])
+                file_obj.flush()
+                os.fsync(file_obj.fileno())
+
+            keep = {key for key, _ in survivors}
+            with self._db:
+                self._db.execute("CREATE TEMP TABLE IF NOT EXISTS keep_keys (key TEXT PRIMARY KEY)")
+                self._db.execute("DELETE FROM keep_keys")
+                self._db.executemany("INSERT INTO keep_keys (key) VALUES (?)", [(key,) for key in keep])
+                self._db.execute("DELETE FROM entries WHERE key NOT IN (SELECT key FROM keep_keys)")
+                self._db.executemany(
+                    "UPDATE entries SET slot = ? WHERE key = ?",
+                    [(new_slot, key) for new_slot, (key, _) in enumerate(survivors)],
+                )
+                self._db.execute("UPDATE meta SET value = ? WHERE name = 'generation'", (str(new_generation),))
+
+            old_path = self._vectors_path()
+            self._close_map()
+            self.generation = new_generation
+            old_path.unlink(missing_ok=True)
+        logger.info("Pruned %d cached chunk embeddings, %d remain", removed, len(survivors))
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._close_map()
+            self._reset(self.generation + 1)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            rows = self._rows_on_disk()
+            lookups = self.hits + self.misses
+            return {
+                "directory": str(self.directory),
+                "dim": self.dim,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "rows_on_disk": rows,
+                "dead_rows": rows - entries,
+                "file_bytes": rows * self.row_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_map()
+            self._db.close()
+
+
+__all__ = ["ChunkEmbeddingCache"]
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Set, TypeVar
+
+from pymilvus import Collection, MilvusException, utility
+
+from ..config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _not_loaded(exc: MilvusException) -> bool:
+    message = str(exc).lower()
+    return "not loaded" in message or "collection not load" in message
+
+
+class CollectionLoadManager:
+    """Cached ``Collection`` handles plus an LRU of loaded collections under a budget.
+
+    Searches and queries go through :meth:`run` / :meth:`loaded`, which load
+    the collection on first use; concurrent callers wait on the same load
+    instead of issuing their own. When more than ``max_loaded`` collections
+    (or ``memory_budget_mb`` of query node memory) are loaded, the least
+    recently used ones that are neither pinned nor in use are released.
+    Inserts, upserts and flushes only need a handle and never load anything.
+    """
+
+    def __init__(
+        self,
+        max_loaded: int | None = None,
+        memory_budget_mb: int | None = None,
+        pinned: Set[str] | None = None,
+    ) -> None:
+        self.max_loaded = settings.milvus_max_loaded_collections if max_loaded is None else max_loaded
+        budget = settings.milvus_loaded_memory_mb if memory_budget_mb is None else memory_budget_mb
+        self.memory_budget = budget * 1024 * 1024
+        self._pinned: Set[str] = set(pinned if pinned is not None else {settings.milvus_collection})
+        self._lock = threading.Lock()
+        self._handles: Dict[str, Collection] = {}
+        # name -> 估算的内存占用（字节），按最近使用排序
+        self._loaded: "OrderedDict[str, int]" = OrderedDict()
+        # 正在加载或释放的集合；其他线程等待同一个 Future，而不是重复发请求
+        self._pending: Dict[str, Future] = {}
+        self._in_use: Dict[str, int] = {}
+        self._counters = {"hits": 0, "loads": 0, "coalesced": 0, "releases": 0, "reloads": 0}
+        self._adopted = False
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_loaded > 0 or self.memory_budget > 0
+
+    # ----------------------------------------------------------------- handles
+    def handle(self, collection_name: str) -> Collection:
+        with self._lock:
+            collection = self._handles.get(collection_name)
+            if collection is None:
+                collection = Collection(collection_name)
+                self._handles[collection_name] = collection
+            return collection
+
+    def register(self, collection: Collection) -> None:
+        """Cache a handle created elsewhere (e.g. together with a new collection's schema)."""
+        with self._lock:
+            self._handles[collection.name] = collection
+
+    def pin(self, collection_name: str) -> None:
+        with self._lock:
+            self._pinned.add(collection_name)
+
+    def discard(self, collection_name: str) -> None:
+        """Forget a collection that is about to be dropped."""
+        with self._lock:
+            self._handles.pop(collection_name, None)
+            self._loaded.pop(collection_name, None)
+
+    # ------------------------------------------------------------------- loads
+    def run(self, collection_name: str, operation: Callable[[Collection], T]) -> T:
+        """Run ``operation`` on a loaded collection, reloading once if another process released it."""
+        for attempt in range(2):
+            with self.loaded(collection_name) as collection:
+                try:
+                    return operation(collection)
+                except MilvusException as exc:
+                    if attempt or not _not_loaded(exc):
+                        raise
+                    logger.info("集合 %s 已在别处被释放，重新加载", collection_name)
+                    with self._lock:
+                        self._loaded.pop(collection_name, None)
+                        self._counters["reloads"] += 1
+        raise AssertionError("unreachable")
+
+    @contextmanager
+    def loaded(self, collection_name: str) -> Iterator[Collection]:
+        """Keep ``collection_name`` loaded (and exempt from eviction) inside the block."""
+        with self._lock:
+            self._in_use[collection_name] = self._in_use.get(collection_name, 0) + 1
+        try:
+            self._ensure_loaded(collection_name)
+            yield self.handle(collection_name)
+        finally:
+            evicted: List[str] = []
+            with self._lock:
+                remaining = self._in_use[collection_name] - 1
+                if remaining:
+                    self._in_use[collection_name] = remaining
+                else:
+                    del self._in_use[collection_name]
+                    # 使用期间不能释放的集合，用完后再按预算回收
+                    if self._over_budget_locked():
+                        evicted = self._evict_locked()
+            self._release(evicted)
+
+    def _ensure_loaded(self, collection_name: str) -> None:
+        self._adopt_loaded()
+        while True:
+            with self._lock:
+                if collection_name in self._loaded:
+                    self._loaded.move_to_end(collection_name)
+                    self._counters["hits"] += 1
+                    return
+                pending = self._pending.get(collection_name)
+                owner = pending is None
+                if owner:
+                    pending = self._pending[collection_name] = Future()
+                else:
+                    self._counters["coalesced"] += 1
+            if not owner:
+                # 等待别的线程加载（或释放）完成后重新检查
+                pending.result()
+                continue
+
+            try:
+                size = self._load(collection_name)
+            except BaseException as exc:
+                with self._lock:
+                    del self._pending[collection_name]
+                pending.set_exception(exc)
+                raise
+            with self._lock:
+                del self._pending[collection_name]
+                self._loaded[collection_name] = size
+                self._counters["loads"] += 1
+                evicted = self._evict_locked()
+            pending.set_result(None)
+            self._release(evicted)
+            return
+
+    def _load(self, collection_name: str) -> int:
+        collection = self.handle(collection_name)
+        logger.info("加载集合 %s", collection_name)
+        collection.load()
+        return self.memory_size(collection_name) if self.memory_budget > 0 else 0
+
+    @staticmethod
+    def memory_size(collection_name: str) -> int:
+        """Query node memory of a loaded collection in bytes."""
+        try:
+            return sum(info.mem_size for info in utility.get_query_segment_info(collection_name))
+        except MilvusException:
+            # 拿不到段信息时按向量与正文大小粗略估算
+            per_row = settings.embedding_dim * 4 + settings.chunk_size * 3
+            return Collection(collection_name).num_entities * per_row
+
+    def _over_budget_locked(self) -> bool:
+        if self.max_loaded > 0 and len(self._loaded) > self.max_loaded:
+            return True
+        return self.memory_budget > 0 and sum(self._loaded.values()) > self.memory_budget
+
+    def _evict_locked(self) -> List[str]:
+        evicted: List[str] = []
+        for name in list(self._loaded):
+            if not self._over_budget_locked():
+                break
+            if name in self._pinned or name in self._in_use:
+                continue
+            del self._loaded[name]
+            self._pending[name] = Future()
+            evicted.append(name)
+        return evicted
+
+    def _release(self, names: List[str]) -> None:
+        for name in names:
+            try:
+                logger.info("释放冷集合 %s", name)
+                self.handle(name).release()
+            except MilvusException as exc:
+                logger.warning("释放集合 %s 失败：%s", name, exc)
+            finally:
+                with self._lock:
+                    pending = self._pending.pop(name)
+                    self._counters["releases"] += 1
+                pending.set_result(None)
+
+    def _adopt_loaded(self) -> None:
+        """Count collections left loaded by earlier processes against the budget (once, coldest first)."""
+        if self._adopted or not self.bounded:
+            return
+        with self._lock:
+            if self._adopted:
+                return
+            self._adopted = True
+        adopted: Dict[str, int] = {}
+        try:
+            names = utility.list_collections()
+        except MilvusException as exc:
+            logger.warning("无法列出已加载的集合，跳过接管：%s", exc)
+            return
+        for name in names:
+            try:
+                if utility.load_state(name).name == "Loaded":
+                    adopted[name] = self.memory_size(name) if self.memory_budget > 0 else 0
+            except MilvusException:
+                continue
+        with self._lock:
+            for name, size in adopted.items():
+                if name not in self._loaded:
+                    self._loaded[name] = size
+                    self._loaded.move_to_end(name, last=False)
+            evicted = self._evict_locked()
+        if adopted:
+            logger.info("接管已加载的集合 %d 个，超出预算释放 %d 个", len(adopted), len(evicted))
+        self._release(evicted)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                **self._counters,
+                "loaded": len(self._loaded),
+                "loaded_mb": round(sum(self._loaded.values()) / 1024 / 1024, 1),
+                "max_loaded": self.max_loaded,
+                "memory_budget_mb": self.memory_budget // (1024 * 1024),
+                "pinned": sorted(self._pinned),
+            }
+
+
+_manager: CollectionLoadManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_load_manager() -> CollectionLoadManager:
+    """Process-wide manager; every Milvus store in the process shares one connection and one budget."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = CollectionLoadManager()
+            metrics.register("milvus_collection_loads", _manager.stats)
+        return _manager
+
+
+__all__ = ["CollectionLoadManager", "get_load_manager"]
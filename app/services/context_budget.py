@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from ..config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKETS = (0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+context_tokens = metrics.histogram("context_prompt_tokens", TOKEN_BUCKETS)
+context_tokens_saved = metrics.histogram("context_prompt_tokens_saved", TOKEN_BUCKETS)
+
+
+def passage_label(doc: Dict[str, object]) -> str:
+    indices = doc.get("chunk_indices") or [doc["chunk_index"]]
+    chunks = f"{indices[0]}-{indices[-1]}" if len(indices) > 1 else f"{indices[0]}"
+    return f"【{doc['book_title']}·{doc['chapter_title']}·chunk {chunks}】"
+
+
+def format_passage(doc: Dict[str, object]) -> str:
+    """Text of one retrieved passage as it appears in the prompt."""
+    return f"{passage_label(doc)}\n{doc['content']}"
+
+
+def merge_overlap(left: str, right: str, max_overlap: int) -> str:
+    """Concatenate two neighbouring chunks, dropping the text they share.
+
+    The splitter strips every chunk, so the shared window can be shorter than
+    ``chunk_overlap``; the longest suffix of ``left`` that prefixes ``right``
+    is removed.
+    """
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+class ContextBudgeter:
+    """Turn ranked chunks into the passages that go into the prompt.
+
+    1. Trim the ranking where relevance falls below ``context_min_relative_score``
+       of the best hit, or drops by more than ``context_score_gap`` between two
+       neighbours (never below ``context_min_documents`` chunks).
+    2. Merge adjacent chunks of the same chapter into one passage and drop the
+       duplicated ``chunk_overlap`` text.
+    3. Add passages best-first until ``context_token_budget`` tokens are used.
+
+    Token counts come from a Hugging Face tokenizer (``CONTEXT_TOKENIZER``,
+    defaulting to the embedding model directory); if it cannot be loaded,
+    characters are counted instead, which is close for Chinese text. Only the
+    merged passages are tokenized; the "tokens saved" figure estimates the
+    raw chunks' size from the tokens-per-character ratio of those passages.
+    """
+
+    def __init__(
+        self,
+        tokenizer=None,
+        *,
+        token_budget: int | None = None,
+        min_relative_score: float | None = None,
+        score_gap: float | None = None,
+        min_documents: int | None = None,
+        max_overlap: int | None = None,
+    ) -> None:
+        self.token_budget = settings.context_token_budget if token_budget is None else token_budget
+        self.min_relative_score = (
+            settings.context_min_relative_score if min_relative_score is None else min_relative_score
+        )
+        self.score_gap = settings.context_score_gap if score_gap is None else score_gap
+        self.min_documents = max(1, settings.context_min_documents if min_documents is None else min_documents)
+        self.max_overlap = settings.chunk_overlap if max_overlap is None else max_overlap
+        self._tokenizer = tokenizer
+        self._tokenizer_loaded = tokenizer is not None
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------------------- tokens
+    def _load_tokenizer(self):
+        # 调用方需持有 self._lock：fast tokenizer 不能被多个线程同时使用
+        if not self._tokenizer_loaded:
+            self._tokenizer_loaded = True
+            name = settings.context_tokenizer or str(settings.embedding_model_path)
+            try:
+                from transformers import AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(name)
+            except Exception as exc:  # pragma: no cover - depends on local files
+                logger.warning("无法加载上下文分词器 %s，改为按字符计数：%s", name, exc)
+        return self._tokenizer
+
+    def count_tokens(self, texts: Sequence[str]) -> List[int]:
+        if not texts:
+            return []
+        with self._lock:
+            tokenizer = self._load_tokenizer()
+            if tokenizer is None:
+                return [len(text) for text in texts]
+            encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        with self._lock:
+            tokenizer = self._load_tokenizer()
+            if tokenizer is None:
+                return text[:max_tokens]
+            ids = tokenizer(text, add_special_tokens=False)["input_ids"][:max_tokens]
+            return tokenizer.decode(ids)
+
+    # ----------------------------------------------------------------- steps
+    def _cutoff(self, documents: List[Dict[str, object]], higher_is_better: bool) -> List[Dict[str, object]]:
+        scores = [float(doc["score"]) for doc in documents]
+        best = scores[0]
+        if best <= 0 or (self.min_relative_score <= 0 and self.score_gap <= 0):
+            return documents
+        # 把各种打分统一成“相对最佳结果的相关度”，1.0 为最佳
+        relevance = [score / best if higher_is_better else best / max(score, 1e-12) for score in scores]
+        keep = len(documents)
+        for position in range(self.min_documents, len(documents)):
+            if relevance[position] < self.min_relative_score:
+                keep = position
+                break
+            if self.score_gap > 0 and relevance[position - 1] - relevance[position] > self.score_gap:
+                keep = position
+                break
+        return documents[:keep]
+
+    def _merge(self, documents: List[Dict[str, object]]) -> List[Dict[str, object]]:
+        chapters: Dict[tuple, List[tuple]] = {}
+        for rank, doc in enumerate(documents):
+            key = (doc["book_title"], doc["chapter_title"], doc.get("source_path"))
+            chapters.setdefault(key, []).append((int(doc["chunk_index"]), rank, doc))
+
+        passages = []
+        for chunks in chapters.values():
+            chunks.sort(key=lambda item: item[0])
+            run: List[tuple] = []
+            for item in chunks:
+                if run and item[0] == run[-1][0]:
+                    continue  # 同一分片被多次召回
+                if run and item[0] != run[-1][0] + 1:
+                    passages.append(self._passage(run))
+                    run = []
+                run.append(item)
+            passages.append(self._passage(run))
+        # 段落按其中排名最靠前的分片排序
+        passages.sort(key=lambda passage: passage[0])
+        return [passage for _, passage in passages]
+
+    def _passage(self, run: List[tuple]) -> tuple:
+        best_rank, best_doc = min((rank, doc) for _, rank, doc in run)
+        content = str(run[0][2]["content"] or "")
+        for _, _, doc in run[1:]:
+            content = merge_overlap(content, str(doc["content"] or ""), self.max_overlap)
+        passage = {
+            **best_doc,
+            "content": content,
+            "chunk_index": run[0][0],
+            "chunk_indices": [index for index, _, _ in run],
+        }
+        return best_rank, passage
+
+    def _fit(self, passages: List[Dict[str, object]]) -> tuple:
+        texts = [format_passage(passage) for passage in passages]
+        costs = self.count_tokens(texts)
+        tokens_per_char = sum(costs) / max(1, sum(len(text) for text in texts))
+        if self.token_budget <= 0:
+            return passages, sum(costs), tokens_per_char
+        selected, used = [], 0
+        for passage, cost in zip(passages, costs):
+            if used + cost <= self.token_budget:
+                selected.append(passage)
+                used += cost
+            elif not selected:
+                # 最相关的段落本身就超出预算时截断它，而不是返回空上下文
+                header = self.count_tokens([passage_label(passage) + "\n"])[0]
+                content = self._truncate(str(passage["content"]), max(0, self.token_budget - header))
+                selected.append({**passage, "content": content})
+                used += self.count_tokens([format_passage(selected[-1])])[0]
+        return selected, used, tokens_per_char
+
+    # -------------------------------------------------------------- public API
+    def assemble(
+        self,
+        documents: List[Dict[str, object]],
+        higher_is_better: bool = True,
+        label: Optional[str] = None,
+    ) -> List[Dict[str, object]]:
+        """Return prompt passages for ``documents`` ranked best-first.
+
+        ``higher_is_better`` is ``False`` for L2 distances.
+        """
+        if not documents:
+            return []
+        kept = self._cutoff(documents, higher_is_better)
+        passages, used, tokens_per_char = self._fit(self._merge(kept))
+
+        # 原始分片不再分词一遍（只为统计节省量），按已分词段落的 token/字符比估算
+        raw = round(tokens_per_char * sum(len(format_passage(doc)) for doc in documents))
+        context_tokens.observe(used)
+        context_tokens_saved.observe(max(0, raw - used))
+        metrics.increment("context_prompt_tokens_saved_total", max(0, raw - used))
+        logger.info(
+            "上下文组装%s：%d 个分片 -> %d 段，prompt tokens 约 %d -> %d（约节省 %d）",
+            f"（{label}）" if label else "",
+            len(documents),
+            len(passages),
+            raw,
+            used,
+            max(0, raw - used),
+        )
+        return passages
+
+
+__all__ = ["ContextBudgeter", "format_passage", "merge_overlap", "passage_label"]
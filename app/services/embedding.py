@@ -1,53 +1,178 @@
 from __future__ import annotations
 
 import logging
+import time
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, List, Optional, Tuple
 
+import numpy as np
 import torch
 from transformers import AutoModel, AutoTokenizer
 
 from ..config import settings
+from .embedding_backends import (
+    BACKENDS,
+    PARITY_TEXTS,
+    BF16Backend,
+    EmbeddingBackend,
+    Int8Backend,
+    OnnxBackend,
+    bf16_supported,
+    export_onnx,
+    onnx_export_path,
+    onnx_reference_path,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class EmbeddingService:
-    """Load a local embedding model and create vector representations."""
+    """Load a local embedding model and create vector representations.
 
-    def __init__(self, model_path: Path | None = None) -> None:
+    ``backend`` selects how the forward pass runs: ``torch`` (fp32), ``int8``
+    (dynamic quantization), ``bf16`` (autocast) or ``onnx`` (ONNX Runtime).
+    The non-fp32 backends run on the CPU, are warmed up at load time and must
+    reproduce the fp32 vectors of :data:`PARITY_TEXTS` with a cosine
+    similarity of at least ``EMBEDDING_PARITY_THRESHOLD``; otherwise the
+    service falls back to fp32.
+    """
+
+    def __init__(
+        self,
+        model_path: Path | None = None,
+        batch_size: int | None = None,
+        backend: str | None = None,
+        threads: int | None = None,
+    ) -> None:
         path = Path(model_path or settings.embedding_model_path)
+        self.backend_name = (backend or settings.embedding_backend).lower()
+        if self.backend_name not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend {self.backend_name}; expected one of {', '.join(BACKENDS)}")
+        threads = threads or settings.embedding_threads
+        if threads:
+            torch.set_num_threads(threads)
         logger.info("Loading embedding model from %s", path)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # 量化、bf16 与 ONNX 后端都是 CPU 推理路径
+        self.device = "cuda" if torch.cuda.is_available() and self.backend_name == "torch" else "cpu"
         logger.info(f"Using device: {self.device}")
+        self.model_path = path
+        self.batch_size = batch_size or settings.embedding_batch_size
+        self.max_length = settings.embedding_max_length
         self.tokenizer = AutoTokenizer.from_pretrained(path)
-        self.model = AutoModel.from_pretrained(path).to(self.device)
-        self.model.eval()
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.parity: Optional[float] = None
+
+        self.backend, reference = self._load_backend(path, threads)
+        self.warm_up()
+        if reference is not None:
+            self.parity = self.check_parity(reference)
+            if self.parity < settings.embedding_parity_threshold:
+                logger.error(
+                    "嵌入后端 %s 与 fp32 参考向量的最小余弦相似度为 %.4f，低于阈值 %.4f，回退到 fp32",
+                    self.backend_name,
+                    self.parity,
+                    settings.embedding_parity_threshold,
+                )
+                self.backend_name = "torch"
+                self.backend = EmbeddingBackend(self._load_model(path))
+                self.warm_up()
+            else:
+                logger.info("嵌入后端 %s 一致性校验通过：最小余弦相似度 %.4f", self.backend_name, self.parity)
+
+    def _load_model(self, path: Path) -> torch.nn.Module:
+        model = AutoModel.from_pretrained(path).to(self.device)
+        model.eval()
+        return model
+
+    def _load_backend(self, path: Path, threads: Optional[int]) -> Tuple[EmbeddingBackend, Optional[np.ndarray]]:
+        """Backend for ``self.backend_name`` plus the fp32 reference vectors to check it against."""
+        if self.backend_name == "onnx":
+            onnx_path = onnx_export_path(path)
+            reference_path = onnx_reference_path(onnx_path)
+            if not reference_path.exists():
+                model = self._load_model(path)
+                reference = self._encode_with(EmbeddingBackend(model), PARITY_TEXTS).numpy()
+                logger.info("导出 ONNX 模型到 %s", onnx_path)
+                export_onnx(model, self.tokenizer, onnx_path)
+                np.save(reference_path, reference)
+                del model
+            return OnnxBackend(onnx_path, threads), np.load(reference_path)
+
+        model = self._load_model(path)
+        if self.backend_name == "torch":
+            return EmbeddingBackend(model), None
+        if self.backend_name == "bf16" and not bf16_supported():
+            logger.warning("当前 CPU 不支持原生 bf16 计算，嵌入后端回退到 fp32")
+            self.backend_name = "torch"
+            return EmbeddingBackend(model), None
+        reference = self._encode_with(EmbeddingBackend(model), PARITY_TEXTS).numpy()
+        if self.backend_name == "int8":
+            return Int8Backend(model), reference
+        return BF16Backend(model), reference
+
+    def warm_up(self) -> None:
+        """Run a single query and one full batch so kernels, caches and thread pools are ready."""
+        started = time.perf_counter()
+        self.encode(PARITY_TEXTS[:1])
+        texts = (PARITY_TEXTS * (self.batch_size // len(PARITY_TEXTS) + 1))[: self.batch_size]
+        self.encode(texts)
+        logger.info("嵌入后端 %s 预热完成，用时 %.2fs", self.backend_name, time.perf_counter() - started)
+
+    def check_parity(self, reference: np.ndarray) -> float:
+        """Minimum cosine similarity between this backend's vectors of :data:`PARITY_TEXTS` and ``reference``."""
+        vectors = self.encode(PARITY_TEXTS).numpy()
+        dots = (vectors * reference).sum(axis=1)
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+        return float((dots / np.maximum(norms, 1e-12)).min())
+
+    def encode(self, texts: Iterable[str], batch_size: int | None = None) -> torch.Tensor:
+        """Embed ``texts`` into a ``(len(texts), dim)`` float tensor on the CPU.
+
+        Texts are tokenized once, sorted by token length and grouped into padded
+        batches so that each forward pass wastes as little work on padding as
+        possible. Rows are returned in the original input order.
+        """
+        return self._encode_with(self.backend, texts, batch_size)
 
     @torch.no_grad()
-    def embed_documents(self, texts: Iterable[str]) -> List[List[float]]:
-        embeddings: List[List[float]] = []
+    def _encode_with(
+        self, backend: EmbeddingBackend, texts: Iterable[str], batch_size: int | None = None
+    ) -> torch.Tensor:
+        texts = list(texts)
         expected_dim = settings.embedding_dim
-        for text in texts:
-            inputs = self.tokenizer(
-                text,
-                return_tensors="pt",
-                truncation=True,
-                max_length=2048,
-            ).to(self.device)
-            outputs = self.model(**inputs)
-            if hasattr(outputs, "last_hidden_state"):
-                hidden_states = outputs.last_hidden_state
-            else:
-                raise ValueError("Model output does not contain last_hidden_state")
-            pooled = hidden_states.mean(dim=1)
-            vector = pooled.squeeze(0).tolist()
-            if len(vector) != expected_dim:
+        if not texts:
+            return torch.empty((0, expected_dim), dtype=torch.float32)
+
+        batch_size = max(1, batch_size or self.batch_size)
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        input_ids = encoded["input_ids"]
+        order = sorted(range(len(texts)), key=lambda idx: len(input_ids[idx]))
+
+        output = torch.empty((len(texts), expected_dim), dtype=torch.float32)
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
+            features = [{key: encoded[key][idx] for key in encoded.keys()} for idx in batch_indices]
+            inputs = self.tokenizer.pad(features, padding=True, return_tensors="pt").to(self.device)
+            hidden_states = backend(inputs)
+            pooled = self._mean_pool(hidden_states, inputs["attention_mask"])
+            if pooled.shape[-1] != expected_dim:
                 raise ValueError(
-                    f"Embedding dimension mismatch: expected {expected_dim}, got {len(vector)}"
+                    f"Embedding dimension mismatch: expected {expected_dim}, got {pooled.shape[-1]}"
                 )
-            embeddings.append(vector)
-        return embeddings
+            output[batch_indices] = pooled.float().cpu()
+        return output
+
+    def embed_documents(self, texts: Iterable[str], batch_size: int | None = None) -> List[List[float]]:
+        return self.encode(texts, batch_size=batch_size).tolist()
+
+    @staticmethod
+    def _mean_pool(hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        # 只对真实 token 求平均，padding 位置不参与，保证批量结果与逐条计算一致
+        mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+        summed = (hidden_states * mask).sum(dim=1)
+        counts = mask.sum(dim=1).clamp(min=1)
+        return summed / counts
 
 
 __all__ = ["EmbeddingService"]
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+import torch
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "int8", "bf16", "onnx")
+
+# 用于预热与一致性校验的固定文本：长短不一，覆盖对话、叙述与人名
+PARITY_TEXTS = [
+    "他是谁？",
+    "第一章 风起云涌。少年站在山门前，望着漫天飞雪，心中暗暗立誓。",
+    "“你终于来了。”老者放下茶杯，目光穿过窗棂落在远处的群山上，“这一等，就是三十年。”",
+    "夜色渐深，城中灯火一盏盏熄灭，只有客栈二楼的那扇窗还亮着，隐约传出翻书的声音。",
+    "萧炎的师父是谁？",
+    "她把信折好塞进袖中，转身走入雨里，再也没有回头。街角的卖花人看着她的背影，叹了口气。",
+    "大殿之上，群臣噤声。皇帝缓缓开口：“北境之事，诸卿可有良策？”良久无人应答。",
+    "主角在第几章突破到了金丹期？",
+]
+
+
+class EmbeddingBackend:
+    """Runs the transformer forward pass and returns ``last_hidden_state`` (fp32 PyTorch)."""
+
+    name = "torch"
+
+    def __init__(self, model: torch.nn.Module) -> None:
+        self.model = model
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        outputs = self.model(**inputs)
+        if not hasattr(outputs, "last_hidden_state"):
+            raise ValueError("Model output does not contain last_hidden_state")
+        return outputs.last_hidden_state
+
+
+class Int8Backend(EmbeddingBackend):
+    """Dynamic int8 quantization: Linear weights are int8, activations are quantized per batch at run time."""
+
+    name = "int8"
+
+    def __init__(self, model: torch.nn.Module) -> None:
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized)
+
+
+class BF16Backend(EmbeddingBackend):
+    """bf16 autocast on CPUs with native bf16 support (AVX512-BF16 / AMX); pooling stays in fp32."""
+
+    name = "bf16"
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            hidden_states = super().__call__(inputs)
+        return hidden_states.float()
+
+
+def bf16_supported() -> bool:
+    """Whether oneDNN has native bf16 kernels on this CPU (emulated bf16 is slower than fp32)."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def _onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError(
+            "EMBEDDING_BACKEND=onnx requires onnxruntime and onnx: pip install onnxruntime onnx"
+        ) from exc
+    return onnxruntime
+
+
+class OnnxBackend(EmbeddingBackend):
+    """ONNX Runtime session over a model exported by :func:`export_onnx`."""
+
+    name = "onnx"
+
+    def __init__(self, path: Path, threads: Optional[int] = None) -> None:
+        ort = _onnxruntime()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        feeds = {name: tensor.cpu().numpy() for name, tensor in inputs.items() if name in self.input_names}
+        (hidden_states,) = self.session.run(["last_hidden_state"], feeds)
+        return torch.from_numpy(hidden_states)
+
+
+class _HiddenStateModule(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+
+def onnx_export_path(model_path: Path) -> Path:
+    """Export location of ``model_path`` under ``EMBEDDING_ONNX_DIR``."""
+    return Path(settings.embedding_onnx_dir) / Path(model_path).resolve().name / "model.onnx"
+
+
+def onnx_reference_path(onnx_path: Path) -> Path:
+    """fp32 vectors of :data:`PARITY_TEXTS`, written last; its presence marks a complete export."""
+    return onnx_path.with_name("reference.npy")
+
+
+def export_onnx(model: torch.nn.Module, tokenizer, path: Path) -> None:
+    """Export ``model`` to ONNX with dynamic batch and sequence axes."""
+    _onnxruntime()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sample = tokenizer(PARITY_TEXTS[:2], padding=True, return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        _HiddenStateModule(model).eval(),
+        (sample["input_ids"], sample["attention_mask"]),
+        str(path),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "last_hidden_state": dynamic},
+        opset_version=17,
+    )
+
+
+__all__ = [
+    "BACKENDS",
+    "BF16Backend",
+    "EmbeddingBackend",
+    "Int8Backend",
+    "OnnxBackend",
+    "PARITY_TEXTS",
+    "bf16_supported",
+    "export_onnx",
+    "onnx_export_path",
+    "onnx_reference_path",
+]
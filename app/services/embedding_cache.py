@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a query so trivially different spellings share one cache entry."""
+    normalized = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE.sub(" ", normalized).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU/TTL cache of query vectors with an optional SQLite tier.
+
+    Keys combine the normalized query with the embedding model path and
+    dimension, so changing either setting never serves stale vectors. The
+    persistent tier records the model identity it was built with and is
+    wiped when it no longer matches.
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        ttl_seconds: float | None = None,
+        persist_path: Path | None = None,
+        model_path: Path | None = None,
+        dim: int | None = None,
+    ) -> None:
+        self.max_entries = max(0, max_entries if max_entries is not None else settings.query_cache_max_entries)
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.query_cache_ttl_seconds
+        self.model_id = str(Path(model_path or settings.embedding_model_path).resolve())
+        self.dim = dim or settings.embedding_dim
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # SQLite 层单独加锁，磁盘读写不阻塞内存层的查找
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        path = persist_path if persist_path is not None else settings.query_cache_path
+        if path:
+            self._open_db(Path(path))
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.model_id}\0{self.dim}\0{normalize_query(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _open_db(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(path), check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        stored = dict(db.execute("SELECT name, value FROM meta").fetchall())
+        expected = {"model_path": self.model_id, "embedding_dim": str(self.dim)}
+        if stored != expected:
+            if stored:
+                logger.info("Embedding model changed (%s -> %s), clearing query cache %s", stored, expected, path)
+            db.execute("DELETE FROM vectors")
+            db.execute("DELETE FROM meta")
+            db.executemany("INSERT INTO meta (name, value) VALUES (?, ?)", expected.items())
+        if self.ttl:
+            db.execute("DELETE FROM vectors WHERE created_at < ?", (time.time() - self.ttl,))
+        db.commit()
+        self._db = db
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def get_memory(self, text: str) -> Optional[List[float]]:
+        """In-memory tier only; never touches SQLite, so it is safe to call on the event loop."""
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            if self._db is None:
+                self.misses += 1
+            return None
+
+    def get_persistent(self, text: str) -> Optional[List[float]]:
+        """SQLite tier only (blocking); a hit is promoted into the in-memory tier."""
+        if self._db is None:
+            return None
+        key = self._key(text)
+        now = time.time()
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT vector, created_at FROM vectors WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None or self._expired(row[1], now):
+                self.misses += 1
+                return None
+            vector = array("f")
+            vector.frombytes(row[0])
+            values = vector.tolist()
+            self._remember(key, row[1], values)
+            self.disk_hits += 1
+            return values
+
+    def get(self, text: str) -> Optional[List[float]]:
+        cached = self.get_memory(text)
+        if cached is None:
+            cached = self.get_persistent(text)
+        return cached
+
+    def put_memory(self, text: str, vector: List[float]) -> None:
+        if len(vector) != self.dim:
+            return
+        with self._lock:
+            self._remember(self._key(text), time.time(), list(vector))
+
+    def persist(self, text: str, vector: List[float]) -> None:
+        """Write ``vector`` to the SQLite tier (blocking)."""
+        if self._db is None or len(vector) != self.dim:
+            return
+        key = self._key(text)
+        try:
+            with self._db_lock:
+                if self._db is None:
+                    return
+                self._db.execute(
+                    "INSERT OR REPLACE INTO vectors (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, array("f", vector).tobytes(), time.time()),
+                )
+                self._db.commit()
+        except sqlite3.Error as exc:  # pragma: no cover - the in-memory tier still has the vector
+            logger.warning("查询向量写入持久缓存失败：%s", exc)
+
+    def put(self, text: str, vector: List[float]) -> None:
+        self.put_memory(text, vector)
+        self.persist(text, vector)
+
+    def _remember(self, key: str, created_at: float, vector: List[float]) -> None:
+        if not self.max_entries:
+            return
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM vectors")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "persistent": self.persistent,
+            }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+__all__ = ["QueryEmbeddingCache", "normalize_query"]
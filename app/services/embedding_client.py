@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+import httpx
+import numpy as np
+
+from ..config import settings
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .embedding import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+UNIX_SCHEME = "unix://"
+
+
+class RemoteEmbeddingService:
+    """Thin client of the shared embedding server (``scripts/embedding_server.py``).
+
+    Speaks HTTP over a Unix socket (``unix:///path/to.sock``) or localhost TCP
+    and keeps its connections alive between calls. Vectors come back as raw
+    float32 bytes. When the server is unreachable and fallback is enabled, the
+    model is loaded in-process on first need and used for
+    ``EMBEDDING_SERVER_RETRY_SECONDS`` before the server is tried again.
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        timeout_seconds: float | None = None,
+        fallback: bool | None = None,
+    ) -> None:
+        self.url = url or settings.embedding_server_url
+        if not self.url:
+            raise ValueError("EMBEDDING_SERVER_URL is not set")
+        self.fallback = settings.embedding_server_fallback if fallback is None else fallback
+        timeout = timeout_seconds or settings.embedding_server_timeout_seconds
+        if self.url.startswith(UNIX_SCHEME):
+            transport = httpx.HTTPTransport(uds=self.url[len(UNIX_SCHEME):])
+            base_url = "http://embedding-server"
+        else:
+            transport = None
+            base_url = self.url
+        self._client = httpx.Client(
+            base_url=base_url,
+            transport=transport,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+        )
+        self._local: Optional["EmbeddingService"] = None
+        self._local_lock = threading.Lock()
+        self._retry_at = 0.0
+        self.remote_calls = 0
+        self.fallback_calls = 0
+        metrics.register("embedding_server", self.stats)
+
+    # ------------------------------------------------------------------ server
+    def ping(self) -> Dict[str, Any]:
+        """Server model information; raises if the server is down or serves another dimension."""
+        response = self._client.get("/healthz")
+        response.raise_for_status()
+        info = response.json()
+        if int(info["dim"]) != settings.embedding_dim:
+            raise ValueError(
+                f"Embedding server at {self.url} produces {info['dim']}-dim vectors, expected {settings.embedding_dim}"
+            )
+        return info
+
+    def wait_ready(self, timeout_seconds: float) -> Dict[str, Any]:
+        """Poll :meth:`ping` until the server answers (it may still be loading its model)."""
+        deadline = time.monotonic() + timeout_seconds
+        while True:
+            try:
+                return self.ping()
+            except httpx.HTTPError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def _remote(self, texts: List[str]) -> np.ndarray:
+        response = self._client.post("/embed", json={"texts": texts})
+        response.raise_for_status()
+        dim = int(response.headers["X-Embedding-Dim"])
+        if dim != settings.embedding_dim:
+            raise ValueError(f"Embedding dimension mismatch: expected {settings.embedding_dim}, got {dim}")
+        return np.frombuffer(response.content, dtype=np.float32).reshape(len(texts), dim)
+
+    # ---------------------------------------------------------------- fallback
+    def _local_service(self) -> "EmbeddingService":
+        with self._local_lock:
+            if self._local is None:
+                from .embedding import EmbeddingService
+
+                logger.warning("在进程内加载嵌入模型作为嵌入服务的后备")
+                self._local = EmbeddingService()
+            return self._local
+
+    def use_local(self) -> None:
+        """Serve from the in-process model until the retry interval has passed."""
+        self._retry_at = time.monotonic() + settings.embedding_server_retry_seconds
+        self._local_service()
+
+    # -------------------------------------------------------------- embedding
+    def embed_documents(self, texts: Iterable[str], batch_size: int | None = None) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        if time.monotonic() >= self._retry_at:
+            try:
+                vectors = self._remote(texts)
+                self.remote_calls += 1
+                return vectors.tolist()
+            except httpx.HTTPError as exc:
+                if not self.fallback:
+                    raise
+                logger.warning(
+                    "嵌入服务 %s 不可用，%.0fs 内改用进程内模型：%s",
+                    self.url,
+                    settings.embedding_server_retry_seconds,
+                    exc,
+                )
+                self._retry_at = time.monotonic() + settings.embedding_server_retry_seconds
+        self.fallback_calls += 1
+        return self._local_service().embed_documents(texts, batch_size=batch_size)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "remote_calls": self.remote_calls,
+            "fallback_calls": self.fallback_calls,
+            "local_model_loaded": self._local is not None,
+        }
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def create_embedding_service() -> "EmbeddingService | RemoteEmbeddingService":
+    """Shared embedding server client when ``EMBEDDING_SERVER_URL`` is set, else the in-process model."""
+    if not settings.embedding_server_url:
+        from .embedding import EmbeddingService
+
+        return EmbeddingService()
+
+    client = RemoteEmbeddingService()
+    try:
+        info = client.wait_ready(settings.embedding_server_wait_seconds)
+    except httpx.HTTPError as exc:
+        if not client.fallback:
+            raise
+        logger.warning("嵌入服务 %s 未就绪（%s），改用进程内模型", client.url, exc)
+        client.use_local()
+        return client
+    logger.info("使用嵌入服务 %s（模型 %s，%s 后端）", client.url, info.get("model"), info.get("backend"))
+    return client
+
+
+__all__ = ["RemoteEmbeddingService", "create_embedding_service"]
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+READY = "ready"
+
+
+def _pin_worker(worker_id: int, num_threads: int) -> None:
+    if not hasattr(os, "sched_getaffinity"):
+        return
+    cores = sorted(os.sched_getaffinity(0))
+    start = worker_id * num_threads
+    assigned = cores[start:start + num_threads]
+    if len(assigned) == num_threads:
+        os.sched_setaffinity(0, assigned)
+
+
+def _worker_main(
+    worker_id: int,
+    model_path: str,
+    batch_size: int,
+    num_threads: int,
+    pin_cores: bool,
+    shm_name: str,
+    tasks: "mp.Queue",
+    results: "mp.Queue",
+) -> None:
+    import torch
+
+    from .embedding import EmbeddingService
+
+    if pin_cores:
+        _pin_worker(worker_id, num_threads)
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        service = EmbeddingService(model_path=Path(model_path), batch_size=batch_size, threads=num_threads)
+        output = np.ndarray((shm.size // 4,), dtype=np.float32, buffer=shm.buf)
+        results.put((READY, worker_id, 0, None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            job_id, texts = task
+            try:
+                vectors = service.encode(texts)
+                count = vectors.shape[0] * vectors.shape[1]
+                output[:count] = vectors.reshape(-1).numpy()
+                results.put((job_id, worker_id, vectors.shape[0], None))
+            except Exception as exc:  # pragma: no cover - reported to the parent
+                results.put((job_id, worker_id, 0, repr(exc)))
+        del output
+    except Exception as exc:  # pragma: no cover - model failed to load
+        results.put((READY, worker_id, 0, repr(exc)))
+    finally:
+        shm.close()
+
+
+class EmbeddingWorkerPool:
+    """Shard embedding batches across worker processes on CPU-only hosts.
+
+    Each worker loads its own ``EmbeddingService`` with a fixed intra-op
+    thread count (optionally pinned to its own cores) and writes vectors into
+    a per-worker shared-memory buffer, so results come back as raw float32
+    rows instead of pickled Python lists. Exposes the same
+    ``embed_documents`` surface as ``EmbeddingService``.
+    """
+
+    def __init__(
+        self,
+        num_workers: int | None = None,
+        threads_per_worker: int | None = None,
+        model_path: Path | None = None,
+        batch_size: int | None = None,
+        task_size: int | None = None,
+        pin_cores: bool = True,
+        start_timeout: float = 600.0,
+    ) -> None:
+        self.num_workers = max(1, num_workers or settings.embedding_workers or 1)
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        self.threads_per_worker = max(
+            1, threads_per_worker or settings.embedding_threads_per_worker or cpu_count // self.num_workers
+        )
+        self.batch_size = batch_size or settings.embedding_batch_size
+        self.task_size = max(1, task_size or self.batch_size * 4)
+        self.dim = settings.embedding_dim
+        self._lock = threading.Lock()
+        self._job_ids = 0
+
+        context = mp.get_context("spawn")
+        self._results: "mp.Queue" = context.Queue()
+        self._tasks: List["mp.Queue"] = []
+        self._buffers: List[SharedMemory] = []
+        self._processes: List[mp.Process] = []
+        path = str(Path(model_path or settings.embedding_model_path))
+        logger.info(
+            "Starting %d embedding workers with %d threads each", self.num_workers, self.threads_per_worker
+        )
+        try:
+            for worker_id in range(self.num_workers):
+                shm = SharedMemory(create=True, size=self.task_size * self.dim * 4)
+                tasks = context.Queue()
+                process = context.Process(
+                    target=_worker_main,
+                    args=(
+                        worker_id,
+                        path,
+                        self.batch_size,
+                        self.threads_per_worker,
+                        pin_cores,
+                        shm.name,
+                        tasks,
+                        self._results,
+                    ),
+                    name=f"embedding-worker-{worker_id}",
+                    daemon=True,
+                )
+                process.start()
+                self._buffers.append(shm)
+                self._tasks.append(tasks)
+                self._processes.append(process)
+
+            for _ in range(self.num_workers):
+                tag, worker_id, _, error = self._next_result(start_timeout)
+                if tag != READY or error:
+                    raise RuntimeError(f"Embedding worker {worker_id} failed to start: {error}")
+        except Exception:
+            self.close()
+            raise
+
+    def _next_result(self, timeout: float):
+        deadline_step = 1.0
+        waited = 0.0
+        while True:
+            try:
+                return self._results.get(timeout=deadline_step)
+            except queue.Empty:
+                waited += deadline_step
+                dead = [process.name for process in self._processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Embedding workers exited unexpectedly: {', '.join(dead)}")
+                if waited >= timeout:
+                    raise TimeoutError("Timed out waiting for embedding workers")
+
+    def encode(self, texts: Iterable[str]) -> np.ndarray:
+        """Embed ``texts`` into a ``(len(texts), dim)`` float32 array."""
+        texts = list(texts)
+        output = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return output
+
+        # 按长度排序后切分任务，让每个 worker 拿到的文本长度相近，减少 padding
+        order = sorted(range(len(texts)), key=lambda idx: len(texts[idx]))
+        pending = [order[start:start + self.task_size] for start in range(0, len(order), self.task_size)]
+        pending.reverse()
+        with self._lock:
+            idle = list(range(self.num_workers))
+            in_flight = {}
+            failure = None
+            while pending or in_flight:
+                while pending and idle:
+                    worker_id = idle.pop()
+                    indices = pending.pop()
+                    self._job_ids += 1
+                    in_flight[self._job_ids] = indices
+                    self._tasks[worker_id].put((self._job_ids, [texts[idx] for idx in indices]))
+
+                job_id, worker_id, rows, error = self._next_result(timeout=3600.0)
+                indices = in_flight.pop(job_id, None)
+                if indices is None:
+                    # 之前某次调用超时后才送达的结果，与本次调用无关
+                    logger.warning("Ignoring stale result of embedding job %s from worker %d", job_id, worker_id)
+                    continue
+                idle.append(worker_id)
+                if error:
+                    # 不再派发新任务，但要收完本次已派出的结果，否则会留在结果队列里污染下一次调用
+                    failure = failure or RuntimeError(f"Embedding worker {worker_id} failed: {error}")
+                    pending.clear()
+                    continue
+                if failure is not None:
+                    continue
+                view = np.ndarray((rows, self.dim), dtype=np.float32, buffer=self._buffers[worker_id].buf)
+                output[indices] = view
+                del view
+            if failure is not None:
+                raise failure
+        return output
+
+    def embed_documents(self, texts: Iterable[str], batch_size: int | None = None) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def close(self) -> None:
+        for tasks, process in zip(self._tasks, self._processes):
+            if process.is_alive():
+                tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        for shm in self._buffers:
+            shm.close()
+            shm.unlink()
+        self._processes.clear()
+        self._tasks.clear()
+        self._buffers.clear()
+
+    def __enter__(self) -> "EmbeddingWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+__all__ = ["EmbeddingWorkerPool"]
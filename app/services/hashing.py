@@ -28,5 +28,20 @@ class NovelHasher:
 
         return ":".join(hasher.hexdigest() for hasher in hashers)
 
+    @staticmethod
+    def hash_chapter(chapter_title: str, chapter_text: str) -> str:
+        """Stable fingerprint of one chapter, used to detect edited chapters."""
+        hasher = hashlib.sha256()
+        hasher.update(chapter_title.encode("utf-8"))
+        hasher.update(b"\0")
+        hasher.update(chapter_text.encode("utf-8"))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def chunk_id(file_hash: str, chapter_key: str, chunk_index: int) -> int:
+        """Deterministic 63-bit primary key so re-writing a chunk overwrites the same row."""
+        digest = hashlib.blake2b(f"{file_hash}\0{chapter_key}\0{chunk_index}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") & 0x7FFF_FFFF_FFFF_FFFF
+
 
 __all__ = ["NovelHasher"]
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# 各索引类型的默认建索引参数与检索参数
+_DEFAULT_BUILD_PARAMS: Dict[str, Dict[str, Any]] = {
+    "FLAT": {},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_SQ8": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 16, "nbits": 8},
+    "HNSW": {"M": 16, "efConstruction": 200},
+    "DISKANN": {},
+    "AUTOINDEX": {},
+}
+_DEFAULT_SEARCH_PARAMS: Dict[str, Dict[str, Any]] = {
+    "FLAT": {},
+    "IVF_FLAT": {"nprobe": 32},
+    "IVF_SQ8": {"nprobe": 32},
+    "IVF_PQ": {"nprobe": 32},
+    "HNSW": {"ef": 64},
+    "DISKANN": {"search_list": 100},
+    "AUTOINDEX": {},
+}
+INDEX_TYPES = tuple(_DEFAULT_BUILD_PARAMS)
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """ANN index of one collection: how it is built and how it is searched."""
+
+    index_type: str
+    build_params: Dict[str, Any] = field(default_factory=dict)
+    search_params: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def create(
+        cls,
+        index_type: str,
+        build_params: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> "IndexProfile":
+        """Profile of ``index_type``; parameters not given fall back to the type's defaults."""
+        index_type = index_type.upper()
+        if index_type not in _DEFAULT_BUILD_PARAMS:
+            raise ValueError(f"Unknown index type {index_type}; expected one of {', '.join(INDEX_TYPES)}")
+        return cls(
+            index_type=index_type,
+            build_params={**_DEFAULT_BUILD_PARAMS[index_type], **(build_params or {})},
+            search_params={**_DEFAULT_SEARCH_PARAMS[index_type], **(search_params or {})},
+        )
+
+    @classmethod
+    def from_settings(cls) -> "IndexProfile":
+        return cls.create(settings.milvus_index_type, settings.milvus_index_params, settings.milvus_search_params)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndexProfile":
+        return cls.create(data["index_type"], data.get("build_params"), data.get("search_params"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index_type": self.index_type, "build_params": self.build_params, "search_params": self.search_params}
+
+    def same_index(self, other: "IndexProfile") -> bool:
+        """Whether both profiles share one built index (only search parameters differ)."""
+        return self.index_type == other.index_type and self.build_params == other.build_params
+
+    def index_params(self, metric_type: str) -> Dict[str, Any]:
+        return {"metric_type": metric_type, "index_type": self.index_type, "params": dict(self.build_params)}
+
+    def search_param(
+        self, metric_type: str, top_k: int, overrides: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        params = {**self.search_params, **(overrides or {})}
+        if "ef" in params:
+            # HNSW 要求 ef 不小于返回条数
+            params["ef"] = max(int(params["ef"]), top_k)
+        return {"metric_type": metric_type, "params": params}
+
+    @property
+    def label(self) -> str:
+        build = ",".join(f"{key}={value}" for key, value in self.build_params.items())
+        search = ",".join(f"{key}={value}" for key, value in self.search_params.items())
+        return f"{self.index_type}({build})" + (f" {search}" if search else "")
+
+
+class IndexProfileStore:
+    """JSON file mapping collection name -> :class:`IndexProfile`.
+
+    A collection records the profile it was created with, so changing
+    ``MILVUS_INDEX_TYPE`` only affects new collections, and
+    ``scripts/tune_index.py --apply`` can switch an existing one. The file
+    is re-read when another process (the tuning script) rewrites it.
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path or settings.index_profiles_path)
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, IndexProfile] = {}
+        self._mtime: Optional[float] = None
+
+    def _reload_locked(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            self._profiles, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._profiles = {name: IndexProfile.from_dict(entry) for name, entry in data.items()}
+        except (ValueError, KeyError) as exc:
+            logger.warning("索引配置文件 %s 无法解析，忽略：%s", self.path, exc)
+            self._profiles = {}
+        self._mtime = mtime
+
+    def _write_locked(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        data = {name: profile.to_dict() for name, profile in sorted(self._profiles.items())}
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._mtime = self.path.stat().st_mtime
+
+    def get(self, collection_name: str) -> Optional[IndexProfile]:
+        with self._lock:
+            self._reload_locked()
+            return self._profiles.get(collection_name)
+
+    def save(self, collection_name: str, profile: IndexProfile) -> None:
+        with self._lock:
+            self._reload_locked()
+            self._profiles[collection_name] = profile
+            self._write_locked()
+
+    def remove(self, collection_name: str) -> None:
+        with self._lock:
+            self._reload_locked()
+            if self._profiles.pop(collection_name, None) is not None:
+                self._write_locked()
+
+
+__all__ = ["INDEX_TYPES", "IndexProfile", "IndexProfileStore"]
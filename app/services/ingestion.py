@@ -0,0 +1,537 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from ..models.api import NovelUploadResult
+from .bulk_import import ParquetBulkWriter
+from .catalog import CollectionCatalog
+from .checkpoint import CheckpointStore, IngestManifest
+from .chunk_cache import ChunkEmbeddingCache
+from .embedding import EmbeddingService
+from .embedding_pool import EmbeddingWorkerPool
+from .hashing import NovelHasher
+from .lexical_index import LexicalIndex, LexicalIndexRegistry
+from .text_splitter import ChapterTextSplitter, Chunk
+from .vector_store import BufferedWriter, VectorRecord, VectorStore, create_vector_store
+
+logger = logging.getLogger(__name__)
+
+MAX_CHAPTER_TITLE_LEN = 512
+
+
+@dataclass
+class FileJob:
+    path: Path
+    book_title: str
+    file_hash: str
+    collection_name: str
+    extra_collection_name: Optional[str] = None
+    chunks_indexed: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    # 增量入库：库中已有章节 hash -> (章节名, 分片数)，以及本次文件中仍然存在的章节
+    incremental: bool = False
+    existing_chapters: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+    seen_chapters: Set[str] = field(default_factory=set)
+    replaced_chunks: int = 0
+    added_chunks: int = 0
+    chunks_deleted: int = 0
+    batch_size: int = 1000
+    checkpoint: Optional[IngestManifest] = None
+
+    @property
+    def chunks_reused(self) -> int:
+        return sum(self.existing_chapters[chapter_hash][1] for chapter_hash in self.seen_chapters)
+
+
+@dataclass
+class ChunkBatch:
+    job: FileJob
+    index: int
+    chunks: List[Chunk]
+    embeddings: Optional[List[List[float]]] = None
+    last: bool = False
+
+
+class StageStats:
+    """Throughput bookkeeping for a single pipeline stage."""
+
+    def __init__(self, name: str, unit: str) -> None:
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.units = 0
+        self.busy = 0.0
+
+    def record(self, units: int, elapsed: float) -> None:
+        self.items += 1
+        self.units += units
+        self.busy += elapsed
+
+    def describe(self, wall: float) -> str:
+        busy_rate = self.units / self.busy if self.busy else 0.0
+        wall_rate = self.units / wall if wall else 0.0
+        utilisation = self.busy / wall * 100 if wall else 0.0
+        return (
+            f"{self.name}: {self.units} {self.unit} "
+            f"({wall_rate:.1f}/s, {busy_rate:.1f}/s busy, {utilisation:.0f}% busy)"
+        )
+
+
+class IngestionPipeline:
+    """Staged, overlapped novel ingestion with bounded queues.
+
+    Reading/hashing, splitting, embedding and Milvus insertion run as
+    concurrent stages connected by bounded queues, so the CPU keeps embedding
+    while Milvus is writing and several files can be in flight at once. Full
+    queues block the upstream stage, which bounds memory use.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService | EmbeddingWorkerPool,
+        vector_store: VectorStore,
+        splitter: ChapterTextSplitter,
+        hasher: NovelHasher,
+        chunk_cache: ChunkEmbeddingCache | None = None,
+        checkpoints: CheckpointStore | None = None,
+        *,
+        batch_size: int = 1000,
+        files_in_flight: int = 2,
+        queue_size: int = 4,
+        force: bool = False,
+        report_interval: float = 10.0,
+        bulk_import_dir: Path | None = None,
+        lexical_indexes: LexicalIndexRegistry | None = None,
+        catalog: CollectionCatalog | None = None,
+    ) -> None:
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.splitter = splitter
+        self.hasher = hasher
+        self.chunk_cache = chunk_cache
+        self.checkpoints = checkpoints
+        self.batch_size = batch_size
+        self.files_in_flight = max(1, files_in_flight)
+        self.queue_size = max(1, queue_size)
+        self.force = force
+        self.report_interval = report_interval
+        self.bulk_import_dir = bulk_import_dir
+        self.lexical_indexes = lexical_indexes
+        self._lexical_touched: Set[str] = set()
+        # 批量导入的数据要等提交导入后才可见，届时由 scripts/bulk_import.py 重建目录
+        self.catalog = catalog if bulk_import_dir is None else None
+        self.results: List[NovelUploadResult] = []
+        self._extra_stores: Dict[str, VectorStore] = {}
+        self._writers: Dict[str, Union[BufferedWriter, ParquetBulkWriter]] = {}
+        self._stats = {
+            "read": StageStats("read", "bytes"),
+            "split": StageStats("split", "chunks"),
+            "embed": StageStats("embed", "chunks"),
+            "insert": StageStats("insert", "rows"),
+        }
+        self._queues: Dict[str, asyncio.Queue] = {}
+
+    async def run(self, files: Sequence[Tuple[Path, Optional[str]]], collection_name: str) -> List[NovelUploadResult]:
+        """Ingest ``files`` (path, optional per-book collection) into ``collection_name``."""
+        split_queue: asyncio.Queue = asyncio.Queue(maxsize=self.files_in_flight)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        insert_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues = {"split": split_queue, "embed": embed_queue, "insert": insert_queue}
+
+        if self.bulk_import_dir is not None:
+            logger.info("批量导入模式：分片写入 %s 下的 Parquet 文件，不做增量对比与断点记录", self.bulk_import_dir)
+        elif not await asyncio.to_thread(self.vector_store.uses_chunk_ids, collection_name):
+            logger.warning("集合 %s 使用 auto_id 主键，无法按分片覆盖写入；中断后续传可能产生少量重复分片", collection_name)
+
+        started = time.perf_counter()
+        reporter = asyncio.create_task(self._report(started))
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(self._read_stage(files, collection_name, split_queue))
+                group.create_task(self._split_stage(split_queue, embed_queue))
+                group.create_task(self._embed_stage(embed_queue, insert_queue))
+                group.create_task(self._insert_stage(insert_queue))
+            await asyncio.to_thread(self._close_writers, True)
+            await asyncio.to_thread(self._optimize_lexical)
+        finally:
+            reporter.cancel()
+            await asyncio.to_thread(self._close_writers, False)
+
+        wall = time.perf_counter() - started
+        logger.info("入库完成，用时 %.1fs", wall)
+        for stats in self._stats.values():
+            logger.info("  %s", stats.describe(wall))
+        return self.results
+
+    # ------------------------------------------------------------------ stages
+    async def _read_stage(
+        self,
+        files: Sequence[Tuple[Path, Optional[str]]],
+        collection_name: str,
+        output: asyncio.Queue,
+    ) -> None:
+        for path, extra_collection_name in files:
+            started = time.perf_counter()
+            book_title = path.stem
+            logger.info("读取 %s（书名：%s）", path, book_title)
+            file_hash = await asyncio.to_thread(self.hasher.hash_file, path, [book_title])
+            checkpoint = None
+            if self.checkpoints is not None:
+                checkpoint = await asyncio.to_thread(self.checkpoints.load, collection_name, file_hash)
+            # 有未完成的断点时，库里虽然已有该文件的分片，也要继续写完
+            if (
+                checkpoint is None
+                and not self.force
+                and await asyncio.to_thread(self.vector_store.has_file, file_hash, collection_name)
+            ):
+                logger.info("检测到 %s 已上传过，未指定 --force，自动跳过", path)
+                self.results.append(
+                    NovelUploadResult(
+                        book_title=book_title,
+                        file_path=str(path),
+                        file_hash=file_hash,
+                        chunks_indexed=0,
+                        skipped=True,
+                    )
+                )
+                continue
+
+            if checkpoint is not None and checkpoint.extra_collection_name:
+                extra_collection_name = checkpoint.extra_collection_name
+            if extra_collection_name and extra_collection_name not in self._extra_stores:
+                logger.info("为文件 %s 使用独立集合 %s", path.name, extra_collection_name)
+                self._extra_stores[extra_collection_name] = await asyncio.to_thread(
+                    create_vector_store, extra_collection_name
+                )
+
+            job = FileJob(
+                path=path,
+                book_title=book_title,
+                file_hash=file_hash,
+                collection_name=collection_name,
+                extra_collection_name=extra_collection_name,
+                batch_size=self.batch_size,
+            )
+            if checkpoint is not None:
+                await asyncio.to_thread(self._resume, job, checkpoint)
+            elif self.bulk_import_dir is None:
+                await asyncio.to_thread(self._prepare, job)
+                await asyncio.to_thread(self._start_checkpoint, job)
+            elif self.force:
+                # 批量导入不做增量对比，但 --force 仍要先删掉旧分片，否则导入后会重复
+                await asyncio.to_thread(self._delete_book, job)
+
+            # 正文不在这里读入，切分阶段按块流式读取文件
+            self._stats["read"].record(path.stat().st_size, time.perf_counter() - started)
+            await output.put(job)
+        await output.put(None)
+
+    async def _split_stage(self, source: asyncio.Queue, output: asyncio.Queue) -> None:
+        while True:
+            job: Optional[FileJob] = await source.get()
+            if job is None:
+                break
+            # 切分生成器边读文件边产出分片，内存只与最长章节有关，与文件大小无关
+            chunks = self._iter_chunks(job)
+            completed = job.checkpoint.completed_batches if job.checkpoint is not None else {}
+            index = 0
+            while True:
+                started = time.perf_counter()
+                batch = await asyncio.to_thread(self._take, chunks, job.batch_size)
+                if not batch:
+                    break
+                self._stats["split"].record(len(batch), time.perf_counter() - started)
+                # 断点续传：已写入的批次仍需切分（用于统计章节），但不再嵌入和写入
+                if index not in completed:
+                    await output.put(ChunkBatch(job=job, index=index, chunks=batch))
+                index += 1
+            await output.put(ChunkBatch(job=job, index=index, chunks=[], last=True))
+        await output.put(None)
+
+    async def _embed_stage(self, source: asyncio.Queue, output: asyncio.Queue) -> None:
+        while True:
+            batch: Optional[ChunkBatch] = await source.get()
+            if batch is None:
+                break
+            if batch.chunks:
+                started = time.perf_counter()
+                batch.embeddings = await asyncio.to_thread(self._embed, [chunk.content for chunk in batch.chunks])
+                self._stats["embed"].record(len(batch.chunks), time.perf_counter() - started)
+            await output.put(batch)
+        await output.put(None)
+
+    async def _insert_stage(self, source: asyncio.Queue) -> None:
+        while True:
+            batch: Optional[ChunkBatch] = await source.get()
+            if batch is None:
+                break
+            job = batch.job
+            if batch.chunks:
+                started = time.perf_counter()
+                records = self._build_records(batch)
+                await asyncio.to_thread(self._write, job, batch.index, records)
+                job.chunks_indexed += len(records)
+                self._stats["insert"].record(len(records), time.perf_counter() - started)
+            if batch.last:
+                await asyncio.to_thread(self._finish, job)
+
+    # ------------------------------------------------------------------ helpers
+    def _stores_for(self, job: FileJob) -> List[Tuple[VectorStore, str]]:
+        stores = [(self.vector_store, job.collection_name)]
+        if job.extra_collection_name:
+            extra_store = self._extra_stores[job.extra_collection_name]
+            stores.append((extra_store, extra_store.collection_name))
+        return stores
+
+    def _prepare(self, job: FileJob) -> None:
+        """Decide between a full re-upload and a chapter-level incremental update."""
+        if self.force:
+            self._delete_book(job)
+            return
+
+        if not self.vector_store.supports_chapter_hashes(job.collection_name):
+            logger.warning("集合 %s 不含 chapter_hash 字段，无法增量更新，将整本写入", job.collection_name)
+            return
+        job.existing_chapters = self.vector_store.fetch_chapters(job.book_title, job.collection_name)
+        job.incremental = bool(job.existing_chapters)
+        if job.incremental:
+            logger.info(
+                "《%s》已有 %d 个章节在库中，按章节增量更新", job.book_title, len(job.existing_chapters)
+            )
+
+    def _delete_book(self, job: FileJob) -> None:
+        # 强制重传：先删掉这本书的旧分片，避免留下重复数据
+        for store, name in self._stores_for(job):
+            deleted = store.delete_book(job.book_title, name)
+            self._lexical_call(name, "delete_book", job.book_title)
+            if deleted:
+                logger.info("--force：已从集合 %s 删除《%s》的 %d 个旧分片", name, job.book_title, deleted)
+                job.chunks_deleted += deleted
+
+    def _start_checkpoint(self, job: FileJob) -> None:
+        if self.checkpoints is None:
+            return
+        job.checkpoint = IngestManifest(
+            collection_name=job.collection_name,
+            file_hash=job.file_hash,
+            book_title=job.book_title,
+            batch_size=job.batch_size,
+            chunk_size=self.splitter.chunk_size,
+            chunk_overlap=self.splitter.chunk_overlap,
+            extra_collection_name=job.extra_collection_name,
+            incremental=job.incremental,
+            existing_chapters={key: list(value) for key, value in job.existing_chapters.items()},
+        )
+        self.checkpoints.save(job.checkpoint)
+
+    def _resume(self, job: FileJob, checkpoint: IngestManifest) -> None:
+        """Continue an interrupted upload from its manifest instead of re-checking the collection."""
+        job.checkpoint = checkpoint
+        job.incremental = checkpoint.incremental
+        job.existing_chapters = {key: (value[0], value[1]) for key, value in checkpoint.existing_chapters.items()}
+        if (checkpoint.chunk_size, checkpoint.chunk_overlap) != (self.splitter.chunk_size, self.splitter.chunk_overlap):
+            # 切分参数变了，批次编号对不上：删掉上次写了一半的分片后从头写
+            logger.warning("《%s》的切分参数与断点记录不一致，清除已写入的部分后重新写入", job.book_title)
+            for store, name in self._stores_for(job):
+                store.delete_file(job.file_hash, name)
+                self._lexical_call(name, "delete_file", job.file_hash)
+            checkpoint.chunk_size = self.splitter.chunk_size
+            checkpoint.chunk_overlap = self.splitter.chunk_overlap
+            checkpoint.batch_size = job.batch_size
+            checkpoint.completed_batches.clear()
+            self.checkpoints.save(checkpoint)
+            return
+        # 沿用断点记录的批大小，保证批次编号与上次一致
+        job.batch_size = checkpoint.batch_size
+        job.chunks_indexed = checkpoint.rows_written
+        logger.info(
+            "《%s》上次上传未完成，已写入 %d 批（%d 个分片），从断点继续",
+            job.book_title,
+            len(checkpoint.completed_batches),
+            checkpoint.rows_written,
+        )
+
+    def _iter_chunks(self, job: FileJob) -> Iterator[Chunk]:
+        existing_titles = {title for title, _ in job.existing_chapters.values()}
+        for chunk in self.splitter.split_file(job.path, book_title=job.book_title):
+            if len(chunk.chapter_title) > MAX_CHAPTER_TITLE_LEN:
+                logger.warning(
+                    "跳过一条记录：chapter_title_len=%d, title=%r", len(chunk.chapter_title), chunk.chapter_title[:80]
+                )
+                continue
+            if chunk.chapter_hash in job.existing_chapters:
+                # 章节内容未变化，直接复用库中已有的分片
+                job.seen_chapters.add(chunk.chapter_hash)
+                continue
+            if chunk.chapter_title in existing_titles:
+                job.replaced_chunks += 1
+            else:
+                job.added_chunks += 1
+            yield chunk
+
+    @staticmethod
+    def _take(iterator: Iterator[Chunk], size: int) -> List[Chunk]:
+        return list(itertools.islice(iterator, size))
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.chunk_cache is not None:
+            return self.chunk_cache.embed(texts, self.embedding_service.embed_documents)
+        return self.embedding_service.embed_documents(texts)
+
+    @staticmethod
+    def _build_records(batch: ChunkBatch) -> List[VectorRecord]:
+        return [
+            VectorRecord(
+                content=chunk.content,
+                embedding=embedding,
+                book_title=chunk.book_title,
+                chapter_title=chunk.chapter_title,
+                chunk_index=chunk.chunk_index,
+                source_path=str(chunk.source_path),
+                file_hash=batch.job.file_hash,
+                chapter_hash=chunk.chapter_hash,
+            )
+            for chunk, embedding in zip(batch.chunks, batch.embeddings or [])
+        ]
+
+    def _writer(self, store: VectorStore, collection_name: str) -> Union[BufferedWriter, ParquetBulkWriter]:
+        writer = self._writers.get(collection_name)
+        if writer is None:
+            if self.bulk_import_dir is not None:
+                writer = ParquetBulkWriter(store, collection_name, self.bulk_import_dir)
+            else:
+                writer = store.buffered_writer(collection_name)
+            self._writers[collection_name] = writer
+        return writer
+
+    def _lexical(self, collection_name: str, create: bool = False) -> LexicalIndex | None:
+        if self.lexical_indexes is None:
+            return None
+        return self.lexical_indexes.get(collection_name, create=create)
+
+    def _lexical_call(self, collection_name: str, method: str, *args) -> None:
+        """Mirror a delete on the collection's lexical index, if one exists."""
+        index = self._lexical(collection_name)
+        if index is not None:
+            getattr(index, method)(*args)
+            self._lexical_touched.add(collection_name)
+
+    def _optimize_lexical(self) -> None:
+        for name in sorted(self._lexical_touched):
+            self._lexical(name).optimize()
+        self._lexical_touched.clear()
+
+    def _write(self, job: FileJob, index: int, records: List[VectorRecord]) -> None:
+        stores = self._stores_for(job)
+        # 词法倒排索引与切分同步构建，写在向量之前：断点续传时重复写入会按分片 id 去重
+        if self.lexical_indexes is not None:
+            for _, name in stores:
+                self._lexical(name, create=True).add(records)
+                self._lexical_touched.add(name)
+        # 主集合与 single_collection 的独立集合各自缓冲、在后台并行写入
+        futures = [self._writer(store, name).add(records) for store, name in stores]
+        if job.checkpoint is not None:
+            checkpoint = job.checkpoint
+            self._when_written(futures, lambda: self.checkpoints.mark_batch(checkpoint, index, len(records)))
+
+    @staticmethod
+    def _when_written(futures: List[Future], callback: Callable[[], None]) -> None:
+        """Run ``callback`` once every future succeeded (a batch counts only when all collections have it)."""
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(future: Future) -> None:
+            if future.exception() is not None:
+                return
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                callback()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _close_writers(self, flush: bool) -> None:
+        writers, self._writers = list(self._writers.values()), {}
+        for writer in writers:
+            try:
+                writer.close(flush=flush)
+            except Exception:
+                if flush:
+                    raise
+                logger.exception("关闭写入器 %s 失败", writer.collection_name)
+
+    def _finish(self, job: FileJob) -> None:
+        # 一本书写完才 flush 一次；删除旧章节、清除断点都必须在新分片落库之后
+        for store, name in self._stores_for(job):
+            self._writer(store, name).flush()
+
+        if job.incremental:
+            # 文件中已不存在（被修改或删除）的章节，在新分片写入后再删除旧分片
+            stale = [chapter_hash for chapter_hash in job.existing_chapters if chapter_hash not in job.seen_chapters]
+            if stale:
+                for store, name in self._stores_for(job):
+                    self._lexical_call(name, "delete_chapters", job.book_title, stale)
+                    if store.supports_chapter_hashes(name):
+                        deleted = store.delete_chapters(job.book_title, stale, name)
+                        if name == job.collection_name:
+                            job.chunks_deleted += deleted
+            logger.info(
+                "《%s》增量更新：复用 %d 个分片，替换章节写入 %d 个，新增章节写入 %d 个，删除旧分片 %d 个",
+                job.book_title,
+                job.chunks_reused,
+                job.replaced_chunks,
+                job.added_chunks,
+                job.chunks_deleted,
+            )
+
+        if self.catalog is not None:
+            # 未变化的章节沿用库中已有分片，这本书现在的分片总数是复用数加本次写入数
+            for _, name in self._stores_for(job):
+                self.catalog.record_book(
+                    name, job.book_title, job.chunks_reused + job.chunks_indexed, job.file_hash, str(job.path)
+                )
+
+        if job.checkpoint is not None:
+            self.checkpoints.remove(job.checkpoint)
+
+        elapsed = time.perf_counter() - job.started_at
+        logger.info("已向集合 %s 写入《%s》%d 个分片，用时 %.1fs", job.collection_name, job.book_title, job.chunks_indexed, elapsed)
+        if job.extra_collection_name:
+            logger.info("已向独立集合 %s 额外写入 %d 个分片", job.extra_collection_name, job.chunks_indexed)
+        self.results.append(
+            NovelUploadResult(
+                book_title=job.book_title,
+                file_path=str(job.path),
+                file_hash=job.file_hash,
+                chunks_indexed=job.chunks_indexed,
+                chunks_reused=job.chunks_reused,
+                chunks_deleted=job.chunks_deleted,
+            )
+        )
+
+    async def _report(self, started: float) -> None:
+        while True:
+            await asyncio.sleep(self.report_interval)
+            wall = time.perf_counter() - started
+            depths = " ".join(
+                f"{name}={queue.qsize()}/{queue.maxsize}" for name, queue in self._queues.items()
+            )
+            logger.info(
+                "进度 %.0fs | %s | 队列 %s",
+                wall,
+                " | ".join(stats.describe(wall) for stats in self._stats.values()),
+                depths,
+            )
+
+
+__all__ = ["ChunkBatch", "FileJob", "IngestionPipeline", "StageStats"]
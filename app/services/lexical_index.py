@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import logging
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .vector_store import SearchHit, VectorRecord
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+")
+_SQLITE_MAX_VARIABLES = 500
+_DOC_FIELDS = ("book_title", "chapter_title", "chunk_index", "source_path", "content")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into CJK character bigrams plus lower-cased ASCII words."""
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        run = match.group()
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+    return tokens
+
+
+@dataclass
+class LexicalResult:
+    hits: List[SearchHit] = field(default_factory=list)
+    # 查询较短、且有足够多的分片包含查询中的全部二元组时，认为词法结果足以回答，可跳过向量检索
+    confident: bool = False
+    terms: int = 0
+
+
+class LexicalIndex:
+    """BM25 over character bigrams for one collection, stored in SQLite.
+
+    Posting lists are packed int64/int32 blobs; every written batch appends a
+    new segment per term and :meth:`optimize` merges them after an upload.
+    Document lengths are held in NumPy arrays and recent posting lists in an
+    LRU, so repeated lookups of hot names never leave memory. Readers in
+    other processes notice writes through the ``generation`` counter.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, path: Path, cache_terms: int = 4096) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "id INTEGER PRIMARY KEY, book_title TEXT, chapter_title TEXT, chunk_index INTEGER, "
+            "source_path TEXT, file_hash TEXT, chapter_hash TEXT, content TEXT, length INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_book ON docs (book_title, chapter_hash)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_file ON docs (file_hash)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_ids BLOB NOT NULL, tfs BLOB NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS postings_term ON postings (term)")
+        self._db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('generation', 0)")
+        self._db.commit()
+        self.cache_terms = cache_terms
+        self._postings: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._loaded_generation = -1
+        self._doc_ids = np.empty(0, dtype=np.int64)
+        self._lengths = np.empty(0, dtype=np.float32)
+        self._avgdl = 0.0
+
+    # ------------------------------------------------------------------ writes
+    def _bump_generation(self) -> None:
+        self._db.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+
+    def add(self, records: Sequence[VectorRecord]) -> None:
+        docs = []
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for record in records:
+            counts = Counter(tokenize(record.content))
+            chunk_id = record.chunk_id
+            docs.append(
+                (
+                    chunk_id,
+                    record.book_title,
+                    record.chapter_title,
+                    record.chunk_index,
+                    record.source_path,
+                    record.file_hash,
+                    record.chapter_hash,
+                    record.content,
+                    sum(counts.values()),
+                )
+            )
+            for term, tf in counts.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(chunk_id)
+                tfs.append(tf)
+        if not docs:
+            return
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", docs)
+            self._db.executemany(
+                "INSERT INTO postings (term, doc_ids, tfs) VALUES (?, ?, ?)",
+                (
+                    (term, np.asarray(ids, dtype=np.int64).tobytes(), np.asarray(tfs, dtype=np.int32).tobytes())
+                    for term, (ids, tfs) in postings.items()
+                ),
+            )
+            self._bump_generation()
+
+    def _delete(self, where: str, params: Sequence[object]) -> int:
+        # 倒排表里残留的文档 id 在查询时按存活文档过滤，optimize 时清理
+        with self._lock, self._db:
+            deleted = self._db.execute(f"DELETE FROM docs WHERE {where}", params).rowcount
+            if deleted:
+                self._bump_generation()
+        return deleted
+
+    def delete_book(self, book_title: str) -> int:
+        return self._delete("book_title = ?", (book_title,))
+
+    def delete_file(self, file_hash: str) -> int:
+        return self._delete("file_hash = ?", (file_hash,))
+
+    def delete_chapters(self, book_title: str, chapter_hashes: Iterable[str]) -> int:
+        hashes = list(chapter_hashes)
+        deleted = 0
+        for start in range(0, len(hashes), _SQLITE_MAX_VARIABLES):
+            part = hashes[start:start + _SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(part))
+            deleted += self._delete(f"book_title = ? AND chapter_hash IN ({placeholders})", (book_title, *part))
+        return deleted
+
+    def optimize(self) -> None:
+        """Merge posting segments per term and drop ids of deleted documents."""
+        with self._lock:
+            live = np.fromiter((row[0] for row in self._db.execute("SELECT id FROM docs ORDER BY id")), dtype=np.int64)
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS postings_merged")
+                self._db.execute("CREATE TABLE postings_merged (term TEXT NOT NULL, doc_ids BLOB NOT NULL, tfs BLOB NOT NULL)")
+                rows = self._db.execute("SELECT term, doc_ids, tfs FROM postings ORDER BY term, rowid")
+                current: Optional[str] = None
+                segments: List[Tuple[bytes, bytes]] = []
+                merged = []
+                for term, doc_ids, tfs in rows:
+                    if term != current and segments:
+                        merged.append(self._merge(current, segments, live))
+                        segments = []
+                    current = term
+                    segments.append((doc_ids, tfs))
+                if segments:
+                    merged.append(self._merge(current, segments, live))
+                self._db.executemany(
+                    "INSERT INTO postings_merged (term, doc_ids, tfs) VALUES (?, ?, ?)",
+                    (row for row in merged if row is not None),
+                )
+                self._db.execute("DROP TABLE postings")
+                self._db.execute("ALTER TABLE postings_merged RENAME TO postings")
+                self._db.execute("CREATE INDEX IF NOT EXISTS postings_term ON postings (term)")
+                self._bump_generation()
+            self._db.execute("VACUUM")
+        logger.info("Optimized lexical index %s (%d documents)", self.path.name, len(live))
+
+    @classmethod
+    def _merge(cls, term: str, segments: List[Tuple[bytes, bytes]], live: np.ndarray):
+        ids, tfs = cls._decode(segments)
+        keep = np.isin(ids, live)
+        if not keep.any():
+            return None
+        return term, ids[keep].tobytes(), tfs[keep].tobytes()
+
+    @staticmethod
+    def _decode(segments: List[Tuple[bytes, bytes]]) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.concatenate([np.frombuffer(doc_ids, dtype=np.int64) for doc_ids, _ in segments])
+        tfs = np.concatenate([np.frombuffer(term_tfs, dtype=np.int32) for _, term_tfs in segments])
+        if len(segments) > 1:
+            # 同一文档被重复写入（覆盖写入 / 断点续传）时保留最后一次
+            _, last = np.unique(ids[::-1], return_index=True)
+            keep = np.sort(len(ids) - 1 - last)
+            ids, tfs = ids[keep], tfs[keep]
+        return ids, tfs
+
+    # ------------------------------------------------------------------ reads
+    def _refresh(self) -> None:
+        generation = self._db.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+        if generation == self._loaded_generation:
+            return
+        rows = self._db.execute("SELECT id, length FROM docs ORDER BY id").fetchall()
+        self._doc_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        self._lengths = np.fromiter((row[1] for row in rows), dtype=np.float32, count=len(rows))
+        self._avgdl = float(self._lengths.mean()) if len(rows) else 0.0
+        self._postings.clear()
+        self._loaded_generation = generation
+
+    def _posting(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        cached = self._postings.get(term)
+        if cached is not None:
+            self._postings.move_to_end(term)
+            return cached
+        segments = self._db.execute("SELECT doc_ids, tfs FROM postings WHERE term = ? ORDER BY rowid", (term,)).fetchall()
+        if segments:
+            ids, tfs = self._decode(segments)
+            # 映射到存活文档在长度数组中的下标，已删除的文档直接丢弃
+            positions = np.searchsorted(self._doc_ids, ids)
+            positions[positions >= len(self._doc_ids)] = 0
+            alive = self._doc_ids[positions] == ids
+            posting = (positions[alive], tfs[alive].astype(np.float32))
+        else:
+            posting = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        self._postings[term] = posting
+        if len(self._postings) > self.cache_terms:
+            self._postings.popitem(last=False)
+        return posting
+
+    def _book_positions(self, book_title: str) -> np.ndarray:
+        ids = np.fromiter(
+            (row[0] for row in self._db.execute("SELECT id FROM docs WHERE book_title = ?", (book_title,))),
+            dtype=np.int64,
+        )
+        positions = np.searchsorted(self._doc_ids, ids)
+        positions = positions[positions < len(self._doc_ids)]
+        allowed = np.zeros(len(self._doc_ids), dtype=bool)
+        allowed[positions] = True
+        return allowed
+
+    def search(self, query: str, top_k: int, book_title: Optional[str] = None) -> LexicalResult:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or top_k <= 0:
+            return LexicalResult(terms=len(terms))
+        with self._lock:
+            self._refresh()
+            total = len(self._doc_ids)
+            if total == 0:
+                return LexicalResult(terms=len(terms))
+            # IDF 仍按整个集合统计，只把候选限制在指定的书内
+            allowed = self._book_positions(book_title) if book_title else None
+            positions_parts = []
+            scores_parts = []
+            for term in terms:
+                positions, tfs = self._posting(term)
+                df = len(positions)
+                if allowed is not None:
+                    keep = allowed[positions]
+                    positions, tfs = positions[keep], tfs[keep]
+                if not len(positions):
+                    continue
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                norm = self.K1 * (1 - self.B + self.B * self._lengths[positions] / self._avgdl)
+                positions_parts.append(positions)
+                scores_parts.append(idf * tfs * (self.K1 + 1) / (tfs + norm))
+            if not positions_parts:
+                return LexicalResult(terms=len(terms))
+            candidates, inverse = np.unique(np.concatenate(positions_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(scores_parts))
+            matched = np.bincount(inverse)
+            count = min(top_k, len(candidates))
+            best = np.argpartition(-scores, count - 1)[:count]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            doc_ids = [int(self._doc_ids[candidates[index]]) for index in best]
+            full_matches = int((matched == len(terms)).sum())
+            entities = self._entities(doc_ids)
+
+        hits = [
+            SearchHit(id=doc_id, distance=float(scores[index]), entity=entities[doc_id])
+            for doc_id, index in zip(doc_ids, best)
+            if doc_id in entities
+        ]
+        confident = (
+            len(terms) <= settings.lexical_confident_max_terms
+            and full_matches >= min(top_k, settings.lexical_confident_min_hits)
+            and all(matched[index] == len(terms) for index in best[:1])
+        )
+        return LexicalResult(hits=hits, confident=confident, terms=len(terms))
+
+    def _entities(self, doc_ids: List[int]) -> Dict[int, Dict[str, object]]:
+        if not doc_ids:
+            return {}
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = self._db.execute(
+            f"SELECT id, {', '.join(_DOC_FIELDS)} FROM docs WHERE id IN ({placeholders})", doc_ids
+        ).fetchall()
+        return {row[0]: dict(zip(_DOC_FIELDS, row[1:])) for row in rows}
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            documents = self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            segments = self._db.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+        return {"path": str(self.path), "documents": documents, "posting_segments": segments}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class LexicalIndexRegistry:
+    """Open one :class:`LexicalIndex` per collection under ``settings.lexical_index_dir``."""
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = Path(directory or settings.lexical_index_dir)
+        self._indexes: Dict[str, LexicalIndex] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, collection_name: str) -> Path:
+        return self.directory / f"{collection_name}.sqlite3"
+
+    def get(self, collection_name: str, create: bool = False) -> Optional[LexicalIndex]:
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is None:
+                path = self.path_for(collection_name)
+                if not create and not path.exists():
+                    return None
+                index = LexicalIndex(path)
+                self._indexes[collection_name] = index
+            return index
+
+    def close(self) -> None:
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
+
+
+__all__ = ["LexicalIndex", "LexicalIndexRegistry", "LexicalResult", "tokenize"]
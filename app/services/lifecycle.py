@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
+from ..config import settings
+from .catalog import CollectionCatalog
+from .chat_history import ChatSessionManager
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .rag import RAGService
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERY = "主角是谁？"
+
+
+class ServiceNotReady(RuntimeError):
+    """Raised when a request needs the RAG pipeline before it finished initializing."""
+
+
+class ServiceLifecycle:
+    """Builds :class:`RAGService` off the import path and tracks readiness.
+
+    Importing pymilvus (and torch / transformers unless a shared embedding
+    server is used), connecting to the vector store, loading the embedding
+    model and warming it up all happen in a background thread started from
+    the app lifespan, so the process accepts connections (and answers
+    ``/healthz``) right away; ``/readyz`` turns 200 once the pipeline can
+    serve requests. Each phase is timed and logged. The chat session store
+    and the collection catalog are opened in the same thread (unless passed
+    in) and closed by :meth:`aclose`, so importing the API module touches no
+    files.
+    """
+
+    def __init__(
+        self,
+        chat_sessions: Optional[ChatSessionManager] = None,
+        catalog: Optional[CollectionCatalog] = None,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rag: Optional["RAGService"] = None
+        self._chat_sessions = chat_sessions
+        self._catalog = catalog
+        self.created_at = time.perf_counter()
+        self.phase = "pending"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.total_seconds: Optional[float] = None
+        metrics.register("startup", self.status)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def failed(self) -> bool:
+        return self.phase == "failed"
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._initialize, name="service-init", daemon=True)
+            self._thread.start()
+
+    def _require_ready(self) -> None:
+        if not self.ready:
+            if self.failed:
+                raise ServiceNotReady(f"服务初始化失败：{self.error}")
+            raise ServiceNotReady(f"服务正在初始化（{self.phase}）")
+
+    def rag(self) -> "RAGService":
+        self._require_ready()
+        return self._rag
+
+    def chat_sessions(self) -> ChatSessionManager:
+        self._require_ready()
+        return self._chat_sessions
+
+    def catalog(self) -> CollectionCatalog:
+        self._require_ready()
+        return self._catalog
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "ready": self.ready,
+            "phase": self.phase,
+            "error": self.error,
+            "uptime_seconds": round(time.perf_counter() - self.created_at, 3),
+            "total_seconds": self.total_seconds,
+            "phases": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+        }
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        self.phase = name
+        started = time.perf_counter()
+        yield
+        self.timings[name] = time.perf_counter() - started
+        logger.info("启动阶段 %s 用时 %.2fs", name, self.timings[name])
+
+    def _initialize(self) -> None:
+        try:
+            with self._phase("imports"):
+                # 重量级依赖在这里才导入，不拖慢应用对象的创建
+                from .embedding_client import create_embedding_service
+                from .rag import RAGService
+                from .vector_store import create_vector_store
+            with self._phase("stores"):
+                # 会话存储与集合目录会打开 SQLite 文件或 Redis 连接，不放在模块导入时创建
+                if self._catalog is None:
+                    self._catalog = CollectionCatalog()
+                if self._chat_sessions is None:
+                    self._chat_sessions = ChatSessionManager()
+            with self._phase("vector_store"):
+                vector_store = create_vector_store()
+            with self._phase("embedding_model"):
+                embedding_service = create_embedding_service()
+            with self._phase("rag_service"):
+                rag = RAGService(vector_store=vector_store, embedding_service=embedding_service, catalog=self._catalog)
+            if settings.startup_warmup:
+                with self._phase("warm_up"):
+                    self._warm_up(rag)
+        except Exception as exc:
+            self.phase = "failed"
+            self.error = repr(exc)
+            logger.exception("服务初始化失败")
+            return
+        self._rag = rag
+        self.total_seconds = round(time.perf_counter() - self.created_at, 3)
+        self.phase = "ready"
+        self._ready.set()
+        logger.info(
+            "服务已就绪，冷启动共 %.2fs（%s）",
+            self.total_seconds,
+            ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.timings.items()),
+        )
+
+    @staticmethod
+    def _warm_up(rag: "RAGService") -> None:
+        # 走一遍查询路径：合批线程、模型前向、上下文分词器与默认集合的加载
+        vector = rag.query_embedder.embed(WARMUP_QUERY)
+        rag.context_budgeter.count_tokens([WARMUP_QUERY])
+        store = rag.vector_store
+        if store.collection_name in store.list_collections():
+            store.search(vector, top_k=1)
+
+    async def aclose(self) -> None:
+        if self._rag is not None:
+            await self._rag.aclose()
+        for resource in (self._chat_sessions, self._catalog):
+            if resource is not None:
+                await asyncio.to_thread(resource.close)
+
+    async def await_ready(self) -> None:
+        """Block the lifespan until initialization finished (used when background init is disabled)."""
+        await asyncio.to_thread(self._thread.join)
+        if self.failed:
+            raise RuntimeError(f"服务初始化失败：{self.error}")
+
+
+__all__ = ["ServiceLifecycle", "ServiceNotReady"]
@@ -0,0 +1,683 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .index_profiles import IndexProfile, IndexProfileStore
+from .vector_codec import VectorCodec, truncate
+from .vector_store import SearchHit, VectorRecord, VectorStore
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = ("id", "book_title", "chapter_title", "chunk_index", "source_path", "file_hash", "chapter_hash", "content")
+SEARCH_FIELDS = ("book_title", "chapter_title", "chunk_index", "content", "source_path")
+# 维护“取值 -> 行号”索引的列，按书 / 按文件的查询与删除不必逐行扫描
+INDEXED_FIELDS = ("book_title", "file_hash")
+_BLOCK_ROWS = 65536
+# 经验值：每个分区至少约 39 个向量，k-means 才有意义
+_MIN_ROWS_PER_LIST = 39
+# 最多缓存这么多本书的行掩码（每个掩码占 count 字节）
+_BOOK_MASK_CACHE_SIZE = 64
+
+
+def _atomic_write(path: Path, write: Callable[[object], None], mode: str = "wb") -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open(mode) as file_obj:
+        write(file_obj)
+        file_obj.flush()
+        os.fsync(file_obj.fileno())
+    os.replace(tmp_path, path)
+
+
+class _IVFIndex:
+    """Coarse k-means partitioning: search only the rows of the ``nprobe`` closest centroids."""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, rows: int) -> None:
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.rows = rows
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        live: np.ndarray,
+        nlist: int,
+        score: Callable[[np.ndarray, np.ndarray], np.ndarray],
+        prepare: Callable[[np.ndarray], np.ndarray],
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> "_IVFIndex":
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(live, size=min(len(live), nlist * 64), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(score(sample, centroids), axis=1)
+            for list_id in range(nlist):
+                members = sample[assignment == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+            centroids = prepare(centroids)
+
+        rows = vectors.shape[0]
+        assignment = np.empty(rows, dtype=np.int32)
+        for start in range(0, rows, _BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + _BLOCK_ROWS], dtype=np.float32)
+            assignment[start:start + len(block)] = np.argmax(score(block, centroids), axis=1)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        return cls(centroids, order, offsets, rows)
+
+    def candidates(self, query_scores: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-query_scores, nprobe - 1)[:nprobe]
+        parts = [self.order[self.offsets[probe]:self.offsets[probe + 1]] for probe in probes]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def save(self, path: Path) -> None:
+        _atomic_write(
+            path,
+            lambda file_obj: np.savez(
+                file_obj, centroids=self.centroids, order=self.order, offsets=self.offsets, rows=self.rows
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "_IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["order"], data["offsets"], int(data["rows"]))
+
+
+class _LocalCollection:
+    """One collection on disk: a raw vector file read through ``np.memmap`` plus columnar metadata.
+
+    ``columns.jsonl`` holds one JSON object of column lists per written
+    batch, so appends never rewrite earlier rows. Deletes and upserts only
+    mark rows in a tombstone array; :meth:`flush` compacts the files once
+    enough rows are dead. ``book_title`` and ``file_hash`` keep an index of
+    the rows holding each value, so per-book and per-file lookups and
+    deletes touch only those rows.
+    """
+
+    META_FILE = "meta.json"
+    VECTORS_FILE = "vectors.bin"
+    COLUMNS_FILE = "columns.jsonl"
+    TOMBSTONES_FILE = "tombstones.npy"
+    IVF_FILE = "ivf.npz"
+
+    def __init__(self, directory: Path, dim: int, dtype: str, metric: str) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_path = self.directory / self.META_FILE
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        else:
+            meta = {"dim": dim, "dtype": dtype, "metric": metric.upper()}
+            _atomic_write(meta_path, lambda file_obj: file_obj.write(json.dumps(meta)), mode="w")
+        self.dim = int(meta["dim"])
+        self.dtype = np.dtype(meta["dtype"])
+        self.metric = meta["metric"]
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self.version = 0
+        self._lock = threading.RLock()
+        self._map: Optional[np.memmap] = None
+        self._ivf: Optional[_IVFIndex] = None
+        # book_title -> 行掩码，按书检索时只扫描该书的行；按最近使用淘汰，任何写入后清空
+        self._book_masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # 列名 -> 取值 -> 行号（含已删除的行，读取时按墓碑过滤）
+        self._value_rows: Dict[str, Dict[str, List[int]]] = {}
+        self._load()
+
+    # ------------------------------------------------------------------ storage
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _load(self) -> None:
+        columns: Dict[str, list] = {name: [] for name in METADATA_FIELDS}
+        column_rows = 0
+        columns_path = self._path(self.COLUMNS_FILE)
+        if columns_path.exists():
+            with columns_path.open("r", encoding="utf-8") as file_obj:
+                for line in file_obj:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        # 上次写入中途退出留下的半行
+                        break
+                    size = len(batch["id"])
+                    for name in METADATA_FIELDS:
+                        columns[name].extend(batch.get(name) or [""] * size)
+                    column_rows += size
+
+        vectors_path = self._path(self.VECTORS_FILE)
+        vectors_path.touch(exist_ok=True)
+        vector_rows = vectors_path.stat().st_size // self.row_bytes
+        self.count = min(vector_rows, column_rows)
+        if vectors_path.stat().st_size != self.count * self.row_bytes:
+            with vectors_path.open("r+b") as file_obj:
+                file_obj.truncate(self.count * self.row_bytes)
+        self.columns = {name: values[:self.count] for name, values in columns.items()}
+        if column_rows != self.count:
+            self._rewrite_columns()
+
+        self.tombstones = np.zeros(self.count, dtype=bool)
+        tombstones_path = self._path(self.TOMBSTONES_FILE)
+        if tombstones_path.exists():
+            saved = np.load(tombstones_path)
+            limit = min(len(saved), self.count)
+            self.tombstones[:limit] = saved[:limit]
+
+        # 同一个 id 出现多次时（upsert 后尚未保存墓碑就退出）只保留最后一行
+        self._index_columns()
+        self.id_to_row: Dict[int, int] = {}
+        for row, chunk_id in enumerate(self.columns["id"]):
+            if self.tombstones[row]:
+                continue
+            previous = self.id_to_row.get(chunk_id)
+            if previous is not None:
+                self.tombstones[previous] = True
+            self.id_to_row[chunk_id] = row
+
+        ivf_path = self._path(self.IVF_FILE)
+        if ivf_path.exists():
+            index = _IVFIndex.load(ivf_path)
+            self._ivf = index if index.rows <= self.count else None
+
+    def _changed_locked(self) -> None:
+        self.version += 1
+        self._book_masks.clear()
+
+    def _index_columns(self, start: int = 0) -> None:
+        if start == 0:
+            self._value_rows = {name: {} for name in INDEXED_FIELDS}
+        for name in INDEXED_FIELDS:
+            index = self._value_rows[name]
+            for row, value in enumerate(self.columns[name][start:], start):
+                index.setdefault(value, []).append(row)
+
+    def _rewrite_columns(self) -> None:
+        _atomic_write(
+            self._path(self.COLUMNS_FILE),
+            lambda file_obj: file_obj.write(json.dumps(self.columns, ensure_ascii=False) + "\n"),
+            mode="w",
+        )
+
+    def _save_tombstones(self) -> None:
+        _atomic_write(self._path(self.TOMBSTONES_FILE), lambda file_obj: np.save(file_obj, self.tombstones))
+
+    def _vectors(self) -> np.ndarray:
+        if self.count == 0:
+            return np.empty((0, self.dim), dtype=self.dtype)
+        if self._map is None or self._map.shape[0] != self.count:
+            self._map = np.memmap(self._path(self.VECTORS_FILE), dtype=self.dtype, mode="r", shape=(self.count, self.dim))
+        return self._map
+
+    # ------------------------------------------------------------------ scoring
+    def _score(self, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Higher is better for every metric; L2 uses the negated squared distance."""
+        products = vectors @ queries.T
+        if self.metric == "L2":
+            return 2 * products - np.einsum("ij,ij->i", vectors, vectors)[:, None] - np.einsum(
+                "ij,ij->i", queries, queries
+            )[None, :]
+        return products
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[-1] > self.dim:
+            # 截断存储的集合：写入向量与查询向量都取前 dim 维并重新归一化
+            vectors = truncate(vectors, self.dim)
+        if self.metric == "COSINE":
+            norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+    # ------------------------------------------------------------------ writes
+    def write(self, rows: List[Dict[str, object]]) -> None:
+        vectors = self._prepare([row["embedding"] for row in rows])
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.dim}, got {vectors.shape[1]}")
+        batch = {name: [row.get(name, "") for row in rows] for name in METADATA_FIELDS}
+        with self._lock:
+            with self._path(self.VECTORS_FILE).open("ab") as file_obj:
+                file_obj.write(vectors.astype(self.dtype).tobytes())
+            with self._path(self.COLUMNS_FILE).open("a", encoding="utf-8") as file_obj:
+                file_obj.write(json.dumps(batch, ensure_ascii=False) + "\n")
+
+            start = self.count
+            self.tombstones = np.concatenate([self.tombstones, np.zeros(len(rows), dtype=bool)])
+            for name in METADATA_FIELDS:
+                self.columns[name].extend(batch[name])
+            self._index_columns(start)
+            for offset, chunk_id in enumerate(batch["id"]):
+                previous = self.id_to_row.get(chunk_id)
+                if previous is not None:
+                    self.tombstones[previous] = True
+                self.id_to_row[chunk_id] = start + offset
+            self.count += len(rows)
+            self._changed_locked()
+
+    def delete_where(self, select: Callable[["_LocalCollection"], np.ndarray]) -> int:
+        """Tombstone the live rows returned by ``select``, which runs under the collection lock."""
+        with self._lock:
+            rows = select(self)
+            if not len(rows):
+                return 0
+            self.tombstones[rows] = True
+            ids = self.columns["id"]
+            for row in rows.tolist():
+                self.id_to_row.pop(ids[row], None)
+            self._save_tombstones()
+            self._changed_locked()
+            return len(rows)
+
+    def flush(self, index_type: str, nlist: int) -> None:
+        with self._lock:
+            for name in (self.VECTORS_FILE, self.COLUMNS_FILE):
+                if self._path(name).exists():
+                    with self._path(name).open("rb+") as file_obj:
+                        os.fsync(file_obj.fileno())
+            self._save_tombstones()
+            dead = int(self.tombstones.sum())
+            if dead and dead >= 0.25 * self.count:
+                self._compact()
+            if index_type == "ivf":
+                self._maybe_build_ivf(nlist)
+            elif self._ivf is not None:
+                self._ivf = None
+                self._path(self.IVF_FILE).unlink(missing_ok=True)
+
+    def _compact(self) -> None:
+        live = np.flatnonzero(~self.tombstones)
+        vectors = self._vectors()
+
+        def write_vectors(file_obj) -> None:
+            for start in range(0, len(live), _BLOCK_ROWS):
+                file_obj.write(np.asarray(vectors[live[start:start + _BLOCK_ROWS]]).tobytes())
+
+        self._map = None
+        _atomic_write(self._path(self.VECTORS_FILE), write_vectors)
+        keep = live.tolist()
+        self.columns = {name: [values[row] for row in keep] for name, values in self.columns.items()}
+        self._rewrite_columns()
+        self.count = len(keep)
+        self.tombstones = np.zeros(self.count, dtype=bool)
+        self._save_tombstones()
+        self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(self.columns["id"])}
+        self._index_columns()
+        self._ivf = None
+        self._path(self.IVF_FILE).unlink(missing_ok=True)
+        self._changed_locked()
+        logger.info("Compacted local collection %s to %d rows", self.directory.name, self.count)
+
+    def _maybe_build_ivf(self, nlist: int) -> None:
+        live = np.flatnonzero(~self.tombstones)
+        if len(live) < nlist * _MIN_ROWS_PER_LIST:
+            return
+        # 未入索引的新行超过 10% 或分区数改变时重建，否则新行走暴力扫描
+        if (
+            self._ivf is not None
+            and len(self._ivf.centroids) == nlist
+            and self.count - self._ivf.rows <= 0.1 * self._ivf.rows
+        ):
+            return
+        self._ivf = _IVFIndex.build(self._vectors(), live, nlist, self._score, self._prepare)
+        self._ivf.save(self._path(self.IVF_FILE))
+        logger.info("Built IVF index with %d lists over %d rows for %s", nlist, self.count, self.directory.name)
+
+    # ------------------------------------------------------------------ reads
+    def live_rows(self) -> List[int]:
+        with self._lock:
+            return np.flatnonzero(~self.tombstones).tolist()
+
+    def rows_where(self, name: str, value: str) -> np.ndarray:
+        """Live rows whose indexed column ``name`` equals ``value``, in row order."""
+        with self._lock:
+            rows = np.asarray(self._value_rows[name].get(value, ()), dtype=np.int64)
+            return rows[~self.tombstones[rows]]
+
+    def live_values(self, name: str) -> List[str]:
+        """Distinct values of the indexed column ``name`` that still have a live row."""
+        with self._lock:
+            return [value for value, rows in self._value_rows[name].items() if not self.tombstones[rows].all()]
+
+    def _book_mask(self, book_title: str) -> np.ndarray:
+        # 调用方需持有 self._lock
+        mask = self._book_masks.get(book_title)
+        if mask is not None:
+            self._book_masks.move_to_end(book_title)
+            return mask
+        mask = np.zeros(self.count, dtype=bool)
+        mask[self._value_rows["book_title"].get(book_title, [])] = True
+        self._book_masks[book_title] = mask
+        while len(self._book_masks) > _BOOK_MASK_CACHE_SIZE:
+            self._book_masks.popitem(last=False)
+        return mask
+
+    def search(
+        self, embedding: Sequence[float], top_k: int, nprobe: int, book_title: str | None = None
+    ) -> List[SearchHit]:
+        query = self._prepare(np.asarray(embedding, dtype=np.float32)[None, :])
+        with self._lock:
+            count = self.count
+            vectors = self._vectors()
+            tombstones = self.tombstones
+            columns = self.columns
+            ivf = self._ivf
+            allowed = self._book_mask(book_title) if book_title is not None else None
+        if count == 0 or top_k <= 0:
+            return []
+
+        candidates = None
+        if ivf is not None:
+            probe_scores = self._score(ivf.centroids, query)[:, 0]
+            candidates = np.concatenate([ivf.candidates(probe_scores, nprobe), np.arange(ivf.rows, count)])
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+        elif allowed is not None:
+            candidates = np.flatnonzero(allowed)
+        if candidates is not None:
+            blocks = (candidates[start:start + _BLOCK_ROWS] for start in range(0, len(candidates), _BLOCK_ROWS))
+        else:
+            blocks = (np.arange(start, min(start + _BLOCK_ROWS, count)) for start in range(0, count, _BLOCK_ROWS))
+
+        best_rows: List[np.ndarray] = []
+        best_scores: List[np.ndarray] = []
+        for rows in blocks:
+            if not len(rows):
+                continue
+            if rows[-1] - rows[0] + 1 == len(rows):
+                block = np.asarray(vectors[rows[0]:rows[-1] + 1], dtype=np.float32)
+            else:
+                block = np.asarray(vectors[rows], dtype=np.float32)
+            scores = self._score(block, query)[:, 0]
+            scores[tombstones[rows]] = -np.inf
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k - 1)[:top_k]
+                rows, scores = rows[keep], scores[keep]
+            best_rows.append(rows)
+            best_scores.append(scores)
+
+        if not best_rows:
+            return []
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        hits = []
+        for position in order:
+            score = float(scores[position])
+            if score == -np.inf:
+                break
+            row = int(rows[position])
+            distance = -score if self.metric == "L2" else score
+            hits.append(
+                SearchHit(
+                    id=columns["id"][row],
+                    distance=distance,
+                    entity={name: columns[name][row] for name in SEARCH_FIELDS},
+                )
+            )
+        return hits
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store for small and medium collections, with no network hop.
+
+    Each collection is a directory under ``settings.local_vector_dir``
+    holding memory-mapped float32/float16 vectors and columnar metadata.
+    Search is an exact, vectorised top-k scan, or an IVF-style partitioned
+    scan when ``LOCAL_VECTOR_INDEX=ivf``. Only ``FLAT`` and ``IVF_FLAT``
+    index profiles are supported; they are kept in ``index_profiles.json``
+    next to the collections.
+    """
+
+    INDEX_TYPES = ("FLAT", "IVF_FLAT")
+
+    def __init__(self, collection_name: str | None = None, directory: Path | None = None) -> None:
+        super().__init__(collection_name)
+        self.directory = Path(directory or settings.local_vector_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.profiles = IndexProfileStore(self.directory / "index_profiles.json")
+        self._collections: Dict[str, _LocalCollection] = {}
+        self._lock = threading.Lock()
+        logger.info("Using local vector store at %s", self.directory)
+        self._get(self.collection_name, create=True)
+
+    def _get(self, collection_name: str, create: bool = False) -> Optional[_LocalCollection]:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                path = self.directory / collection_name
+                if not create and not (path / _LocalCollection.META_FILE).exists():
+                    return None
+                if create and not path.exists():
+                    logger.info("Creating local collection %s", collection_name)
+                collection = _LocalCollection(
+                    path,
+                    settings.vector_truncate_dim or settings.embedding_dim,
+                    settings.local_vector_dtype,
+                    settings.milvus_metric_type,
+                )
+                self._collections[collection_name] = collection
+            return collection
+
+    def list_collections(self) -> List[str]:
+        return sorted(
+            path.name for path in self.directory.iterdir() if (path / _LocalCollection.META_FILE).exists()
+        )
+
+    def use_collection(self, collection_name: str) -> None:
+        self.collection_name = collection_name
+        self._get(collection_name, create=True)
+
+    def drop_collection(self, collection_name: str) -> None:
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        shutil.rmtree(self.directory / collection_name, ignore_errors=True)
+        self.profiles.remove(collection_name)
+
+    def rename_collection(self, old_name: str, new_name: str) -> None:
+        if (self.directory / new_name).exists():
+            raise ValueError(f"Local collection {new_name} already exists")
+        with self._lock:
+            self._collections.pop(old_name, None)
+        (self.directory / old_name).rename(self.directory / new_name)
+        profile = self.profiles.get(old_name)
+        if profile is not None:
+            self.profiles.save(new_name, profile)
+            self.profiles.remove(old_name)
+
+    def codec(self, collection_name: str | None = None) -> VectorCodec:
+        collection = self._get(collection_name or self.collection_name, create=True)
+        return VectorCodec(collection.dtype.name, collection.dim)
+
+    def memory_bytes(self, collection_name: str | None = None) -> int:
+        collection = self._get(collection_name or self.collection_name)
+        if collection is None:
+            return 0
+        return sum(
+            collection._path(name).stat().st_size
+            for name in (_LocalCollection.VECTORS_FILE, _LocalCollection.IVF_FILE)
+            if collection._path(name).exists()
+        )
+
+    def list_books(self, collection_name: str | None = None) -> List[str]:
+        collection = self._get(collection_name or self.collection_name)
+        if collection is None:
+            return []
+        return sorted(title for title in collection.live_values("book_title") if title)
+
+    def book_stats(self, collection_name: str | None = None) -> Dict[str, Dict[str, int]]:
+        collection = self._get(collection_name or self.collection_name)
+        stats: Dict[str, Dict[str, int]] = {}
+        if collection is None:
+            return stats
+        with collection._lock:
+            columns = collection.columns
+            for row in collection.live_rows():
+                files = stats.setdefault(columns["book_title"][row], {})
+                file_hash = columns["file_hash"][row]
+                files[file_hash] = files.get(file_hash, 0) + 1
+        return stats
+
+    def has_file(self, file_hash: str, collection_name: str | None = None) -> bool:
+        collection = self._get(collection_name or self.collection_name)
+        if collection is None:
+            return False
+        return len(collection.rows_where("file_hash", file_hash)) > 0
+
+    def uses_chunk_ids(self, collection_name: str | None = None) -> bool:
+        return True
+
+    def supports_chapter_hashes(self, collection_name: str | None = None) -> bool:
+        return True
+
+    def uses_partition_key(self, collection_name: str | None = None) -> bool:
+        return False
+
+    def fetch_chapters(self, book_title: str, collection_name: str | None = None) -> Dict[str, Tuple[str, int]]:
+        collection = self._get(collection_name or self.collection_name)
+        chapters: Dict[str, Tuple[str, int]] = {}
+        if collection is None:
+            return chapters
+        with collection._lock:
+            columns = collection.columns
+            for row in collection.rows_where("book_title", book_title).tolist():
+                chapter_hash = columns["chapter_hash"][row]
+                title, count = chapters.get(chapter_hash, (columns["chapter_title"][row], 0))
+                chapters[chapter_hash] = (title, count + 1)
+        return chapters
+
+    def _delete(self, collection_name: str | None, select: Callable[[_LocalCollection], np.ndarray]) -> int:
+        name = collection_name or self.collection_name
+        collection = self._get(name)
+        if collection is None:
+            return 0
+        deleted = collection.delete_where(select)
+        if deleted:
+            self._notify_write(name)
+        return deleted
+
+    def delete_chapters(self, book_title: str, chapter_hashes: Iterable[str], collection_name: str | None = None) -> int:
+        hashes = set(chapter_hashes)
+
+        def select(collection: _LocalCollection) -> np.ndarray:
+            rows = collection.rows_where("book_title", book_title)
+            chapters = collection.columns["chapter_hash"]
+            return rows[np.fromiter((chapters[row] in hashes for row in rows.tolist()), dtype=bool, count=len(rows))]
+
+        return self._delete(collection_name, select)
+
+    def delete_file(self, file_hash: str, collection_name: str | None = None) -> int:
+        return self._delete(collection_name, lambda collection: collection.rows_where("file_hash", file_hash))
+
+    def delete_book(self, book_title: str, collection_name: str | None = None) -> int:
+        return self._delete(collection_name, lambda collection: collection.rows_where("book_title", book_title))
+
+    def iter_records(
+        self, collection_name: str | None = None, batch_size: int = 2000, with_embeddings: bool = False
+    ) -> Iterator[List[VectorRecord]]:
+        collection = self._get(collection_name or self.collection_name)
+        if collection is None:
+            return
+        # 在锁内取快照：压缩会换成新的列与向量文件，旧的列表和内存映射在迭代期间仍然有效；
+        # 追加写入只在列表末尾增加行，不影响快照中的行号
+        with collection._lock:
+            columns = collection.columns
+            vectors = collection._vectors() if with_embeddings else None
+            rows = collection.live_rows()
+        batch: List[VectorRecord] = []
+        for row in rows:
+            batch.append(
+                VectorRecord(
+                    content=columns["content"][row],
+                    embedding=np.asarray(vectors[row], dtype=np.float32).tolist() if vectors is not None else [],
+                    book_title=columns["book_title"][row],
+                    chapter_title=columns["chapter_title"][row],
+                    chunk_index=columns["chunk_index"][row],
+                    source_path=columns["source_path"][row],
+                    file_hash=columns["file_hash"][row],
+                    chapter_hash=columns["chapter_hash"][row],
+                )
+            )
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _rows(self, records: Sequence[VectorRecord], collection_name: str) -> List[Dict[str, object]]:
+        return [
+            {
+                "id": r.chunk_id,
+                "book_title": r.book_title,
+                "chapter_title": r.chapter_title,
+                "chunk_index": r.chunk_index,
+                "source_path": r.source_path,
+                "file_hash": r.file_hash,
+                "chapter_hash": r.chapter_hash,
+                "content": r.content,
+                "embedding": r.embedding,
+            }
+            for r in records
+        ]
+
+    def _write_rows(self, rows: List[Dict[str, object]], collection_name: str) -> None:
+        self._get(collection_name, create=True).write(rows)
+
+    def _flush(self, collection_name: str) -> None:
+        collection = self._get(collection_name)
+        if collection is not None:
+            profile = self.index_profile(collection_name)
+            index_type = "ivf" if profile.index_type == "IVF_FLAT" else "flat"
+            collection.flush(index_type, int(profile.build_params.get("nlist", settings.local_ivf_nlist)))
+
+    def collection_version(self, collection_name: str | None = None) -> int:
+        collection = self._get(collection_name or self.collection_name)
+        return collection.version if collection is not None else 0
+
+    def index_profile(self, collection_name: str | None = None) -> IndexProfile:
+        profile = self.profiles.get(collection_name or self.collection_name)
+        if profile is not None:
+            return profile
+        if settings.local_vector_index.lower() == "ivf":
+            return IndexProfile.create(
+                "IVF_FLAT", {"nlist": settings.local_ivf_nlist}, {"nprobe": settings.local_ivf_nprobe}
+            )
+        return IndexProfile.create("FLAT")
+
+    def build_index(self, profile: IndexProfile, collection_name: str | None = None) -> None:
+        if profile.index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Local vector store supports {', '.join(self.INDEX_TYPES)}, not {profile.index_type}")
+        name = collection_name or self.collection_name
+        self.profiles.save(name, profile)
+        self._flush(name)
+
+    def search(
+        self,
+        embedding: List[float],
+        top_k: int = 4,
+        collection_name: str | None = None,
+        book_title: str | None = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[SearchHit]:
+        name = collection_name or self.collection_name
+        collection = self._get(name)
+        if collection is None:
+            return []
+        params = {**self.index_profile(name).search_params, **(search_params or {})}
+        return collection.search(embedding, top_k, int(params.get("nprobe", settings.local_ivf_nprobe)), book_title)
+
+
+__all__ = ["LocalVectorStore"]
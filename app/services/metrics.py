@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed upper bounds."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            value_sum = self._sum
+        labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+        return {
+            "count": total,
+            "sum": value_sum,
+            "mean": value_sum / total if total else 0.0,
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class MetricsRegistry:
+    """Process-wide registry of named histograms and counters."""
+
+    def __init__(self) -> None:
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, object]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, buckets: Sequence[float]) -> Histogram:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = Histogram(buckets)
+                self._histograms[name] = histogram
+            return histogram
+
+    def increment(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0.0) + value
+
+    def register(self, name: str, collector: Callable[[], Dict[str, object]]) -> None:
+        """Expose a component's own ``stats()`` dict under ``name`` in snapshots."""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+            collectors = dict(self._collectors)
+        components: Dict[str, object] = {}
+        for name, collector in collectors.items():
+            try:
+                components[name] = collector()
+            except Exception as exc:  # pragma: no cover - never fail the metrics endpoint
+                logger.warning("Metrics collector %s failed: %s", name, exc)
+        return {
+            "counters": counters,
+            "histograms": {name: histogram.snapshot() for name, histogram in histograms.items()},
+            "components": components,
+        }
+
+
+metrics = MetricsRegistry()
+
+
+__all__ = ["Histogram", "MetricsRegistry", "metrics"]
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from ..config import settings
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .embedding import EmbeddingService
+    from .embedding_client import RemoteEmbeddingService
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+WAIT_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+_Item = Tuple[str, Future, float]
+
+
+class QueryEmbeddingBatcher:
+    """Coalesce concurrent query embeddings into batched forward passes.
+
+    Callers submit single queries and receive a future. A dedicated worker
+    thread waits up to ``window_ms`` after the first queued query (or until
+    ``max_batch_size`` queries are waiting) and embeds them in one pass.
+    """
+
+    def __init__(
+        self,
+        embedding_service: "EmbeddingService | RemoteEmbeddingService",
+        window_ms: float | None = None,
+        max_batch_size: int | None = None,
+    ) -> None:
+        self.embedding_service = embedding_service
+        self.window = (window_ms if window_ms is not None else settings.query_batch_window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size or settings.query_batch_max_size)
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue()
+        self._batch_sizes = metrics.histogram("query_embedding_batch_size", BATCH_SIZE_BUCKETS)
+        self._queue_wait = metrics.histogram("query_embedding_queue_wait_seconds", WAIT_SECONDS_BUCKETS)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        if self._closed:
+            raise RuntimeError("QueryEmbeddingBatcher is closed")
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first: _Item) -> Tuple[List[_Item], bool]:
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._collect(first)
+            # 调用方已取消的请求不再参与计算
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self._queue_wait.observe(started - enqueued)
+            self._batch_sizes.observe(len(batch))
+
+            try:
+                vectors = self.embedding_service.embed_documents(
+                    [text for text, _, _ in batch], batch_size=len(batch)
+                )
+            except Exception as exc:  # pragma: no cover - surfaced to every waiting caller
+                logger.exception("Batched query embedding failed for %d queries", len(batch))
+                for _, future, _ in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
+__all__ = ["QueryEmbeddingBatcher"]
@@ -1,40 +1,294 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Tuple
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
 
 from ..config import settings
-from .embedding import EmbeddingService
-from .vector_store import MilvusVectorStore, VectorRecord
+from .answer_cache import CachedAnswer, SemanticAnswerCache
+from .context_budget import ContextBudgeter, format_passage
+from .embedding_cache import QueryEmbeddingCache
+from .embedding_client import RemoteEmbeddingService, create_embedding_service
+from .lexical_index import LexicalIndexRegistry, LexicalResult
+from .metrics import metrics
+from .query_batcher import QueryEmbeddingBatcher
+from .vector_store import VectorRecord, VectorStore, create_vector_store
+
+if TYPE_CHECKING:
+    from .catalog import CollectionCatalog
+    from .embedding import EmbeddingService
 
 logger = logging.getLogger(__name__)
 
+FALLBACK_ANSWER = "抱歉，我暂时无法生成回答。"
+
+LEXICAL_BUCKETS = (0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.05)
+lexical_search_seconds = metrics.histogram("lexical_search_seconds", LEXICAL_BUCKETS)
+
 
 class RAGService:
     """High level retrieval augmented generation pipeline."""
 
-    def __init__(self, vector_store: MilvusVectorStore | None = None, embedding_service: EmbeddingService | None = None) -> None:
-        self.vector_store = vector_store or MilvusVectorStore()
-        self.embedding_service = embedding_service or EmbeddingService()
+    def __init__(
+        self,
+        vector_store: VectorStore | None = None,
+        embedding_service: "EmbeddingService | RemoteEmbeddingService | None" = None,
+        catalog: "CollectionCatalog | None" = None,
+    ) -> None:
+        self.vector_store = vector_store or create_vector_store()
+        self.embedding_service = embedding_service or create_embedding_service()
+        self.query_embedder = QueryEmbeddingBatcher(self.embedding_service)
+        self.query_cache = QueryEmbeddingCache()
+        metrics.register("query_embedding_cache", self.query_cache.stats)
+        # 目录在每本书写入、替换或删除后都会更新，比实体数更能反映其他进程的改动，且只是本地 SQLite 查询
+        version_fn = catalog.version if catalog is not None else self.vector_store.collection_version
+        self.answer_cache = SemanticAnswerCache(version_fn=version_fn)
+        self.vector_store.add_write_listener(self.answer_cache.invalidate_collection)
+        metrics.register("semantic_answer_cache", self.answer_cache.stats)
+        self.lexical_indexes = LexicalIndexRegistry()
+        self.context_budgeter = ContextBudgeter()
         self.client = OpenAI(base_url=settings.llm_base_url, api_key=settings.llm_api_key)
+        # 所有异步请求共用一个带连接池的 HTTP 客户端，避免每次调用重新握手
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+            ),
+            timeout=httpx.Timeout(settings.llm_timeout_seconds),
+        )
+        self.async_client = AsyncOpenAI(
+            base_url=settings.llm_base_url,
+            api_key=settings.llm_api_key,
+            http_client=self.http_client,
+        )
+        self._search_executor = ThreadPoolExecutor(
+            max_workers=settings.milvus_search_workers,
+            thread_name_prefix="milvus-search",
+        )
 
     def index_records(self, records: List[VectorRecord], collection_name: str | None = None) -> None:
         self.vector_store.insert_records(records, collection_name)
 
+    def embed_query(self, query: str) -> List[float]:
+        cached = self.query_cache.get(query)
+        if cached is not None:
+            return cached
+        vector = self.query_embedder.embed(query)
+        self.query_cache.put(query, vector)
+        return vector
+
+    async def aembed_query(self, query: str) -> List[float]:
+        # 内存层在事件循环中直接查；SQLite 层的读写放到线程池，不阻塞事件循环
+        cached = self.query_cache.get_memory(query)
+        if cached is not None:
+            return cached
+        if self.query_cache.persistent:
+            loop = asyncio.get_running_loop()
+            cached = await loop.run_in_executor(self._search_executor, self.query_cache.get_persistent, query)
+            if cached is not None:
+                return cached
+        vector = await self.query_embedder.aembed(query)
+        self.query_cache.put_memory(query, vector)
+        if self.query_cache.persistent:
+            # 写入不必等待完成
+            self._search_executor.submit(self.query_cache.persist, query, vector)
+        return vector
+
     def retrieve(
         self,
         query: str,
         top_k: int = 4,
         collection_name: str | None = None,
+        book_title: str | None = None,
     ) -> List[Dict[str, str]]:
-        embedding = self.embedding_service.embed_documents([query])[0]
+        embedding = self.embed_query(query)
         results = self.vector_store.search(
             embedding,
             top_k=top_k,
             collection_name=collection_name,
+            book_title=book_title,
+        )
+        return self._to_documents(results)
+
+    async def aretrieve(
+        self,
+        query: str,
+        top_k: int = 4,
+        collection_name: str | None = None,
+        embedding: List[float] | None = None,
+        lexical: LexicalResult | None = None,
+        book_title: str | None = None,
+    ) -> List[Dict[str, str]]:
+        if embedding is None:
+            embedding = await self.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            self._search_executor,
+            partial(
+                self.vector_store.search,
+                embedding,
+                top_k=top_k,
+                collection_name=collection_name,
+                book_title=book_title,
+            ),
+        )
+        documents = self._to_documents(results)
+        if lexical is not None and lexical.hits:
+            documents = self._fuse([documents, self._to_documents(lexical.hits)], top_k)
+        return documents
+
+    async def alexical_search(
+        self,
+        query: str,
+        top_k: int,
+        collection_name: str,
+        book_title: str | None = None,
+    ) -> LexicalResult | None:
+        """BM25 lookup in the collection's bigram index; ``None`` unless hybrid retrieval is enabled."""
+        if settings.retrieval_mode.lower() != "hybrid":
+            return None
+        index = self.lexical_indexes.get(collection_name)
+        if index is None:
+            return None
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        result = await loop.run_in_executor(self._search_executor, partial(index.search, query, top_k, book_title))
+        lexical_search_seconds.observe(time.perf_counter() - started)
+        metrics.increment("lexical_confident_queries" if result.confident else "lexical_fused_queries")
+        return result
+
+    async def aprepare_context(
+        self,
+        query: str,
+        top_k: int,
+        collection_name: str,
+        use_answer_cache: bool,
+        model_name: str | None = None,
+        book_title: str | None = None,
+    ) -> Tuple[List[float] | None, CachedAnswer | None, List[Dict[str, str]]]:
+        """Return ``(query embedding, cached answer, passages)`` for one question.
+
+        Confident lexical matches (names, places) skip embedding entirely, so
+        the embedding is ``None`` and the answer cache is bypassed. Retrieved
+        chunks go through :class:`ContextBudgeter`, so the returned passages
+        are exactly what the prompt (and the citations) will contain.
+        ``book_title`` restricts both retrievers to one book of the collection.
+        """
+        lexical = await self.alexical_search(query, top_k, collection_name, book_title)
+        if lexical is not None and lexical.confident:
+            return None, None, await self.abudget_context(self._to_documents(lexical.hits), True, collection_name)
+
+        embedding = await self.aembed_query(query)
+        if use_answer_cache:
+            cached = await self.alookup_answer(embedding, collection_name, model_name, top_k, book_title)
+            if cached is not None:
+                return embedding, cached, cached.documents
+        documents = await self.aretrieve(
+            query,
+            top_k=top_k,
+            collection_name=collection_name,
+            embedding=embedding,
+            lexical=lexical,
+            book_title=book_title,
+        )
+        # 融合后的 RRF 分数越大越好；纯向量检索时 L2 距离越小越好
+        fused = lexical is not None and bool(lexical.hits)
+        higher_is_better = fused or settings.milvus_metric_type.upper() != "L2"
+        return embedding, None, await self.abudget_context(documents, higher_is_better, collection_name)
+
+    async def abudget_context(
+        self,
+        documents: List[Dict[str, str]],
+        higher_is_better: bool,
+        label: str | None = None,
+    ) -> List[Dict[str, str]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._search_executor,
+            partial(self.context_budgeter.assemble, documents, higher_is_better, label),
         )
+
+    @staticmethod
+    def _fuse(rankings: List[List[Dict[str, str]]], top_k: int) -> List[Dict[str, str]]:
+        """Reciprocal rank fusion; the fused score replaces the per-retriever score."""
+        scores: Dict[tuple, float] = {}
+        documents: Dict[tuple, Dict[str, str]] = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking, start=1):
+                key = (doc["book_title"], doc["chapter_title"], doc["chunk_index"])
+                scores[key] = scores.get(key, 0.0) + 1.0 / (settings.rrf_k + rank)
+                documents.setdefault(key, doc)
+        ordered = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        return [{**documents[key], "score": scores[key]} for key in ordered]
+
+    async def alookup_answer(
+        self,
+        embedding: List[float],
+        collection_name: str,
+        model_name: str | None,
+        top_k: int,
+        book_title: str | None = None,
+    ) -> CachedAnswer | None:
+        """Return a cached answer for a semantically equivalent earlier question, if any."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        entry = await loop.run_in_executor(
+            self._search_executor,
+            partial(
+                self.answer_cache.lookup,
+                embedding,
+                collection_name,
+                model_name or settings.llm_model_name,
+                top_k,
+                book_title,
+            ),
+        )
+        if entry is not None:
+            logger.info(
+                "Semantic answer cache hit for collection %s (saved %.2fs, lookup %.1fms)",
+                collection_name,
+                entry.generation_seconds,
+                (time.perf_counter() - started) * 1000,
+            )
+        return entry
+
+    async def astore_answer(
+        self,
+        embedding: List[float],
+        collection_name: str,
+        model_name: str | None,
+        top_k: int,
+        answer: str,
+        documents: List[Dict[str, str]],
+        generation_seconds: float,
+        book_title: str | None = None,
+    ) -> None:
+        if answer == FALLBACK_ANSWER:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._search_executor,
+            partial(
+                self.answer_cache.store,
+                embedding,
+                collection_name,
+                model_name or settings.llm_model_name,
+                top_k,
+                answer,
+                documents,
+                generation_seconds,
+                book_title,
+            ),
+        )
+
+    @staticmethod
+    def _to_documents(results) -> List[Dict[str, str]]:
         documents: List[Dict[str, str]] = []
         for hit in results:
             documents.append(
@@ -49,12 +303,9 @@ class RAGService:
             )
         return documents
 
-    def generate(self, query: str, context_documents: List[Dict[str, str]], history: List[Dict[str, str]], model_name = None) -> str:
-        selected_model = model_name or settings.llm_model_name
-        context_text = "\n\n".join(
-            f"【{doc['book_title']}·{doc['chapter_title']}·chunk {doc['chunk_index']}】\n{doc['content']}"
-            for doc in context_documents
-        )
+    @staticmethod
+    def _build_messages(query: str, context_documents: List[Dict[str, str]], history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        context_text = "\n\n".join(format_passage(doc) for doc in context_documents)
         messages = []
         for turn in history:
             messages.append({"role": "user", "content": turn["user"]})
@@ -64,7 +315,7 @@ class RAGService:
             "你是一个小说问答助手。你将基于提供的参考内容回答用户的问题，"
             "回答时引用相关的章节和来源，保持语言简洁准确。"
         )
-        messages = (
+        return (
             [{"role": "system", "content": system_prompt}] + messages + [
                 {
                     "role": "user",
@@ -74,13 +325,9 @@ class RAGService:
                 }
             ]
         )
-        response = self.client.responses.create(
-            model=selected_model,
-            temperature=settings.llm_temperature,
-            max_output_tokens=settings.llm_max_tokens,
-            input=messages,
-        )
 
+    @staticmethod
+    def _extract_text(response) -> str:
         text_fragments: List[str] = []
         for item in getattr(response, "output", []) or []:
             for content in getattr(item, "content", []) or []:
@@ -90,8 +337,56 @@ class RAGService:
         generated = "".join(text_fragments).strip()
         if not generated:
             logger.warning("Empty response from LLM, returning fallback message")
-            return "抱歉，我暂时无法生成回答。"
+            return FALLBACK_ANSWER
         return generated
 
+    def generate(self, query: str, context_documents: List[Dict[str, str]], history: List[Dict[str, str]], model_name = None) -> str:
+        response = self.client.responses.create(
+            model=model_name or settings.llm_model_name,
+            temperature=settings.llm_temperature,
+            max_output_tokens=settings.llm_max_tokens,
+            input=self._build_messages(query, context_documents, history),
+        )
+        return self._extract_text(response)
+
+    async def agenerate(self, query: str, context_documents: List[Dict[str, str]], history: List[Dict[str, str]], model_name = None) -> str:
+        response = await self.async_client.responses.create(
+            model=model_name or settings.llm_model_name,
+            temperature=settings.llm_temperature,
+            max_output_tokens=settings.llm_max_tokens,
+            input=self._build_messages(query, context_documents, history),
+        )
+        return self._extract_text(response)
+
+    async def astream_generate(
+        self,
+        query: str,
+        context_documents: List[Dict[str, str]],
+        history: List[Dict[str, str]],
+        model_name=None,
+    ) -> AsyncIterator[str]:
+        """Yield answer text deltas as the LLM produces them."""
+        stream = await self.async_client.responses.create(
+            model=model_name or settings.llm_model_name,
+            temperature=settings.llm_temperature,
+            max_output_tokens=settings.llm_max_tokens,
+            input=self._build_messages(query, context_documents, history),
+            stream=True,
+        )
+        async for event in stream:
+            if getattr(event, "type", None) == "response.output_text.delta":
+                delta = getattr(event, "delta", "")
+                if delta:
+                    yield delta
+
+    async def aclose(self) -> None:
+        await self.async_client.close()
+        self._search_executor.shutdown(wait=False)
+        self.query_embedder.close()
+        self.query_cache.close()
+        self.lexical_indexes.close()
+        if isinstance(self.embedding_service, RemoteEmbeddingService):
+            self.embedding_service.close()
+
 
 __all__ = ["RAGService"]
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKENDS = ("memory", "sqlite", "redis")
+
+
+class SessionStore(ABC):
+    """Key-value storage of encoded chat sessions (``session_id -> bytes``).
+
+    Every read refreshes the session's lifetime (sliding TTL); sessions idle
+    for longer than the TTL, or evicted to stay under the backend's capacity,
+    simply start over with an empty history.
+    """
+
+    # 读写是否涉及磁盘或网络；为 True 时异步接口会把调用放到线程池中
+    blocking = True
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[bytes]:
+        """Stored value of ``session_id``, or ``None`` if unknown or expired."""
+
+    @abstractmethod
+    def save(self, session_id: str, data: bytes) -> None:
+        """Store ``data`` for ``session_id``, evicting old sessions if needed."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Forget ``session_id``."""
+
+    def stats(self) -> Dict[str, object]:
+        return {}
+
+    def close(self) -> None:
+        """Release connections or files held by the store."""
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process LRU store bounded by session count, total bytes and idle time."""
+
+    blocking = False
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        ttl_seconds: float | None = None,
+    ) -> None:
+        self.max_entries = max(0, max_entries if max_entries is not None else settings.session_max_entries)
+        self.max_bytes = max(0, max_bytes if max_bytes is not None else int(settings.session_max_memory_mb * 1024 * 1024))
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.session_ttl_seconds
+        # session_id -> (最近访问时间, 编码后的会话)；按访问顺序排列，最久未访问的在最前
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, accessed_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - accessed_at > self.ttl
+
+    def _pop_locked(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def _evict_locked(self, now: float) -> None:
+        # 访问顺序即过期顺序，过期会话总在队首
+        while self._entries:
+            session_id, (accessed_at, _) = next(iter(self._entries.items()))
+            if not self._expired(accessed_at, now):
+                break
+            self._pop_locked(session_id)
+            self.expirations += 1
+        while self._entries and (
+            (self.max_entries and len(self._entries) > self.max_entries)
+            or (self.max_bytes and self.bytes > self.max_bytes)
+        ):
+            self._pop_locked(next(iter(self._entries)))
+            self.evictions += 1
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if self._expired(entry[0], now):
+                self._pop_locked(session_id)
+                self.expirations += 1
+                return None
+            self._entries[session_id] = (now, entry[1])
+            self._entries.move_to_end(session_id)
+            return entry[1]
+
+    def save(self, session_id: str, data: bytes) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._pop_locked(session_id)
+            self._entries[session_id] = (now, data)
+            self.bytes += len(data)
+            self._evict_locked(now)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._pop_locked(session_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a WAL-mode SQLite file, shared by all workers on one host."""
+
+    # 每写入这么多次清理一次过期与超量的会话
+    _PURGE_EVERY = 256
+    # 读取时最多每隔这么多秒刷新一次访问时间，避免每次读取都变成一次写事务
+    _TOUCH_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        max_entries: int | None = None,
+        ttl_seconds: float | None = None,
+    ) -> None:
+        self.path = Path(path or settings.session_sqlite_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(0, max_entries if max_entries is not None else settings.session_max_entries)
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.session_ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data BLOB NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_accessed_at ON sessions (accessed_at)")
+        self._db.commit()
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, accessed_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl > 0 and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._db.commit()
+                return None
+            if now - row[1] > self._TOUCH_INTERVAL:
+                self._db.execute("UPDATE sessions SET accessed_at = ? WHERE session_id = ?", (now, session_id))
+                self._db.commit()
+            return bytes(row[0])
+
+    def save(self, session_id: str, data: bytes) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, accessed_at) VALUES (?, ?, ?)",
+                (session_id, sqlite3.Binary(data), time.time()),
+            )
+            self._writes += 1
+            if self._writes % self._PURGE_EVERY == 0:
+                self._purge_locked()
+            self._db.commit()
+
+    def _purge_locked(self) -> None:
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM sessions WHERE accessed_at < ?", (time.time() - self.ttl,))
+        if self.max_entries:
+            self._db.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions").fetchone()
+        return {"backend": "sqlite", "sessions": count, "bytes": size, "max_entries": self.max_entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _redis():
+    try:
+        import redis
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("SESSION_BACKEND=redis requires redis-py: pip install redis") from exc
+    return redis
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions on a Redis-protocol server, shared by every worker and replica.
+
+    Expiry uses the server's key TTL (``SET EX`` / ``GETEX EX``); the memory
+    cap is the server's own ``maxmemory`` with an LRU policy. Any server that
+    speaks these commands works, including ``scripts/session_server.py``.
+    """
+
+    def __init__(self, url: str | None = None, prefix: str | None = None, ttl_seconds: float | None = None) -> None:
+        self.url = url or settings.session_redis_url
+        self.prefix = settings.session_key_prefix if prefix is None else prefix
+        ttl = ttl_seconds if ttl_seconds is not None else settings.session_ttl_seconds
+        self.ttl = int(ttl) if ttl > 0 else None
+        # 固定使用 RESP2，不发送 HELLO，兼容旧版 Redis 与 scripts/session_server.py
+        self._client = _redis().Redis.from_url(self.url, protocol=2, socket_timeout=5, socket_connect_timeout=5)
+
+    def _key(self, session_id: str) -> str:
+        return self.prefix + session_id
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        if self.ttl:
+            return self._client.getex(self._key(session_id), ex=self.ttl)
+        return self._client.get(self._key(session_id))
+
+    def save(self, session_id: str, data: bytes) -> None:
+        self._client.set(self._key(session_id), data, ex=self.ttl)
+
+    def delete(self, session_id: str) -> None:
+        self._client.delete(self._key(session_id))
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": "redis", "prefix": self.prefix, "ttl_seconds": self.ttl}
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def create_session_store(backend: str | None = None) -> SessionStore:
+    backend = (backend or settings.session_backend).lower()
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "redis":
+        return RedisSessionStore()
+    raise ValueError(f"Unknown session backend {backend}; expected one of {', '.join(SESSION_BACKENDS)}")
+
+
+__all__ = [
+    "MemorySessionStore",
+    "RedisSessionStore",
+    "SESSION_BACKENDS",
+    "SQLiteSessionStore",
+    "SessionStore",
+    "create_session_store",
+]
@@ -3,15 +3,20 @@ from __future__ import annotations
 import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, Iterator, List, Tuple
 
 from ..config import settings
+from .hashing import NovelHasher
 
 
 CHAPTER_PATTERN = re.compile(
     r"(?P<title>第?[\d一二三四五六七八九十百千]+[章回节卷篇部分章节：:．\.\s].*?)\n",
     flags=re.IGNORECASE,
 )
+PREFACE_TITLE = "序章"
+UNKNOWN_CHAPTER_TITLE = "章节未知"
+# 流式切分每次从文件解码的字符数
+READ_BUFFER_CHARS = 1 << 20
 
 
 @dataclass
@@ -21,6 +26,7 @@ class Chunk:
     chunk_index: int
     content: str
     source_path: Path
+    chapter_hash: str = ""
 
 
 class ChapterTextSplitter:
@@ -44,12 +50,12 @@ class ChapterTextSplitter:
             start = max(0, end - self.chunk_overlap)
         return chunks
 
-    def split(self, content: str, *, book_title: str, source_path: Path) -> Iterable[Chunk]:
+    def iter_chapters(self, content: str) -> Iterator[Tuple[str, str]]:
+        """Yield ``(chapter_title, chapter_text)`` pairs in reading order."""
         matches = list(CHAPTER_PATTERN.finditer(content))
         if not matches:
             # Fallback to naive chunking using placeholder chapter name
-            for idx, chunk in enumerate(self._split_chapter(content)):
-                yield Chunk(book_title, "章节未知", idx, chunk.strip(), source_path)
+            yield UNKNOWN_CHAPTER_TITLE, content
             return
 
         boundaries = [match.start() for match in matches] + [len(content)]
@@ -60,15 +66,79 @@ class ChapterTextSplitter:
         if first_start > 0:
             preface = content[:first_start].strip()
             if preface:
-                for chunk_index, chunk in enumerate(self._split_chapter(preface)):
-                    yield Chunk(book_title, "序章", chunk_index, chunk.strip(), source_path)
+                yield PREFACE_TITLE, preface
 
         for idx, (title, start, end) in enumerate(zip(titles, boundaries, boundaries[1:])):
             chapter_body = content[start:end].strip()
             if not chapter_body:
                 continue
+            yield title, chapter_body
+
+    def iter_file_chapters(self, path: Path, buffer_chars: int = READ_BUFFER_CHARS) -> Iterator[Tuple[str, str]]:
+        """Streaming :meth:`iter_chapters` over a UTF-8 file.
+
+        The file is decoded incrementally and only the current chapter plus a
+        small unscanned window are kept in memory, so peak memory is bounded
+        by the longest chapter rather than the file size (a file without any
+        chapter heading is still returned as one piece, like ``iter_chapters``).
+        """
+        # parts 为已移出窗口的当前章节文本；当前章节在 window 中从 chapter_start 开始
+        parts: List[str] = []
+        window = ""
+        chapter_start = 0
+        scan_pos = 0
+        title: str | None = None
+        found = False
+
+        def finish(end: int) -> Iterator[Tuple[str, str]]:
+            body = ("".join(parts) + window[chapter_start:end]).strip()
+            if title is None:
+                if body:
+                    yield PREFACE_TITLE, body
+            elif body:
+                yield title, body
+
+        with Path(path).open("r", encoding="utf-8") as file_obj:
+            while True:
+                block = file_obj.read(buffer_chars)
+                window += block
+                while True:
+                    match = CHAPTER_PATTERN.search(window, scan_pos)
+                    if match is None:
+                        break
+                    yield from finish(match.start())
+                    found = True
+                    title = match.group("title").strip()
+                    parts, chapter_start, scan_pos = [], match.start(), match.end()
+                if not block:
+                    break
+                # 标题匹配最多跨两行（标题后的分隔符可以是换行），倒数第二个换行之前的起点都已判定完毕
+                last = window.rfind("\n")
+                cut = window.rfind("\n", 0, last) + 1 if last > 0 else 0
+                if cut > 0:
+                    if chapter_start < cut:
+                        parts.append(window[chapter_start:cut])
+                    chapter_start = max(0, chapter_start - cut)
+                    window = window[cut:]
+                    scan_pos = max(0, scan_pos - cut)
+
+        if not found:
+            yield UNKNOWN_CHAPTER_TITLE, "".join(parts) + window[chapter_start:]
+            return
+        yield from finish(len(window))
+
+    def _chunks(self, chapters: Iterable[Tuple[str, str]], book_title: str, source_path: Path) -> Iterator[Chunk]:
+        for title, chapter_body in chapters:
+            chapter_hash = NovelHasher.hash_chapter(title, chapter_body)
             for chunk_index, chunk in enumerate(self._split_chapter(chapter_body)):
-                yield Chunk(book_title, title, chunk_index, chunk.strip(), source_path)
+                yield Chunk(book_title, title, chunk_index, chunk.strip(), source_path, chapter_hash)
+
+    def split(self, content: str, *, book_title: str, source_path: Path) -> Iterable[Chunk]:
+        return self._chunks(self.iter_chapters(content), book_title, source_path)
+
+    def split_file(self, path: Path, *, book_title: str, source_path: Path | None = None) -> Iterator[Chunk]:
+        """Lazily split a UTF-8 file; yields exactly what ``split(path.read_text("utf-8"))`` would."""
+        return self._chunks(self.iter_file_chapters(path), book_title, source_path or Path(path))
 
 
 __all__ = ["Chunk", "ChapterTextSplitter"]
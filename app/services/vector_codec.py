@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from typing import List, Sequence
+
+import numpy as np
+
+from ..config import settings
+
+STORAGE_DTYPES = ("float32", "float16", "bfloat16")
+
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Matryoshka-style truncation: keep the first ``dim`` components and renormalize to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.shape[-1] == dim:
+        return vectors
+    if vectors.shape[-1] < dim:
+        raise ValueError(f"Cannot truncate {vectors.shape[-1]}-dim vectors to {dim} dimensions")
+    head = vectors[..., :dim]
+    norms = np.linalg.norm(head, axis=-1, keepdims=True)
+    return head / np.maximum(norms, 1e-12)
+
+
+def _ml_dtypes():
+    try:
+        import ml_dtypes
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError(
+            "VECTOR_STORAGE_DTYPE=bfloat16 requires ml_dtypes (numpy bfloat16 arrays for pymilvus): pip install ml-dtypes"
+        ) from exc
+    return ml_dtypes
+
+
+def to_bfloat16(vectors: np.ndarray) -> np.ndarray:
+    """float32 -> bfloat16 bit patterns (uint16), rounding to nearest even."""
+    bits = np.ascontiguousarray(vectors, dtype=np.float32).view(np.uint32)
+    rounded = bits + np.uint32(0x7FFF) + ((bits >> np.uint32(16)) & np.uint32(1))
+    return (rounded >> np.uint32(16)).astype(np.uint16)
+
+
+def from_bfloat16(bits: np.ndarray) -> np.ndarray:
+    return (np.asarray(bits, dtype=np.uint16).astype(np.uint32) << np.uint32(16)).view(np.float32)
+
+
+class VectorCodec:
+    """Converts model embeddings to the representation a collection stores, and back.
+
+    ``dim`` below the model's ``source_dim`` truncates (and renormalizes)
+    every vector; ``float16`` / ``bfloat16`` vectors are sent to Milvus as
+    ``np.float16`` / ml_dtypes ``bfloat16`` arrays, half the size of a
+    float32 list on the wire. pymilvus picks the search placeholder from the
+    array dtype (raw ``bytes`` would be taken for a binary vector). Query
+    vectors go through the same truncation, so a collection can be searched
+    with the full-size query embedding.
+    """
+
+    def __init__(self, dtype: str = "float32", dim: int | None = None, source_dim: int | None = None) -> None:
+        self.dtype = dtype.lower()
+        if self.dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown vector storage dtype {dtype}; expected one of {', '.join(STORAGE_DTYPES)}")
+        self.source_dim = source_dim or settings.embedding_dim
+        self.dim = dim or self.source_dim
+        if self.dim > self.source_dim:
+            raise ValueError(f"Stored dimension {self.dim} exceeds the embedding dimension {self.source_dim}")
+        if self.dtype == "bfloat16":
+            _ml_dtypes()
+
+    @classmethod
+    def from_settings(cls) -> "VectorCodec":
+        return cls(settings.vector_storage_dtype, settings.vector_truncate_dim or None)
+
+    @property
+    def truncated(self) -> bool:
+        return self.dim < self.source_dim
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dim * (4 if self.dtype == "float32" else 2)
+
+    @property
+    def label(self) -> str:
+        return f"{self.dtype}/{self.dim}"
+
+    def prepare(self, vectors) -> np.ndarray:
+        """``(n, dim)`` float32 matrix of what will be stored (truncated, not yet quantized)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return truncate(vectors, self.dim) if vectors.shape[-1] != self.dim else vectors
+
+    def encode(self, vectors) -> List[np.ndarray]:
+        """One Milvus field value per row: float32, float16 or bfloat16 arrays."""
+        matrix = self.prepare(vectors)
+        if self.dtype == "float16":
+            return list(matrix.astype(np.float16))
+        if self.dtype == "bfloat16":
+            # 先按最近偶数舍入得到位模式，再视作 ml_dtypes 的 bfloat16
+            return list(to_bfloat16(matrix).view(_ml_dtypes().bfloat16))
+        return list(matrix)
+
+    def encode_query(self, embedding: Sequence[float]) -> np.ndarray:
+        return self.encode(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+
+    def decode(self, value) -> np.ndarray:
+        """Stored field value (bytes, 16-bit array or float list) -> float32 vector."""
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            if self.dtype == "float32":
+                return np.frombuffer(value, dtype=np.float32).copy()
+            value = np.frombuffer(value, dtype=np.float16 if self.dtype == "float16" else np.uint16)
+        array = np.asarray(value)
+        if self.dtype == "bfloat16" and array.dtype == np.uint16:
+            return from_bfloat16(array)
+        return array.astype(np.float32)
+
+
+__all__ = ["STORAGE_DTYPES", "VectorCodec", "from_bfloat16", "to_bfloat16", "truncate"]
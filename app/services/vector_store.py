@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import json
 import logging
-from dataclasses import dataclass
-from typing import List, Sequence
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from pymilvus import (
     Collection,
@@ -16,9 +21,25 @@ from pymilvus import (
 )
 
 from ..config import settings
+from .collection_manager import get_load_manager
+from .hashing import NovelHasher
+from .index_profiles import IndexProfile, IndexProfileStore
+from .vector_codec import VectorCodec
 
 logger = logging.getLogger(__name__)
 
+_DELETE_BATCH = 256
+_VECTOR_TYPES = {
+    "float32": DataType.FLOAT_VECTOR,
+    "float16": DataType.FLOAT16_VECTOR,
+    "bfloat16": DataType.BFLOAT16_VECTOR,
+}
+
+
+def quote_expr(value: str) -> str:
+    """Quote a string literal for a Milvus boolean expression."""
+    return "\"" + value.replace("\\", "\\\\").replace("\"", "\\\"") + "\""
+
 
 @dataclass
 class VectorRecord:
@@ -29,15 +50,179 @@ class VectorRecord:
     chunk_index: int
     source_path: str
     file_hash: str
+    chapter_hash: str = ""
 
+    @property
+    def chunk_id(self) -> int:
+        # 旧数据没有 chapter_hash，退回用章节名区分
+        return NovelHasher.chunk_id(self.file_hash, self.chapter_hash or self.chapter_title, self.chunk_index)
+
+
+@dataclass
+class SearchHit:
+    """Backend-neutral search result with the same ``id`` / ``distance`` / ``entity`` shape as a Milvus hit."""
+
+    id: int
+    distance: float
+    entity: Dict[str, object] = field(default_factory=dict)
 
-class MilvusVectorStore:
-    """Wrapper around Milvus collection management and operations."""
+
+class VectorStore(ABC):
+    """Operations the API, RAG service and uploader need from a vector store backend."""
 
     def __init__(self, collection_name: str | None = None) -> None:
         self.collection_name = collection_name or settings.milvus_collection
+        self._write_listeners: List[Callable[[str], None]] = []
+
+    @abstractmethod
+    def list_collections(self) -> List[str]: ...
+
+    @abstractmethod
+    def use_collection(self, collection_name: str) -> None: ...
+
+    @abstractmethod
+    def drop_collection(self, collection_name: str) -> None: ...
+
+    @abstractmethod
+    def list_books(self, collection_name: str | None = None) -> List[str]: ...
+
+    @abstractmethod
+    def book_stats(self, collection_name: str | None = None) -> Dict[str, Dict[str, int]]:
+        """Full scan: ``book_title -> {file_hash: chunk count}``, used to rebuild the catalog."""
+
+    @abstractmethod
+    def has_file(self, file_hash: str, collection_name: str | None = None) -> bool: ...
+
+    @abstractmethod
+    def uses_chunk_ids(self, collection_name: str | None = None) -> bool: ...
+
+    @abstractmethod
+    def supports_chapter_hashes(self, collection_name: str | None = None) -> bool: ...
+
+    @abstractmethod
+    def uses_partition_key(self, collection_name: str | None = None) -> bool:
+        """Whether ``book_title`` is the collection's partition key, so per-book searches prune partitions."""
+
+    @abstractmethod
+    def fetch_chapters(self, book_title: str, collection_name: str | None = None) -> Dict[str, Tuple[str, int]]: ...
+
+    @abstractmethod
+    def delete_chapters(
+        self, book_title: str, chapter_hashes: Iterable[str], collection_name: str | None = None
+    ) -> int: ...
+
+    @abstractmethod
+    def delete_file(self, file_hash: str, collection_name: str | None = None) -> int: ...
+
+    @abstractmethod
+    def delete_book(self, book_title: str, collection_name: str | None = None) -> int: ...
+
+    @abstractmethod
+    def iter_records(
+        self, collection_name: str | None = None, batch_size: int = 2000, with_embeddings: bool = False
+    ) -> Iterator[List[VectorRecord]]:
+        """Yield every stored chunk in batches; embeddings are only read when ``with_embeddings`` is set."""
+
+    @abstractmethod
+    def _rows(self, records: Sequence[VectorRecord], collection_name: str) -> List[Dict[str, object]]: ...
+
+    @abstractmethod
+    def _write_rows(self, rows: List[Dict[str, object]], collection_name: str) -> None: ...
+
+    @abstractmethod
+    def _flush(self, collection_name: str) -> None: ...
+
+    @abstractmethod
+    def collection_version(self, collection_name: str | None = None) -> int: ...
+
+    @abstractmethod
+    def codec(self, collection_name: str | None = None) -> VectorCodec:
+        """How the collection stores vectors (dtype and, if truncated, dimension)."""
+
+    @abstractmethod
+    def memory_bytes(self, collection_name: str | None = None) -> int:
+        """Memory the collection's vectors and index take when loaded for search."""
+
+    @abstractmethod
+    def rename_collection(self, old_name: str, new_name: str) -> None: ...
+
+    @abstractmethod
+    def index_profile(self, collection_name: str | None = None) -> IndexProfile:
+        """Index type and build / search parameters the collection is currently served with."""
+
+    @abstractmethod
+    def build_index(self, profile: IndexProfile, collection_name: str | None = None) -> None:
+        """Rebuild the collection's index as ``profile`` (if it differs) and search with its parameters from now on."""
+
+    @abstractmethod
+    def search(
+        self,
+        embedding: List[float],
+        top_k: int = 4,
+        collection_name: str | None = None,
+        book_title: str | None = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ):
+        """Top-k hits; ``search_params`` overrides the profile's search parameters for this call."""
+
+    def flush(self, collection_name: str | None = None) -> None:
+        """Persist buffered rows; call once per book or job, not per batch."""
+        name = collection_name or self.collection_name
+        self._flush(name)
+        self._notify_write(name)
+
+    def insert_records(self, records, collection_name=None, flush: bool = True):
+        if not records:
+            return
+
+        name = collection_name or self.collection_name
+        self._write_rows(self._rows(records, name), name)
+        if flush:
+            self.flush(name)
+        else:
+            self._notify_write(name)
+
+    def buffered_writer(
+        self,
+        collection_name: str | None = None,
+        *,
+        max_rows: int | None = None,
+        max_delay: float | None = None,
+        max_in_flight: int | None = None,
+    ) -> "BufferedWriter":
+        return BufferedWriter(
+            self,
+            collection_name or self.collection_name,
+            max_rows=max_rows,
+            max_delay=max_delay,
+            max_in_flight=max_in_flight,
+        )
+
+    def add_write_listener(self, listener: Callable[[str], None]) -> None:
+        """Register a callback invoked with the collection name after rows are inserted or deleted."""
+        self._write_listeners.append(listener)
+
+    def _notify_write(self, collection_name: str) -> None:
+        for listener in self._write_listeners:
+            try:
+                listener(collection_name)
+            except Exception as exc:  # pragma: no cover - listeners must not break ingestion
+                logger.warning("Write listener failed for collection %s: %s", collection_name, exc)
+
+
+class MilvusVectorStore(VectorStore):
+    """Wrapper around Milvus collection management and operations."""
+
+    def __init__(self, collection_name: str | None = None) -> None:
+        super().__init__(collection_name)
+        self._schema_cache: Dict[str, CollectionSchema] = {}
+        self._codecs: Dict[str, VectorCodec] = {}
+        self.profiles = IndexProfileStore()
+        # 没有记录索引配置的旧集合，从 Milvus 读出的实际索引
+        self._discovered_profiles: Dict[str, IndexProfile] = {}
         self._connect()
         self._ensure_database()
+        self.loads = get_load_manager()
         self.collection = self._ensure_collection()
 
     def _connect(self) -> None:
@@ -56,31 +241,39 @@ class MilvusVectorStore:
         existing_collections = set(utility.list_collections())
         if self.collection_name in existing_collections:
             logger.info("Using existing collection %s", self.collection_name)
-            collection = Collection(self.collection_name)
+            collection = self.loads.handle(self.collection_name)
         else:
             logger.info("Creating collection %s", self.collection_name)
+            codec = VectorCodec.from_settings()
             schema = CollectionSchema(
                 fields=[
-                    FieldSchema("id", DataType.INT64, is_primary=True, auto_id=True),
-                    FieldSchema("book_title", DataType.VARCHAR, max_length=256),
+                    # 主键由 (file_hash, 章节, chunk_index) 计算，重复写入同一分片时覆盖而不是新增
+                    FieldSchema("id", DataType.INT64, is_primary=True, auto_id=False),
+                    # 分区键模式下按书名哈希分区，按书检索只扫描对应分区
+                    FieldSchema(
+                        "book_title",
+                        DataType.VARCHAR,
+                        max_length=256,
+                        is_partition_key=settings.milvus_partition_key,
+                    ),
                     FieldSchema("chapter_title", DataType.VARCHAR, max_length=2048),
                     FieldSchema("chunk_index", DataType.INT64),
                     FieldSchema("source_path", DataType.VARCHAR, max_length=256),
                     FieldSchema("file_hash", DataType.VARCHAR, max_length=128),
+                    FieldSchema("chapter_hash", DataType.VARCHAR, max_length=64),
                     FieldSchema("content", DataType.VARCHAR, max_length=8192),
-                    FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=settings.embedding_dim),
+                    # 向量可按 VECTOR_STORAGE_DTYPE 存为半精度，并按 VECTOR_TRUNCATE_DIM 截断维度
+                    FieldSchema("embedding", _VECTOR_TYPES[codec.dtype], dim=codec.dim),
                 ]
             )
-            collection = Collection(self.collection_name, schema=schema)
-            collection.create_index(
-                field_name="embedding",
-                index_params={
-                    "metric_type": settings.milvus_metric_type,
-                    "index_type": "IVF_FLAT",
-                    "params": {"nlist": 1024},
-                },
-            )
-        collection.load()
+            options = {"num_partitions": settings.milvus_num_partitions} if settings.milvus_partition_key else {}
+            collection = Collection(self.collection_name, schema=schema, **options)
+            self.loads.register(collection)
+            # 记录建集合时的索引配置，之后修改 MILVUS_INDEX_TYPE 只影响新集合
+            profile = self.profiles.get(self.collection_name) or IndexProfile.from_settings()
+            collection.create_index(field_name="embedding", index_params=profile.index_params(settings.milvus_metric_type))
+            self.profiles.save(self.collection_name, profile)
+        # 不在这里 load：首次检索或查询时由加载管理器按需加载，并在超出预算时释放冷集合
         return collection
 
     def list_collections(self) -> List[str]:
@@ -92,59 +285,301 @@ class MilvusVectorStore:
         self.collection_name = collection_name
         self.collection = self._ensure_collection()
 
+    def drop_collection(self, collection_name: str) -> None:
+        self.loads.discard(collection_name)
+        utility.drop_collection(collection_name)
+        self.profiles.remove(collection_name)
+        self._forget(collection_name)
+
+    def rename_collection(self, old_name: str, new_name: str) -> None:
+        profile = self.profiles.get(old_name)
+        self.loads.discard(old_name)
+        utility.rename_collection(old_name, new_name)
+        if profile is not None:
+            self.profiles.save(new_name, profile)
+            self.profiles.remove(old_name)
+        self._forget(old_name)
+        self._forget(new_name)
+
+    def _forget(self, collection_name: str) -> None:
+        self._schema_cache.pop(collection_name, None)
+        self._codecs.pop(collection_name, None)
+        self._discovered_profiles.pop(collection_name, None)
+
     def list_books(self, collection_name: str | None = None) -> List[str]:
-        collection = Collection(collection_name or self.collection_name)
-        results = collection.query(
-            expr="book_title != ''",
-            output_fields=["book_title"],
-            consistency_level=settings.milvus_consistency_level,
-            limit=16384,
+        results = self.loads.run(
+            collection_name or self.collection_name,
+            lambda collection: collection.query(
+                expr="book_title != ''",
+                output_fields=["book_title"],
+                consistency_level=settings.milvus_consistency_level,
+                limit=16384,
+            ),
         )
         return sorted({row["book_title"] for row in results})
 
+    def book_stats(self, collection_name: str | None = None) -> Dict[str, Dict[str, int]]:
+        stats: Dict[str, Dict[str, int]] = {}
+        with self.loads.loaded(collection_name or self.collection_name) as collection:
+            iterator = collection.query_iterator(
+                batch_size=16384,
+                expr="",
+                output_fields=["book_title", "file_hash"],
+                consistency_level=settings.milvus_consistency_level,
+            )
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    for row in rows:
+                        files = stats.setdefault(row["book_title"], {})
+                        files[row["file_hash"]] = files.get(row["file_hash"], 0) + 1
+            finally:
+                iterator.close()
+        return stats
+
     def has_file(self, file_hash: str, collection_name: str | None = None) -> bool:
-        collection = Collection(collection_name or self.collection_name)
-        safe_hash = file_hash.replace("\"", "\\\"")
         try:
-            results = collection.query(
-                expr=f"file_hash == \"{safe_hash}\"",
-                output_fields=["file_hash"],
-                consistency_level=settings.milvus_consistency_level,
+            results = self.loads.run(
+                collection_name or self.collection_name,
+                lambda collection: collection.query(
+                    expr=f"file_hash == {quote_expr(file_hash)}",
+                    output_fields=["file_hash"],
+                    consistency_level=settings.milvus_consistency_level,
+                    limit=1,
+                ),
             )
         except MilvusException:
             return False
         return len(results) > 0
 
-    def insert_records(self, records, collection_name=None):
-        if not records:
-            return
+    def _schema(self, collection_name: str) -> CollectionSchema:
+        schema = self._schema_cache.get(collection_name)
+        if schema is None:
+            schema = self.loads.handle(collection_name).schema
+            self._schema_cache[collection_name] = schema
+        return schema
+
+    def codec(self, collection_name: str | None = None) -> VectorCodec:
+        name = collection_name or self.collection_name
+        codec = self._codecs.get(name)
+        if codec is None:
+            field = next(field for field in self._schema(name).fields if field.name == "embedding")
+            dtype = next(key for key, value in _VECTOR_TYPES.items() if value == field.dtype)
+            codec = self._codecs[name] = VectorCodec(dtype, int(field.params["dim"]))
+        return codec
+
+    def memory_bytes(self, collection_name: str | None = None) -> int:
+        name = collection_name or self.collection_name
+        with self.loads.loaded(name):
+            return self.loads.memory_size(name)
+
+    def _field_names(self, collection_name: str) -> Set[str]:
+        return {field.name for field in self._schema(collection_name).fields}
+
+    def uses_chunk_ids(self, collection_name: str | None = None) -> bool:
+        """Whether rows are keyed by deterministic chunk ids (upsert) rather than Milvus ``auto_id``."""
+        return not self._schema(collection_name or self.collection_name).primary_field.auto_id
+
+    def supports_chapter_hashes(self, collection_name: str | None = None) -> bool:
+        """Collections created before chapter-level ingestion lack the ``chapter_hash`` field."""
+        return "chapter_hash" in self._field_names(collection_name or self.collection_name)
+
+    def uses_partition_key(self, collection_name: str | None = None) -> bool:
+        return any(
+            getattr(field, "is_partition_key", False) for field in self._schema(collection_name or self.collection_name).fields
+        )
 
-        collection = Collection(collection_name or self.collection_name)
+    def fetch_chapters(self, book_title: str, collection_name: str | None = None) -> Dict[str, Tuple[str, int]]:
+        """Map ``chapter_hash`` to ``(chapter_title, stored chunk count)`` for one book."""
+        name = collection_name or self.collection_name
+        if not self.supports_chapter_hashes(name):
+            return {}
+        chapters: Dict[str, Tuple[str, int]] = {}
+        with self.loads.loaded(name) as collection:
+            iterator = collection.query_iterator(
+                batch_size=4096,
+                expr=f"book_title == {quote_expr(book_title)}",
+                output_fields=["chapter_hash", "chapter_title"],
+                consistency_level=settings.milvus_consistency_level,
+            )
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    for row in rows:
+                        title, count = chapters.get(row["chapter_hash"], (row["chapter_title"], 0))
+                        chapters[row["chapter_hash"]] = (title, count + 1)
+            finally:
+                iterator.close()
+        return chapters
+
+    def delete_chapters(self, book_title: str, chapter_hashes: Iterable[str], collection_name: str | None = None) -> int:
+        name = collection_name or self.collection_name
+        hashes = list(chapter_hashes)
+        deleted = 0
+        for start in range(0, len(hashes), _DELETE_BATCH):
+            part = ", ".join(quote_expr(value) for value in hashes[start:start + _DELETE_BATCH])
+            expr = f"book_title == {quote_expr(book_title)} and chapter_hash in [{part}]"
+            result = self.loads.run(name, lambda collection: collection.delete(expr=expr, timeout=120))
+            deleted += result.delete_count
+        if deleted:
+            self._notify_write(name)
+        return deleted
+
+    def delete_file(self, file_hash: str, collection_name: str | None = None) -> int:
+        name = collection_name or self.collection_name
+        expr = f"file_hash == {quote_expr(file_hash)}"
+        result = self.loads.run(name, lambda collection: collection.delete(expr=expr, timeout=120))
+        if result.delete_count:
+            self._notify_write(name)
+        return result.delete_count
+
+    def delete_book(self, book_title: str, collection_name: str | None = None) -> int:
+        name = collection_name or self.collection_name
+        expr = f"book_title == {quote_expr(book_title)}"
+        result = self.loads.run(name, lambda collection: collection.delete(expr=expr, timeout=120))
+        if result.delete_count:
+            self._notify_write(name)
+        return result.delete_count
+
+    def iter_records(
+        self, collection_name: str | None = None, batch_size: int = 2000, with_embeddings: bool = False
+    ) -> Iterator[List[VectorRecord]]:
+        name = collection_name or self.collection_name
+        output_fields = ["book_title", "chapter_title", "chunk_index", "source_path", "file_hash", "content"]
+        with_chapter_hash = self.supports_chapter_hashes(name)
+        if with_chapter_hash:
+            output_fields.append("chapter_hash")
+        if with_embeddings:
+            output_fields.append("embedding")
+        codec = self.codec(name)
+        with self.loads.loaded(name) as collection:
+            iterator = collection.query_iterator(
+                batch_size=batch_size,
+                expr="",
+                output_fields=output_fields,
+                consistency_level=settings.milvus_consistency_level,
+            )
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    yield [
+                        VectorRecord(
+                            content=row["content"],
+                            embedding=codec.decode(row["embedding"]).tolist() if with_embeddings else [],
+                            book_title=row["book_title"],
+                            chapter_title=row["chapter_title"],
+                            chunk_index=row["chunk_index"],
+                            source_path=row["source_path"],
+                            file_hash=row["file_hash"],
+                            chapter_hash=row.get("chapter_hash", ""),
+                        )
+                        for row in rows
+                    ]
+            finally:
+                iterator.close()
+
+    def _rows(self, records: Sequence[VectorRecord], collection_name: str) -> List[Dict[str, object]]:
+        with_chapter_hash = self.supports_chapter_hashes(collection_name)
+        with_chunk_ids = self.uses_chunk_ids(collection_name)
+        embeddings = self.codec(collection_name).encode([r.embedding for r in records]) if records else []
         rows = []
-        for r in records:
-            rows.append({
+        for r, embedding in zip(records, embeddings):
+            row = {
                 "book_title": r.book_title,
                 "chapter_title": r.chapter_title,
                 "chunk_index": r.chunk_index,
                 "source_path": r.source_path,
                 "file_hash": r.file_hash,
                 "content": r.content,
-                "embedding": r.embedding,
-            })
-
-        collection.insert(rows, timeout=120)
-        collection.flush()
-
-    def search(self, embedding: List[float], top_k: int = 4, collection_name: str | None = None):
-        collection = Collection(collection_name or self.collection_name)
-        search_params = {"metric_type": settings.milvus_metric_type, "params": {"nprobe": 32}}
+                "embedding": embedding,
+            }
+            if with_chapter_hash:
+                row["chapter_hash"] = r.chapter_hash
+            if with_chunk_ids:
+                row["id"] = r.chunk_id
+            rows.append(row)
+        return rows
+
+    def _write_rows(self, rows: List[Dict[str, object]], collection_name: str) -> None:
+        collection = self.loads.handle(collection_name)
+        if self.uses_chunk_ids(collection_name):
+            collection.upsert(rows, timeout=120)
+        else:
+            # 旧集合使用 auto_id，只能追加写入
+            collection.insert(rows, timeout=120)
+
+    def _flush(self, collection_name: str) -> None:
+        # 封存 growing segment
+        self.loads.handle(collection_name).flush()
+
+    def collection_version(self, collection_name: str | None = None) -> int:
+        """Cheap fingerprint that changes whenever rows are added to the collection."""
+        return self.loads.handle(collection_name or self.collection_name).num_entities
+
+    def index_profile(self, collection_name: str | None = None) -> IndexProfile:
+        name = collection_name or self.collection_name
+        profile = self.profiles.get(name)
+        if profile is not None:
+            return profile
+        profile = self._discovered_profiles.get(name)
+        if profile is None:
+            profile = IndexProfile.from_settings()
+            for index in self.loads.handle(name).indexes:
+                if index.field_name == "embedding":
+                    params = dict(index.params)
+                    build_params = params.get("params") or {}
+                    if isinstance(build_params, str):
+                        build_params = json.loads(build_params)
+                    # 只沿用实际的索引类型和建索引参数，检索参数取该类型的默认值
+                    profile = IndexProfile.create(params.get("index_type", profile.index_type), build_params)
+            self._discovered_profiles[name] = profile
+        return profile
+
+    def build_index(self, profile: IndexProfile, collection_name: str | None = None) -> None:
+        name = collection_name or self.collection_name
+        if not profile.same_index(self.index_profile(name)):
+            logger.info("重建集合 %s 的索引：%s", name, profile.label)
+            started = time.perf_counter()
+            collection = self.loads.handle(name)
+            # 删除索引前必须先释放集合；之后的检索会由加载管理器重新加载
+            self.loads.discard(name)
+            collection.release()
+            collection.drop_index()
+            collection.create_index(field_name="embedding", index_params=profile.index_params(settings.milvus_metric_type))
+            utility.wait_for_index_building_complete(name)
+            logger.info("集合 %s 索引构建完成，用时 %.1fs", name, time.perf_counter() - started)
+        self.profiles.save(name, profile)
+        self._discovered_profiles.pop(name, None)
+
+    def search(
+        self,
+        embedding: List[float],
+        top_k: int = 4,
+        collection_name: str | None = None,
+        book_title: str | None = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ):
+        name = collection_name or self.collection_name
+        param = self.index_profile(name).search_param(settings.milvus_metric_type, top_k, search_params)
+        # 分区键集合上的书名过滤只会检索该书所在的分区；普通集合上则是标量过滤
+        expr = f"book_title == {quote_expr(book_title)}" if book_title else None
         try:
-            results = collection.search(
-                data=[embedding],
-                anns_field="embedding",
-                param=search_params,
-                limit=top_k,
-                output_fields=["book_title", "chapter_title", "chunk_index", "content", "source_path"],
+            results = self.loads.run(
+                name,
+                lambda collection: collection.search(
+                    data=[self.codec(name).encode_query(embedding)],
+                    anns_field="embedding",
+                    param=param,
+                    limit=top_k,
+                    expr=expr,
+                    output_fields=["book_title", "chapter_title", "chunk_index", "content", "source_path"],
+                ),
             )
         except MilvusException:
             return []
@@ -158,66 +593,222 @@ class MilvusVectorStore:
         """
         print(f"Start copying collection: {src_collection} → {dst_collection}")
 
-        # 1. 准备源 collection
-        src = Collection(src_collection)
-        src.load()
-
-        # 2. 目标 collection：如果不存在，就按照你当前类里的 schema 创建
-        if dst_collection not in utility.list_collections():
-            print(f"⚠️  Target collection {dst_collection} not found. Creating...")
-            old = self.collection_name
-            self.use_collection(dst_collection)  # 自动创建
-            self.use_collection(old)
-        dst = Collection(dst_collection)
-
-        # 3. 获取总行数
-        total = src.num_entities
-        print(f"Source total rows: {total}")
-
-        # 4. 分批 query 所有数据
-        offset = 0
-        while offset < total:
-            print(f"➡️  Reading batch offset={offset} ...")
-
-            batch = src.query(
-                expr="",  # 空表达式，读取全量
-                offset=offset,
-                limit=batch_size,
-                output_fields=[
-                    "book_title",
-                    "chapter_title",
-                    "chunk_index",
-                    "source_path",
-                    "file_hash",
-                    "content",
-                    "embedding",
-                ]
-            )
-
-            if not batch:
-                break
-
-            # 转为 VectorRecord
-            records = []
-            for row in batch:
-                rec = VectorRecord(
-                    content=row["content"],
-                    embedding=row["embedding"],
-                    book_title=row["book_title"],
-                    chapter_title=row["chapter_title"],
-                    chunk_index=row["chunk_index"],
-                    source_path=row["source_path"],
-                    file_hash=row["file_hash"],
+        # 1. 准备源 collection（复制期间保持加载，不会被当作冷集合释放）
+        with self.loads.loaded(src_collection) as src:
+            # 2. 目标 collection：如果不存在，就按照你当前类里的 schema 创建
+            if dst_collection not in utility.list_collections():
+                print(f"⚠️  Target collection {dst_collection} not found. Creating...")
+                old = self.collection_name
+                self.use_collection(dst_collection)  # 自动创建
+                self.use_collection(old)
+
+            # 3. 获取总行数
+            total = src.num_entities
+            print(f"Source total rows: {total}")
+
+            # 4. 分批 query 所有数据
+            output_fields = [
+                "book_title",
+                "chapter_title",
+                "chunk_index",
+                "source_path",
+                "file_hash",
+                "content",
+                "embedding",
+            ]
+            if self.supports_chapter_hashes(src_collection):
+                output_fields.append("chapter_hash")
+            writer = self.buffered_writer(dst_collection)
+            src_codec = self.codec(src_collection)
+            offset = 0
+            while offset < total:
+                print(f"➡️  Reading batch offset={offset} ...")
+
+                batch = src.query(
+                    expr="",  # 空表达式，读取全量
+                    offset=offset,
+                    limit=batch_size,
+                    output_fields=output_fields,
                 )
-                records.append(rec)
-
-            # 写入目标 collection
-            self.insert_records(records, collection_name=dst_collection)
-            print(f"    ✔ Inserted {len(records)} rows into {dst_collection}")
-
-            offset += batch_size
 
+                if not batch:
+                    break
+
+                # 转为 VectorRecord
+                records = []
+                for row in batch:
+                    rec = VectorRecord(
+                        content=row["content"],
+                        embedding=src_codec.decode(row["embedding"]),
+                        book_title=row["book_title"],
+                        chapter_title=row["chapter_title"],
+                        chunk_index=row["chunk_index"],
+                        source_path=row["source_path"],
+                        file_hash=row["file_hash"],
+                        chapter_hash=row.get("chapter_hash", ""),
+                    )
+                    records.append(rec)
+
+                # 写入目标 collection（缓冲异步写入，全部复制完再统一 flush）
+                writer.add(records)
+                print(f"    ✔ Queued {len(records)} rows for {dst_collection}")
+
+                offset += batch_size
+
+            writer.close()
         print("Copy finished successfully!")
 
 
-__all__ = ["MilvusVectorStore", "VectorRecord"]
+class BufferedWriter:
+    """Accumulate records for one collection and write them in the background.
+
+    Rows are sent once ``max_rows`` have accumulated or the oldest buffered
+    row is ``max_delay`` seconds old, with up to ``max_in_flight`` writes
+    running at once; ``add`` blocks when that many are outstanding. Nothing is
+    flushed until :meth:`flush`, so callers flush at book or job boundaries
+    instead of after every batch. ``add`` returns a future that resolves once
+    the given records have been written, which is when checkpoints may be
+    advanced.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        collection_name: str,
+        *,
+        max_rows: int | None = None,
+        max_delay: float | None = None,
+        max_in_flight: int | None = None,
+    ) -> None:
+        self.store = store
+        self.collection_name = collection_name
+        self.max_rows = max(1, max_rows or settings.milvus_write_buffer_rows)
+        self.max_delay = max_delay if max_delay is not None else settings.milvus_write_buffer_seconds
+        self.max_in_flight = max(1, max_in_flight or settings.milvus_writes_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="milvus-writer")
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, object]] = []
+        self._waiters: List[Future] = []
+        self._oldest = 0.0
+        self._pending_writes = 0
+        self._idle = threading.Condition(self._lock)
+        self._error: BaseException | None = None
+        self._closed = threading.Event()
+        self._ticker = threading.Thread(target=self._tick, name="milvus-writer-timer", daemon=True)
+        self._ticker.start()
+
+    def add(self, records: Sequence[VectorRecord]) -> Future:
+        """Buffer ``records``; the returned future completes when they are written."""
+        self._raise_error()
+        done: Future = Future()
+        if not records:
+            done.set_result(0)
+            return done
+        rows = self.store._rows(records, self.collection_name)
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            self._waiters.append(done)
+            batch = self._take_locked() if len(self._rows) >= self.max_rows else None
+        if batch is not None:
+            self._submit(*batch)
+        return done
+
+    def _take_locked(self):
+        # 取走的批次立即计入在途写入，drain 不会在批次提交前误判为空闲
+        rows, waiters = self._rows, self._waiters
+        self._rows, self._waiters = [], []
+        self._pending_writes += 1
+        return rows, waiters
+
+    def _submit(self, rows: List[Dict[str, object]], waiters: List[Future]) -> None:
+        # 限制同时在途的写入数量，调用方在这里被反压
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self.store._write_rows, rows, self.collection_name)
+        except RuntimeError as exc:
+            # 线程池已关闭：按写入失败处理，让等待者与在途计数照常收尾
+            future = Future()
+            future.set_exception(exc)
+        future.add_done_callback(lambda fut: self._on_written(fut, len(rows), waiters))
+
+    def _on_written(self, future: Future, count: int, waiters: List[Future]) -> None:
+        error = future.exception()
+        if error is not None and self._error is None:
+            logger.error("Buffered write to %s failed: %s", self.collection_name, error)
+            self._error = error
+        try:
+            for waiter in waiters:
+                if error is not None:
+                    waiter.set_exception(error)
+                else:
+                    waiter.set_result(count)
+        finally:
+            # 等调用方的回调（如推进断点）执行完才算写入结束，drain 依赖这一点
+            self._slots.release()
+            with self._lock:
+                self._pending_writes -= 1
+                self._idle.notify_all()
+
+    def _tick(self) -> None:
+        interval = max(0.05, self.max_delay / 4) if self.max_delay else 0.5
+        while not self._closed.wait(interval):
+            if not self.max_delay:
+                continue
+            with self._lock:
+                due = self._rows and time.monotonic() - self._oldest >= self.max_delay
+                batch = self._take_locked() if due else None
+            if batch is not None:
+                self._submit(*batch)
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Buffered write to {self.collection_name} failed") from self._error
+
+    def drain(self) -> None:
+        """Send buffered rows and wait for every in-flight write, without flushing."""
+        with self._lock:
+            batch = self._take_locked() if self._rows else None
+        if batch is not None:
+            self._submit(*batch)
+        with self._idle:
+            self._idle.wait_for(lambda: self._pending_writes == 0)
+        self._raise_error()
+
+    def flush(self) -> None:
+        self.drain()
+        self.store.flush(self.collection_name)
+
+    def close(self, flush: bool = True) -> None:
+        # 先停下定时线程，之后不会再有批次被提交到即将关闭的线程池
+        self._closed.set()
+        self._ticker.join()
+        try:
+            if flush:
+                self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+def create_vector_store(collection_name: str | None = None) -> VectorStore:
+    """Instantiate the backend selected by ``settings.vector_store_backend``."""
+    backend = settings.vector_store_backend.lower()
+    if backend == "milvus":
+        return MilvusVectorStore(collection_name)
+    if backend == "local":
+        from .local_vector_store import LocalVectorStore
+
+        return LocalVectorStore(collection_name)
+    raise ValueError(f"Unknown vector store backend: {settings.vector_store_backend}")
+
+
+__all__ = [
+    "BufferedWriter",
+    "MilvusVectorStore",
+    "SearchHit",
+    "VectorRecord",
+    "VectorStore",
+    "create_vector_store",
+]
@@ -0,0 +1,78 @@
+"""Compare per-chunk and batched embedding throughput on the local model."""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import time
+from pathlib import Path
+from typing import List
+
+from app.services.embedding import EmbeddingService
+from app.services.text_splitter import ChapterTextSplitter
+
+SAMPLE_SENTENCES = [
+    "少年站在山崖边，望着远处翻滚的云海，心中暗暗发誓。",
+    "大殿之中一片寂静，长老们的目光齐齐落在他的身上。",
+    "夜色渐深，城中灯火一盏盏熄灭，只剩下巡夜人的脚步声。",
+    "她轻轻一笑，手中的长剑却没有丝毫停顿。",
+    "这一战之后，整个大陆都记住了这个名字。",
+]
+
+
+def load_chunks(source: Path | None, limit: int, seed: int) -> List[str]:
+    if source is not None:
+        splitter = ChapterTextSplitter()
+        chunks = splitter.split_file(source, book_title=source.stem)
+        return [c.content for c in itertools.islice(chunks, limit)]
+
+    # 生成长度不一的合成分片，模拟真实章节末尾的短分片
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(limit):
+        length = rng.randint(5, 40)
+        chunks.append("".join(rng.choice(SAMPLE_SENTENCES) for _ in range(length)))
+    return chunks
+
+
+def measure(service: EmbeddingService, texts: List[str], batch_size: int) -> float:
+    start = time.perf_counter()
+    service.embed_documents(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed if elapsed > 0 else float("inf")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark EmbeddingService throughput (chunks/sec).")
+    parser.add_argument("--source", type=Path, default=None, help="Optional UTF-8 novel used to build chunks")
+    parser.add_argument("--chunks", type=int, default=256, help="Number of chunks to embed (default: 256)")
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=[8, 16, 32, 64],
+        help="Batch sizes to compare against the one-chunk-per-pass baseline",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic chunk generator")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    texts = load_chunks(args.source, args.chunks, args.seed)
+    service = EmbeddingService()
+
+    # 预热一次，避免首轮的内存分配与算子初始化干扰计时
+    service.embed_documents(texts[:4], batch_size=4)
+
+    baseline = measure(service, texts, batch_size=1)
+    print(f"chunks={len(texts)} device={service.device}")
+    print(f"before (batch_size=1): {baseline:8.2f} chunks/sec")
+    for batch_size in args.batch_sizes:
+        throughput = measure(service, texts, batch_size=batch_size)
+        print(f"after  (batch_size={batch_size}): {throughput:8.2f} chunks/sec  x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare embedding inference backends (fp32, int8, bf16, ONNX Runtime) on the local model.
+
+Each backend runs in its own subprocess so load time and peak RSS are not
+affected by the others. Reported per backend: load time (including export,
+warm-up and the parity check), minimum cosine similarity to fp32, single-query
+latency p50/p99 and batch throughput in chunks/sec.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.embedding import EmbeddingService
+from app.services.embedding_backends import BACKENDS
+from scripts.benchmark_embedding import load_chunks
+from scripts.benchmark_splitter import peak_rss_mb
+
+
+def run_backend(args: argparse.Namespace) -> dict:
+    """Load ``args.child`` in this process and measure it."""
+    texts = load_chunks(args.source, args.chunks, args.seed)
+    # 单条查询用较短的文本模拟用户问题
+    queries = [text[:32] for text in texts[: args.queries]]
+
+    started = time.perf_counter()
+    service = EmbeddingService(batch_size=args.batch_size, backend=args.child, threads=args.threads)
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        service.encode([query], batch_size=1)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    service.encode(texts, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    return {
+        "requested": args.child,
+        "backend": service.backend_name,
+        "load_seconds": load_seconds,
+        "parity": service.parity,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "throughput": len(texts) / elapsed if elapsed > 0 else float("inf"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark EmbeddingService inference backends.")
+    parser.add_argument("--backends", choices=BACKENDS, nargs="+", default=list(BACKENDS), help="Backends to compare")
+    parser.add_argument("--source", type=Path, default=None, help="Optional UTF-8 novel used to build chunks")
+    parser.add_argument("--chunks", type=int, default=256, help="Chunks embedded for the throughput test")
+    parser.add_argument("--queries", type=int, default=100, help="Single-query latency samples")
+    parser.add_argument("--batch_size", type=int, default=32, help="Batch size of the throughput test")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads (default: EMBEDDING_THREADS)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic chunk generator")
+    parser.add_argument("--child", choices=BACKENDS, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        print(json.dumps(run_backend(args)))
+        return
+
+    results = []
+    for backend in args.backends:
+        command = [
+            sys.executable, "-m", "scripts.benchmark_embedding_backends", "--child", backend,
+            "--chunks", str(args.chunks), "--queries", str(args.queries),
+            "--batch_size", str(args.batch_size), "--seed", str(args.seed),
+        ]
+        if args.source is not None:
+            command += ["--source", str(args.source)]
+        if args.threads:
+            command += ["--threads", str(args.threads)]
+        process = subprocess.run(command, capture_output=True, text=True, cwd=Path(__file__).resolve().parents[1])
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()
+            print(f"{backend:>5}: failed: {error[-1] if error else process.returncode}", flush=True)
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{backend:>5}: done", flush=True)
+
+    baseline = next((r["throughput"] for r in results if r["requested"] == "torch"), None)
+    print(f"\nchunks={args.chunks} queries={args.queries} batch_size={args.batch_size}")
+    for result in results:
+        label = result["requested"]
+        if result["backend"] != label:
+            label += f"->{result['backend']}"
+        parity = "   n/a" if result["parity"] is None else f"{result['parity']:.4f}"
+        speedup = f"  x{result['throughput'] / baseline:.2f}" if baseline else ""
+        print(
+            f"{label:<12} load={result['load_seconds']:6.1f}s  cos={parity}  "
+            f"p50={result['p50_ms']:7.2f}ms  p99={result['p99_ms']:7.2f}ms  "
+            f"{result['throughput']:8.2f} chunks/sec{speedup}  peak RSS {result['peak_rss_mb']:.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
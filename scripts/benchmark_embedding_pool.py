@@ -0,0 +1,62 @@
+"""Measure bulk embedding throughput (chunks/sec) against the number of worker processes."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import List
+
+from app.services.embedding import EmbeddingService
+from app.services.embedding_pool import EmbeddingWorkerPool
+from scripts.benchmark_embedding import load_chunks
+
+
+def parse_args() -> argparse.Namespace:
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    parser = argparse.ArgumentParser(description="Benchmark EmbeddingWorkerPool scaling on CPU.")
+    parser.add_argument("--source", type=Path, default=None, help="Optional UTF-8 novel used to build chunks")
+    parser.add_argument("--chunks", type=int, default=1024, help="Number of chunks to embed (default: 1024)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[n for n in (1, 2, 4, 8, 16) if n <= cores],
+        help="Worker counts to test",
+    )
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Override threads per worker")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic chunk generator")
+    return parser.parse_args()
+
+
+def run_in_process(texts: List[str]) -> float:
+    service = EmbeddingService()
+    service.embed_documents(texts[:8])
+    start = time.perf_counter()
+    service.encode(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def run_pool(texts: List[str], workers: int, threads_per_worker: int | None) -> float:
+    with EmbeddingWorkerPool(num_workers=workers, threads_per_worker=threads_per_worker) as pool:
+        pool.encode(texts[: 8 * workers])
+        start = time.perf_counter()
+        pool.encode(texts)
+        return len(texts) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    args = parse_args()
+    texts = load_chunks(args.source, args.chunks, args.seed)
+    print(f"chunks={len(texts)}")
+
+    baseline = run_in_process(texts)
+    print(f"in-process      : {baseline:8.2f} chunks/sec")
+    for workers in args.workers:
+        throughput = run_pool(texts, workers, args.threads_per_worker)
+        print(f"workers={workers:<8d}: {throughput:8.2f} chunks/sec  x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compare in-memory and streaming chapter splitting on a large synthetic novel (throughput and peak RSS)."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.text_splitter import ChapterTextSplitter
+
+SAMPLE_SENTENCES = [
+    "少年站在山崖边，望着远处翻滚的云海，心中暗暗发誓。",
+    "大殿之中一片寂静，长老们的目光齐齐落在他的身上。",
+    "夜色渐深，城中灯火一盏盏熄灭，只剩下巡夜人的脚步声。",
+    "她轻轻一笑，手中的长剑却没有丝毫停顿。",
+    "这一战之后，整个大陆都记住了这个名字。",
+]
+
+
+def write_novel(path: Path, size_mb: int, seed: int) -> None:
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    chapter = 1
+    with path.open("w", encoding="utf-8") as file_obj:
+        file_obj.write("本书纯属虚构。\n\n")
+        while written < target:
+            paragraphs = [
+                "".join(rng.choice(SAMPLE_SENTENCES) for _ in range(rng.randint(3, 12)))
+                for _ in range(rng.randint(20, 60))
+            ]
+            text = f"第{chapter}章 风云再起\n" + "\n".join(paragraphs) + "\n\n"
+            file_obj.write(text)
+            written += len(text.encode("utf-8"))
+            chapter += 1
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(mode: str, path: Path) -> dict:
+    """Split ``path`` in this process and report chunks, time, peak RSS and an output digest."""
+    splitter = ChapterTextSplitter()
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if mode == "memory":
+        content = path.read_text("utf-8")
+        chunks = splitter.split(content, book_title=path.stem, source_path=path)
+    else:
+        chunks = splitter.split_file(path, book_title=path.stem)
+    digest = hashlib.sha256()
+    count = 0
+    for chunk in chunks:
+        digest.update(f"{chunk.chapter_title}\0{chunk.chunk_index}\0{chunk.chapter_hash}\0{chunk.content}\0".encode("utf-8"))
+        count += 1
+    return {
+        "mode": mode,
+        "chunks": count,
+        "seconds": time.perf_counter() - started,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+        "digest": digest.hexdigest(),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark ChapterTextSplitter.split vs split_file.")
+    parser.add_argument("--source", type=Path, default=None, help="Existing UTF-8 novel (default: generate one)")
+    parser.add_argument("--size_mb", type=int, default=300, help="Size of the generated novel in MB (default: 300)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic novel generator")
+    parser.add_argument("--child", choices=["memory", "stream"], default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        # 子进程只跑一种模式，峰值 RSS 互不干扰
+        print(json.dumps(run_mode(args.child, args.source)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source
+        if source is None:
+            source = Path(tmp) / "synthetic.txt"
+            print(f"generating {args.size_mb} MB synthetic novel ...")
+            write_novel(source, args.size_mb, args.seed)
+        size_mb = source.stat().st_size / 1024 / 1024
+
+        results = {}
+        for mode in ("memory", "stream"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--source", str(source)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"file={size_mb:.1f} MB")
+    for mode, result in results.items():
+        print(
+            f"{mode:>6}: {result['chunks']} chunks in {result['seconds']:.2f}s "
+            f"({size_mb / result['seconds']:.1f} MB/s), peak RSS {result['peak_rss_mb']:.0f} MB "
+            f"(+{result['peak_rss_mb'] - result['baseline_rss_mb']:.0f} MB over startup)"
+        )
+    same = results["memory"]["digest"] == results["stream"]["digest"]
+    print(f"identical output: {same}")
+    if not same:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare vector storage modes (dtype and truncated dimension) on copies of a collection.
+
+For each mode the collection is copied into a scratch collection with that
+mode and the same index profile, then recall@k (against exact search over the
+original full-precision vectors), index memory and query latency are measured.
+Scratch collections are dropped afterwards unless ``--keep`` is given.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from typing import List, Tuple
+
+from app.config import settings
+from app.logger import configure_logging
+from app.services.vector_store import create_vector_store
+from scripts.migrate_vector_storage import create_copy
+from scripts.tune_index import exact_neighbours, measure, sample_queries
+
+logger = logging.getLogger(__name__)
+
+
+def parse_mode(value: str) -> Tuple[str, int]:
+    dtype, _, dim = value.partition(":")
+    return dtype.lower(), int(dim or 0)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark recall, memory and latency of vector storage modes.")
+    parser.add_argument("--collection", type=str, default=settings.milvus_collection,
+                        help=f"Source collection (default: {settings.milvus_collection})")
+    parser.add_argument("--modes", type=str, nargs="*",
+                        default=["float32", "float16", "bfloat16", "float16:512", "float16:256"],
+                        help="Modes as dtype[:dim]; dim 0 or omitted keeps the full dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out chunks used as queries")
+    parser.add_argument("--top_k", type=int, default=10, help="k of recall@k")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed searches before each measurement")
+    parser.add_argument("--batch_size", type=int, default=2000, help="Rows per batch when copying and scanning")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the query sample")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    store = create_vector_store(args.collection)
+    source = args.collection
+    metric = settings.milvus_metric_type.upper()
+    queries, rows = sample_queries(store, source, args.queries, args.seed, args.batch_size)
+    if len(queries) < 2:
+        raise SystemExit(f"集合 {source} 中的分片太少，无法评估")
+    truth = exact_neighbours(store, source, queries, args.top_k, metric, args.batch_size)
+    source_codec = store.codec(source)
+    logger.info("集合 %s：%d 个分片（%s），抽取 %d 个查询", source, rows, source_codec.label, len(queries))
+
+    lines: List[str] = []
+    for mode in args.modes:
+        dtype, dim = parse_mode(mode)
+        scratch = f"{source}__bench_{dtype}_{dim or source_codec.dim}"
+        try:
+            create_copy(store, source, scratch, dtype, dim, args.batch_size)
+        except (ValueError, RuntimeError) as exc:
+            logger.warning("跳过 %s：%s", mode, exc)
+            continue
+        try:
+            codec = store.codec(scratch)
+            result = measure(
+                store, scratch, store.index_profile(scratch), queries, truth, args.top_k, 0.0, args.warmup
+            )
+            memory_mb = store.memory_bytes(scratch) / 1024 / 1024
+            lines.append(
+                f"{codec.label:<16} {codec.bytes_per_vector:>8} B/vec  memory={memory_mb:9.1f} MB  "
+                f"recall@{args.top_k}={result.recall:.4f}  p50={result.p50_ms:7.2f}ms  p99={result.p99_ms:7.2f}ms"
+            )
+            print(lines[-1], flush=True)
+        finally:
+            if not args.keep:
+                store.drop_collection(scratch)
+
+    print(f"\n{source}: {rows} chunks, {len(queries)} queries, recall against exact {source_codec.label} search")
+    for line in lines:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
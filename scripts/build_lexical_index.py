@@ -0,0 +1,51 @@
+"""Build (or rebuild) the bigram BM25 index of an existing collection from the rows already stored in it."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+from app.config import settings
+from app.logger import configure_logging
+from app.services.lexical_index import LexicalIndexRegistry
+from app.services.vector_store import create_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the lexical index used by hybrid retrieval.")
+    parser.add_argument("--collection", type=str, default=None, help=f"Collection name (default: {settings.milvus_collection})")
+    parser.add_argument("--batch_size", type=int, default=2000, help="Rows read from the vector store per batch")
+    parser.add_argument("--rebuild", action="store_true", help="Delete the existing index file before building")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    store = create_vector_store(args.collection)
+    collection_name = args.collection or store.collection_name
+    registry = LexicalIndexRegistry()
+    if args.rebuild:
+        path = registry.path_for(collection_name)
+        for suffix in ("", "-wal", "-shm"):
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+    index = registry.get(collection_name, create=True)
+    started = time.perf_counter()
+    total = 0
+    try:
+        for records in store.iter_records(collection_name, batch_size=args.batch_size):
+            index.add(records)
+            total += len(records)
+            logger.info("已索引 %d 个分片", total)
+        index.optimize()
+    finally:
+        registry.close()
+    logger.info("集合 %s 的词法索引构建完成：%d 个分片，用时 %.1fs", collection_name, total, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Submit Parquet files produced by ``upload_novels.py --bulk_import`` to Milvus bulk insert.
+
+Files whose import succeeded are moved to ``<collection>/imported/``, so
+running the script again only submits new or failed files.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from pathlib import Path
+
+from app.logger import configure_logging
+from app.services.bulk_import import IMPORTED_DIR, SUCCESS_STATES, submit_files
+from app.services.catalog import CollectionCatalog
+from app.services.vector_store import MilvusVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Submit bulk-import Parquet files to Milvus.")
+    parser.add_argument("directory", type=Path, help="Directory passed to upload_novels.py --bulk_import")
+    parser.add_argument(
+        "--remote_prefix",
+        type=str,
+        default="",
+        help="Path of that directory inside the Milvus object storage bucket (e.g. bulk/2024-06-01)",
+    )
+    parser.add_argument("--poll_interval", type=float, default=5.0, help="Seconds between import state checks")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    collections = sorted(path for path in args.directory.iterdir() if path.is_dir())
+    if not collections:
+        raise SystemExit(f"{args.directory} 下没有待导入的集合目录")
+
+    catalog = CollectionCatalog()
+    for collection_dir in collections:
+        files = sorted(collection_dir.glob("part-*.parquet"))
+        if not files:
+            continue
+        # 确保目标集合存在（按当前 schema 创建）
+        store = MilvusVectorStore(collection_dir.name)
+        remote_paths = {
+            "/".join(part for part in (args.remote_prefix.strip("/"), collection_dir.name, path.name) if part): path
+            for path in files
+        }
+        logger.info("提交 %d 个文件到集合 %s", len(remote_paths), collection_dir.name)
+        states = submit_files(collection_dir.name, list(remote_paths), poll_interval=args.poll_interval)
+        imported_dir = collection_dir / IMPORTED_DIR
+        imported_dir.mkdir(exist_ok=True)
+        failed = []
+        for remote_path, state in states.items():
+            if state in SUCCESS_STATES:
+                remote_paths[remote_path].rename(imported_dir / remote_paths[remote_path].name)
+            else:
+                failed.append(remote_path)
+        if failed:
+            logger.error(
+                "集合 %s 有 %d 个文件导入失败（保留在原处，可重新提交）：%s",
+                collection_dir.name,
+                len(failed),
+                ", ".join(failed),
+            )
+        catalog.reconcile(store, collection_dir.name)
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Inspect and prune the content-addressed chunk embedding cache used by the uploader."""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+from app.config import settings
+from app.services.chunk_cache import ChunkEmbeddingCache
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Manage the chunk embedding cache.")
+    parser.add_argument(
+        "--directory",
+        type=Path,
+        default=None,
+        help=f"Cache directory (default: CHUNK_CACHE_DIR = {settings.chunk_cache_dir})",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("stats", help="Print entry count, file size and dead rows")
+
+    prune = subparsers.add_parser("prune", help="Keep only the most recently used entries and compact the file")
+    prune.add_argument("--max-entries", type=int, required=True, help="Number of entries to keep")
+
+    subparsers.add_parser("compact", help="Rewrite the vector file without changing the entry set")
+    subparsers.add_parser("clear", help="Remove every cached vector")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    cache = ChunkEmbeddingCache(directory=args.directory)
+    try:
+        if args.command == "stats":
+            print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+        elif args.command == "prune":
+            removed = cache.prune(args.max_entries)
+            print(f"Removed {removed} entries")
+            print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+        elif args.command == "compact":
+            cache.prune(cache.stats()["entries"])
+            print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+        elif args.command == "clear":
+            confirm = input(f"确认清空 {cache.directory} 中的全部缓存向量？[y/N]: ").strip().lower()
+            if confirm in {"y", "yes"}:
+                cache.clear()
+                print("Cache cleared")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
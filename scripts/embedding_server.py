@@ -0,0 +1,108 @@
+"""Shared embedding server: one copy of the model for every API worker on the host.
+
+Loads :class:`EmbeddingService` once and serves it over a Unix socket or
+localhost HTTP. Texts from all workers go through a single
+:class:`QueryEmbeddingBatcher`, so concurrent queries from different workers
+are embedded in the same forward pass. API workers use it when
+``EMBEDDING_SERVER_URL`` is set (``unix:///path/to.sock`` or
+``http://127.0.0.1:PORT``).
+
+Endpoints: ``GET /healthz`` (model, dimension, backend) and ``POST /embed``
+with ``{"texts": [...]}``, answered with the vectors as raw little-endian
+float32 rows and the dimension in the ``X-Embedding-Dim`` header.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.config import settings
+from app.logger import configure_logging
+from app.services.embedding import EmbeddingService
+from app.services.metrics import metrics
+from app.services.query_batcher import QueryEmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+def create_app(service: EmbeddingService, batcher: QueryEmbeddingBatcher) -> FastAPI:
+    app = FastAPI(title="Embedding server")
+
+    @app.get("/healthz")
+    async def healthz() -> dict:
+        return {
+            "model": str(service.model_path),
+            "dim": settings.embedding_dim,
+            "backend": service.backend_name,
+            "device": service.device,
+        }
+
+    @app.post("/embed")
+    async def embed(payload: EmbedRequest) -> Response:
+        # 每条文本单独进入合批队列，与其他 worker 的并发请求合并为同一次前向计算
+        vectors = await asyncio.gather(*(batcher.aembed(text) for text in payload.texts))
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(payload.texts), settings.embedding_dim)
+        return Response(
+            matrix.astype("<f4", copy=False).tobytes(),
+            media_type="application/octet-stream",
+            headers={"X-Embedding-Dim": str(settings.embedding_dim)},
+        )
+
+    @app.get("/metrics")
+    async def get_metrics() -> dict:
+        return metrics.snapshot()
+
+    return app
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the embedding model to all API workers on this host.")
+    parser.add_argument("--socket", type=Path, default=None, help="Unix socket path to listen on (preferred on one host)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="TCP address when --socket is not given")
+    parser.add_argument("--port", type=int, default=10030, help="TCP port when --socket is not given")
+    parser.add_argument("--window_ms", type=float, default=settings.query_batch_window_ms,
+                        help=f"Batching window across workers (default: {settings.query_batch_window_ms})")
+    parser.add_argument("--max_batch_size", type=int, default=settings.query_batch_max_size,
+                        help=f"Maximum texts per forward pass (default: {settings.query_batch_max_size})")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    started = time.perf_counter()
+    service = EmbeddingService()
+    batcher = QueryEmbeddingBatcher(service, window_ms=args.window_ms, max_batch_size=args.max_batch_size)
+    logger.info("嵌入模型加载完成，用时 %.2fs", time.perf_counter() - started)
+    app = create_app(service, batcher)
+    try:
+        if args.socket is not None:
+            # 上次异常退出留下的套接字文件会导致绑定失败
+            if args.socket.exists():
+                os.unlink(args.socket)
+            args.socket.parent.mkdir(parents=True, exist_ok=True)
+            uvicorn.run(app, uds=str(args.socket), log_level="warning")
+        else:
+            uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    finally:
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Measure /api/chat throughput while increasing the number of concurrent sessions."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+DEFAULT_QUERIES = [
+    "主角是谁？",
+    "主角是如何遇到伙伴的？",
+    "故事发生在什么地方？",
+    "帮我总结一下前几章的剧情。",
+]
+
+
+async def run_session(
+    client: httpx.AsyncClient,
+    url: str,
+    session_id: str,
+    queries: List[str],
+    requests_per_session: int,
+    collection: str | None,
+    top_k: int,
+    latencies: List[float],
+    errors: List[str],
+) -> None:
+    for index in range(requests_per_session):
+        payload = {
+            "session_id": session_id,
+            "query": queries[index % len(queries)],
+            "top_k": top_k,
+        }
+        if collection:
+            payload["collection"] = collection
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            errors.append(f"{session_id}: {exc}")
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_level(args: argparse.Namespace, concurrency: int) -> None:
+    url = args.base_url.rstrip("/") + "/api/chat"
+    latencies: List[float] = []
+    errors: List[str] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                run_session(
+                    client,
+                    url,
+                    f"loadtest-{concurrency}-{idx}",
+                    args.queries or DEFAULT_QUERIES,
+                    args.requests_per_session,
+                    args.collection,
+                    args.top_k,
+                    latencies,
+                    errors,
+                )
+                for idx in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+    if latencies:
+        ordered = sorted(latencies)
+        p50 = statistics.median(ordered)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    else:
+        p50 = p95 = float("nan")
+    throughput = len(latencies) / elapsed if elapsed > 0 else 0.0
+    print(
+        f"sessions={concurrency:4d}  ok={len(latencies):5d}  errors={len(errors):4d}  "
+        f"throughput={throughput:7.2f} req/s  p50={p50:6.2f}s  p95={p95:6.2f}s"
+    )
+    for message in errors[:3]:
+        print(f"    error: {message}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Load test the chat endpoint with a growing number of concurrent sessions."
+    )
+    parser.add_argument("--base-url", default="http://127.0.0.1:10020", help="FastAPI service base URL")
+    parser.add_argument("--collection", default=None, help="Collection to query (default: server default)")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16, 32],
+        help="Concurrent session counts to test (default: 1 2 4 8 16 32)",
+    )
+    parser.add_argument("--requests-per-session", type=int, default=4, help="Sequential requests per session")
+    parser.add_argument("--top-k", type=int, default=4, help="top_k sent with every request")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Per-request timeout in seconds")
+    parser.add_argument("--queries", nargs="*", default=None, help="Questions to cycle through")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    for concurrency in args.concurrency:
+        await run_level(args, concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
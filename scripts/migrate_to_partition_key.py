@@ -0,0 +1,133 @@
+"""Fold per-book collections into one collection partitioned by book_title.
+
+``upload_novels.py --single_collection`` writes every book twice: once into the
+shared collection and once into a collection of its own, so per-book chat can
+search it alone. A collection with ``book_title`` as partition key serves both
+cases from one copy of the vectors (``ChatRequest.book_title`` filters the
+search). This script copies the given collections into such a collection,
+checks the per-book chunk counts and optionally drops the sources.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from typing import Dict, Set, Tuple
+
+from app.config import settings
+from app.logger import configure_logging
+from app.services.catalog import CollectionCatalog
+from app.services.lexical_index import LexicalIndexRegistry
+from app.services.vector_store import BufferedWriter, VectorStore, create_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Merge collections into one partition-key collection.")
+    parser.add_argument("--target", type=str, default=settings.milvus_collection,
+                        help=f"Partition-key collection to write into (default: {settings.milvus_collection})")
+    parser.add_argument("--sources", type=str, nargs="*", default=None,
+                        help="Collections to merge (default: every collection except the target)")
+    parser.add_argument("--drop_sources", action="store_true",
+                        help="Drop each source collection once all of its chunks are verified in the target")
+    parser.add_argument("--batch_size", type=int, default=2000, help="Rows read from a source per batch")
+    return parser.parse_args()
+
+
+def copy_collection(
+    store: VectorStore,
+    writer: BufferedWriter,
+    lexical_index,
+    source: str,
+    batch_size: int,
+) -> Dict[Tuple[str, str], Set[int]]:
+    """Copy one source into the target; returns the chunk ids seen per ``(book_title, file_hash)``."""
+    expected: Dict[Tuple[str, str], Set[int]] = {}
+    copied = 0
+    for records in store.iter_records(source, batch_size=batch_size, with_embeddings=True):
+        writer.add(records)
+        if lexical_index is not None:
+            lexical_index.add(records)
+        for record in records:
+            expected.setdefault((record.book_title, record.file_hash), set()).add(record.chunk_id)
+        copied += len(records)
+        logger.info("  %s：已复制 %d 个分片", source, copied)
+    writer.flush()
+    return expected
+
+
+def verify(store: VectorStore, target: str, expected: Dict[Tuple[str, str], Set[int]]) -> bool:
+    # 分片 id 由文件哈希、章节和序号决定，重复的书在目标集合里会被覆盖写入，因此按去重后的数量比较
+    stats = store.book_stats(target)
+    ok = True
+    for (book_title, file_hash), chunk_ids in sorted(expected.items()):
+        found = stats.get(book_title, {}).get(file_hash, 0)
+        if found < len(chunk_ids):
+            logger.error("《%s》(%s) 在目标集合中只有 %d/%d 个分片", book_title, file_hash[:12], found, len(chunk_ids))
+            ok = False
+    return ok
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    # 目标集合不存在时按分区键模式创建
+    settings.milvus_partition_key = True
+    store = create_vector_store(args.target)
+    target = store.collection_name
+    if settings.vector_store_backend.lower() == "milvus" and not store.uses_partition_key(target):
+        raise SystemExit(f"集合 {target} 已存在但没有以 book_title 为分区键，请指定新的 --target")
+
+    sources = args.sources if args.sources is not None else [name for name in store.list_collections() if name != target]
+    sources = [name for name in sources if name != target]
+    if not sources:
+        logger.info("没有需要合并的集合")
+        return
+
+    catalog = CollectionCatalog()
+    lexical_indexes = LexicalIndexRegistry()
+    lexical_index = lexical_indexes.get(target, create=True)
+    writer = BufferedWriter(store, target)
+    started = time.perf_counter()
+    dropped = []
+    try:
+        for source in sources:
+            logger.info("合并集合 %s -> %s", source, target)
+            expected = copy_collection(store, writer, lexical_index, source, args.batch_size)
+            if not verify(store, target, expected):
+                logger.error("集合 %s 校验失败，保留源集合", source)
+                continue
+            logger.info(
+                "集合 %s 校验通过：%d 本，%d 个分片",
+                source,
+                len({book for book, _ in expected}),
+                sum(len(ids) for ids in expected.values()),
+            )
+            if args.drop_sources:
+                store.drop_collection(source)
+                catalog.remove_collection(source)
+                path = lexical_indexes.path_for(source)
+                for suffix in ("", "-wal", "-shm"):
+                    path.with_name(path.name + suffix).unlink(missing_ok=True)
+                dropped.append(source)
+        lexical_index.optimize()
+        catalog.reconcile(store, target)
+    finally:
+        writer.close(flush=False)
+        lexical_indexes.close()
+        catalog.close()
+    logger.info(
+        "合并完成：%d 个集合 -> %s，删除源集合 %d 个，用时 %.1fs",
+        len(sources),
+        target,
+        len(dropped),
+        time.perf_counter() - started,
+    )
+    if settings.milvus_collection != target:
+        logger.info("请把 MILVUS_COLLECTION 设为 %s，并在按书问答时传入 book_title", target)
+
+
+if __name__ == "__main__":
+    main()
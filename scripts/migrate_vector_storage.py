@@ -0,0 +1,134 @@
+"""Copy a collection into a new vector storage mode (float16 / bfloat16, optionally truncated dimension).
+
+Milvus cannot change the type or dimension of an existing vector field, so the
+rows are copied into a new collection created with the requested mode; with
+``--replace`` the source is dropped afterwards and the copy renamed to the
+source's name, so the API, lexical index and catalog keep working unchanged.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+from app.config import settings
+from app.logger import configure_logging
+from app.services.catalog import CollectionCatalog
+from app.services.vector_codec import STORAGE_DTYPES, VectorCodec
+from app.services.vector_store import BufferedWriter, VectorStore, create_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+def row_count(store: VectorStore, collection_name: str) -> int:
+    return sum(sum(files.values()) for files in store.book_stats(collection_name).values())
+
+
+def create_copy(
+    store: VectorStore,
+    source: str,
+    target: str,
+    dtype: str,
+    dim: int = 0,
+    batch_size: int = 2000,
+) -> int:
+    """Create ``target`` with the given storage mode and copy every row of ``source`` into it."""
+    if target in store.list_collections():
+        raise ValueError(f"Collection {target} already exists")
+    if settings.vector_store_backend.lower() == "local":
+        if dtype == "bfloat16":
+            raise ValueError("The local vector store stores float32 or float16 only")
+        settings.local_vector_dtype = dtype
+    # 在建集合之前检查存储方式与维度（如 bfloat16 缺少 ml_dtypes），避免留下空集合
+    VectorCodec(dtype, dim or None)
+    settings.vector_storage_dtype = dtype
+    settings.vector_truncate_dim = dim
+    settings.milvus_partition_key = store.uses_partition_key(source)
+
+    previous = store.collection_name
+    store.use_collection(target)
+    store.use_collection(previous)
+    # 沿用源集合的索引类型与检索参数，便于对比
+    store.build_index(store.index_profile(source), target)
+
+    started = time.perf_counter()
+    copied = 0
+    writer = BufferedWriter(store, target)
+    try:
+        for records in store.iter_records(source, batch_size=batch_size, with_embeddings=True):
+            writer.add(records)
+            copied += len(records)
+            logger.info("  %s -> %s：已复制 %d 个分片", source, target, copied)
+    finally:
+        writer.close()
+    logger.info(
+        "已复制 %d 个分片到 %s（%s），用时 %.1fs",
+        copied,
+        target,
+        store.codec(target).label,
+        time.perf_counter() - started,
+    )
+    return copied
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Migrate a collection to reduced-precision / reduced-dimension vectors.")
+    parser.add_argument("--collection", type=str, default=settings.milvus_collection,
+                        help=f"Collection to migrate (default: {settings.milvus_collection})")
+    parser.add_argument("--dtype", choices=STORAGE_DTYPES, default="float16", help="Stored vector type")
+    parser.add_argument("--dim", type=int, default=0,
+                        help="Keep only the first N dimensions, renormalized (0 = full dimension)")
+    parser.add_argument("--target", type=str, default=None, help="Name of the new collection (default: <collection>_<dtype>_<dim>)")
+    parser.add_argument("--replace", action="store_true",
+                        help="Drop the source after a verified copy and give the copy the source's name")
+    parser.add_argument("--batch_size", type=int, default=2000, help="Rows read from the source per batch")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    # 校验复制结果时必须读到刚写入的数据
+    settings.milvus_consistency_level = "Strong"
+    store = create_vector_store(args.collection)
+    source = args.collection
+    if source not in store.list_collections():
+        raise SystemExit(f"集合 {source} 不存在")
+    codec = store.codec(source)
+    if args.dim and args.dim > codec.dim:
+        raise SystemExit(f"集合 {source} 的向量只有 {codec.dim} 维，无法截断到 {args.dim} 维")
+    target = args.target or f"{source}_{args.dtype}_{args.dim or codec.dim}"
+
+    copied = create_copy(store, source, target, args.dtype, args.dim, args.batch_size)
+    stored = row_count(store, target)
+    if stored != copied:
+        raise SystemExit(f"校验失败：复制了 {copied} 个分片，{target} 中只有 {stored} 个；源集合保持不变")
+    logger.info(
+        "向量从 %s 变为 %s，每条 %d -> %d 字节",
+        codec.label,
+        store.codec(target).label,
+        codec.bytes_per_vector,
+        store.codec(target).bytes_per_vector,
+    )
+
+    catalog = CollectionCatalog()
+    try:
+        if args.replace:
+            store.drop_collection(source)
+            store.rename_collection(target, source)
+            catalog.reconcile(store, source)
+            logger.info("集合 %s 已替换为新的存储格式；请重启 API 服务以重新读取集合结构", source)
+        else:
+            catalog.reconcile(store, target)
+            logger.info(
+                "新集合 %s 已就绪；混合检索需要运行 scripts/build_lexical_index.py --collection %s 构建词法索引",
+                target,
+                target,
+            )
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Rebuild the collection/book catalog from the vector store."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+
+from app.logger import configure_logging
+from app.services.catalog import CollectionCatalog
+from app.services.vector_store import create_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild CATALOG_PATH from the collections in the vector store.")
+    parser.add_argument(
+        "--collection",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Only reconcile these collections (default: all collections, dropping catalog entries of missing ones)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    store = create_vector_store()
+    catalog = CollectionCatalog()
+    try:
+        names = args.collection or store.list_collections()
+        if not args.collection:
+            for name in set(catalog.collection_names()).difference(names):
+                logger.info("集合 %s 已不存在，从目录中移除", name)
+                catalog.remove_collection(name)
+        for name in names:
+            catalog.reconcile(store, name)
+        for name in names:
+            books = catalog.books(name)
+            logger.info("  - %s：%d 本，%d 个分片", name, len(books), sum(book.chunk_count for book in books))
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Local stand-in for a Redis server, enough for ``SESSION_BACKEND=redis``.
+
+Speaks RESP2 and implements the handful of commands the session store and
+redis-py's connection setup use (PING, GET, GETEX, SET, DEL, EXISTS, DBSIZE,
+FLUSHDB, SELECT, CLIENT, INFO, QUIT). Keys live in a
+:class:`MemorySessionStore`, so the server evicts by LRU under
+``--max_memory_mb`` / ``--max_entries`` and expires keys idle for longer than
+``--ttl`` (per-key ``EX`` values from clients are not tracked individually).
+Use it for development or a single host running several uvicorn workers; use
+a real Redis for multiple hosts.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.config import settings
+from app.logger import configure_logging
+from app.services.session_store import MemorySessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class ProtocolError(Exception):
+    pass
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    """One command as a list of arguments; ``None`` when the client disconnected."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # 内联命令，如 telnet / redis-cli 手动输入
+        return line.strip().split()
+    arguments = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        if not header.startswith(b"$"):
+            raise ProtocolError("expected bulk string")
+        size = int(header[1:])
+        payload = await reader.readexactly(size + 2)
+        arguments.append(payload[:-2])
+    return arguments
+
+
+def simple(text: str) -> bytes:
+    return f"+{text}\r\n".encode()
+
+
+def error(text: str) -> bytes:
+    return f"-ERR {text}\r\n".encode()
+
+
+def integer(value: int) -> bytes:
+    return f":{value}\r\n".encode()
+
+
+def bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class SessionServer:
+    def __init__(self, store: MemorySessionStore) -> None:
+        self.store = store
+
+    def execute(self, arguments: List[bytes]) -> bytes:
+        name = arguments[0].decode().upper()
+        keys = [argument.decode("utf-8", "surrogateescape") for argument in arguments[1:]]
+        if name == "PING":
+            return bulk(arguments[1]) if len(arguments) > 1 else simple("PONG")
+        if name in ("GET", "GETEX"):
+            # GETEX 的 EX / PX 选项等同于一次访问：存储按闲置时间滑动过期
+            if len(arguments) < 2:
+                return error(f"wrong number of arguments for '{name.lower()}' command")
+            return bulk(self.store.load(keys[0]))
+        if name == "SET":
+            if len(arguments) < 3:
+                return error("wrong number of arguments for 'set' command")
+            self.store.save(keys[0], arguments[2])
+            return simple("OK")
+        if name == "DEL":
+            removed = 0
+            for key in keys:
+                if self.store.load(key) is not None:
+                    self.store.delete(key)
+                    removed += 1
+            return integer(removed)
+        if name == "EXISTS":
+            return integer(sum(self.store.load(key) is not None for key in keys))
+        if name == "DBSIZE":
+            return integer(len(self.store))
+        if name == "FLUSHDB":
+            self.store.clear()
+            return simple("OK")
+        if name in ("SELECT", "CLIENT"):
+            return simple("OK")
+        if name == "INFO":
+            stats = self.store.stats()
+            text = "# Keyspace\r\n" + "".join(f"{key}:{value}\r\n" for key, value in stats.items())
+            return bulk(text.encode())
+        return error(f"unknown command '{name.lower()}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                arguments = await read_command(reader)
+                if arguments is None:
+                    break
+                if not arguments:
+                    continue
+                if arguments[0].upper() == b"QUIT":
+                    writer.write(simple("OK"))
+                    break
+                writer.write(self.execute(arguments))
+                await writer.drain()
+        except (ProtocolError, ValueError, asyncio.IncompleteReadError, ConnectionResetError) as exc:
+            logger.warning("客户端连接异常：%s", exc)
+        finally:
+            writer.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a minimal Redis-protocol server for chat sessions.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Listen address")
+    parser.add_argument("--port", type=int, default=6379, help="Listen port")
+    parser.add_argument("--max_entries", type=int, default=settings.session_max_entries,
+                        help=f"Maximum stored sessions (default: {settings.session_max_entries})")
+    parser.add_argument("--max_memory_mb", type=float, default=settings.session_max_memory_mb,
+                        help=f"Memory cap of stored session bytes (default: {settings.session_max_memory_mb})")
+    parser.add_argument("--ttl", type=float, default=settings.session_ttl_seconds,
+                        help=f"Idle seconds before a session expires (default: {settings.session_ttl_seconds})")
+    return parser.parse_args()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    store = MemorySessionStore(args.max_entries, int(args.max_memory_mb * 1024 * 1024), args.ttl)
+    server = await asyncio.start_server(SessionServer(store).handle, args.host, args.port)
+    logger.info("会话服务监听 %s:%d（最多 %d 个会话，%.0f MB）", args.host, args.port, args.max_entries, args.max_memory_mb)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
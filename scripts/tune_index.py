@@ -0,0 +1,286 @@
+"""Measure recall@k and latency of ANN index settings on a collection and pick the cheapest one meeting a target.
+
+Held-out chunks of the collection serve as queries: each query is a stored
+chunk's own vector, the chunk itself is excluded from both the exact and the
+ANN results, and the exact top-k is computed by a full scan of the stored
+vectors. Candidate indexes are built on the collection in place (searches keep
+working, but each rebuild releases and reloads it), so run this off-peak or
+against a copy. Unless ``--apply`` is given the original index is restored.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.logger import configure_logging
+from app.services.index_profiles import INDEX_TYPES, IndexProfile
+from app.services.local_vector_store import LocalVectorStore
+from app.services.vector_store import VectorRecord, VectorStore, create_vector_store
+
+logger = logging.getLogger(__name__)
+
+ChunkKey = Tuple[str, str, int, str]
+
+
+def chunk_key(fields) -> ChunkKey:
+    # 旧集合的主键是自增 id，用 (书名, 章节, 序号, 路径) 对齐精确结果与 ANN 结果
+    get = fields.get if isinstance(fields, dict) else lambda name: getattr(fields, name)
+    return (get("book_title"), get("chapter_title"), int(get("chunk_index")), get("source_path"))
+
+
+@dataclass
+class Measurement:
+    profile: IndexProfile
+    recall: float
+    p50_ms: float
+    p99_ms: float
+    build_seconds: float
+
+    def row(self) -> str:
+        return (
+            f"{self.profile.label:<48} recall@k={self.recall:.4f}  "
+            f"p50={self.p50_ms:7.2f}ms  p99={self.p99_ms:7.2f}ms  build={self.build_seconds:6.1f}s"
+        )
+
+
+def prepare(vectors: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "COSINE":
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+    return vectors
+
+
+def scores(block: np.ndarray, queries: np.ndarray, metric: str) -> np.ndarray:
+    """``(queries, block)`` similarity, larger is better for every metric."""
+    if metric == "L2":
+        return 2 * queries @ block.T - (block * block).sum(axis=1)[None, :] - (queries * queries).sum(axis=1)[:, None]
+    return queries @ block.T
+
+
+def sample_queries(
+    store: VectorStore, collection: str, count: int, seed: int, batch_size: int
+) -> Tuple[List[VectorRecord], int]:
+    """Reservoir-sample ``count`` stored chunks (with vectors); also returns the collection size."""
+    rng = random.Random(seed)
+    sample: List[VectorRecord] = []
+    seen = 0
+    for records in store.iter_records(collection, batch_size=batch_size, with_embeddings=True):
+        for record in records:
+            seen += 1
+            if len(sample) < count:
+                sample.append(record)
+            else:
+                slot = rng.randrange(seen)
+                if slot < count:
+                    sample[slot] = record
+    return sample, seen
+
+
+def exact_neighbours(
+    store: VectorStore,
+    collection: str,
+    queries: List[VectorRecord],
+    top_k: int,
+    metric: str,
+    batch_size: int,
+) -> List[Set[ChunkKey]]:
+    """Exact top-k of every query by a full scan, excluding the query chunk itself."""
+    query_matrix = prepare(np.asarray([record.embedding for record in queries], dtype=np.float32), metric)
+    own: Dict[ChunkKey, List[int]] = {}
+    for row, record in enumerate(queries):
+        own.setdefault(chunk_key(record), []).append(row)
+    keys: List[ChunkKey] = []
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    for records in store.iter_records(collection, batch_size=batch_size, with_embeddings=True):
+        block = prepare(np.asarray([record.embedding for record in records], dtype=np.float32), metric)
+        block_scores = scores(block, query_matrix, metric)
+        for column, record in enumerate(records):
+            key = chunk_key(record)
+            for row in own.get(key, ()):
+                block_scores[row, column] = -np.inf
+            keys.append(key)
+        block_rows = np.arange(len(keys) - len(records), len(keys))
+        merged_scores = np.concatenate([best_scores, block_scores], axis=1)
+        merged_rows = np.concatenate([best_rows, np.broadcast_to(block_rows, block_scores.shape)], axis=1)
+        keep = min(top_k, merged_scores.shape[1])
+        top = np.argpartition(-merged_scores, keep - 1, axis=1)[:, :keep]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_rows = np.take_along_axis(merged_rows, top, axis=1)
+    return [{keys[row] for row, score in zip(rows, row_scores) if score > -np.inf} for rows, row_scores in zip(best_rows, best_scores)]
+
+
+def measure(
+    store: VectorStore,
+    collection: str,
+    profile: IndexProfile,
+    queries: List[VectorRecord],
+    truth: List[Set[ChunkKey]],
+    top_k: int,
+    build_seconds: float,
+    warmup: int,
+) -> Measurement:
+    for record in queries[:warmup]:
+        store.search(record.embedding, top_k + 1, collection, search_params=profile.search_params)
+    latencies = []
+    recalls = []
+    for record, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = store.search(record.embedding, top_k + 1, collection, search_params=profile.search_params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        own = chunk_key(record)
+        found = [key for key in (chunk_key(hit.entity) for hit in hits) if key != own][:top_k]
+        recalls.append(len(expected.intersection(found)) / max(1, len(expected)))
+    return Measurement(
+        profile=profile,
+        recall=float(np.mean(recalls)),
+        p50_ms=float(np.percentile(latencies, 50)),
+        p99_ms=float(np.percentile(latencies, 99)),
+        build_seconds=build_seconds,
+    )
+
+
+def default_nlist(rows: int) -> int:
+    # 经验值：nlist ≈ 4·√N，取 2 的幂
+    return int(min(65536, max(16, 2 ** round(math.log2(4 * math.sqrt(max(rows, 1)))))))
+
+
+def candidate_profiles(args: argparse.Namespace, rows: int, local: bool) -> List[Tuple[IndexProfile, List[Dict]]]:
+    """Indexes to build, each with the search parameters to sweep (cheapest first)."""
+    supported = LocalVectorStore.INDEX_TYPES if local else INDEX_TYPES
+    index_types = args.index_types or (list(supported) if local else ["FLAT", "IVF_FLAT", "IVF_SQ8", "HNSW"])
+    nlists = args.nlist or [default_nlist(rows)]
+    candidates = []
+    for index_type in index_types:
+        index_type = index_type.upper()
+        if index_type not in supported:
+            logger.warning("当前向量库不支持索引类型 %s，跳过", index_type)
+        elif index_type == "FLAT":
+            candidates.append((IndexProfile.create("FLAT"), [{}]))
+        elif index_type.startswith("IVF"):
+            for nlist in nlists:
+                sweep = [{"nprobe": nprobe} for nprobe in args.nprobe if nprobe <= nlist]
+                candidates.append((IndexProfile.create(index_type, {"nlist": nlist}), sweep))
+        elif index_type == "HNSW":
+            for m in args.hnsw_m:
+                profile = IndexProfile.create("HNSW", {"M": m, "efConstruction": args.ef_construction})
+                candidates.append((profile, [{"ef": ef} for ef in args.ef]))
+        else:
+            candidates.append((IndexProfile.create(index_type), [{}]))
+    return candidates
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tune the ANN index of a collection for a target recall@k.")
+    parser.add_argument("--collection", type=str, default=None, help=f"Collection to tune (default: {settings.milvus_collection})")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out chunks used as queries")
+    parser.add_argument("--top_k", type=int, default=10, help="k of recall@k")
+    parser.add_argument("--target_recall", type=float, default=0.95, help="Minimum mean recall@k of an acceptable setting")
+    parser.add_argument("--index_types", type=str, nargs="*", default=None,
+                        help="Index types to try (default: FLAT IVF_FLAT IVF_SQ8 HNSW; FLAT IVF_FLAT for the local store)")
+    parser.add_argument("--nlist", type=int, nargs="*", default=None, help="IVF nlist values (default: ≈4·sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[4, 8, 16, 32, 64, 128, 256], help="IVF nprobe sweep")
+    parser.add_argument("--hnsw_m", type=int, nargs="*", default=[16], help="HNSW M values")
+    parser.add_argument("--ef_construction", type=int, default=200, help="HNSW efConstruction")
+    parser.add_argument("--ef", type=int, nargs="*", default=[16, 32, 64, 128, 256], help="HNSW ef sweep")
+    parser.add_argument("--full_sweep", action="store_true",
+                        help="Keep sweeping search parameters after one already meets the target recall")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed searches before each measurement")
+    parser.add_argument("--batch_size", type=int, default=2000, help="Rows read per batch for the exact scan")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the query sample")
+    parser.add_argument("--apply", action="store_true", help="Build the recommended index and record it for the collection")
+    parser.add_argument("--output", type=Path, default=None, help="Write all measurements to this JSON file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging()
+    store = create_vector_store(args.collection)
+    collection = args.collection or store.collection_name
+    metric = settings.milvus_metric_type.upper()
+    local = settings.vector_store_backend.lower() == "local"
+    original = store.index_profile(collection)
+
+    started = time.perf_counter()
+    queries, rows = sample_queries(store, collection, args.queries, args.seed, args.batch_size)
+    if len(queries) < 2:
+        raise SystemExit(f"集合 {collection} 中的分片太少，无法评估")
+    truth = exact_neighbours(store, collection, queries, args.top_k, metric, args.batch_size)
+    logger.info(
+        "集合 %s：%d 个分片，抽取 %d 个查询，精确检索基准用时 %.1fs；当前索引 %s",
+        collection,
+        rows,
+        len(queries),
+        time.perf_counter() - started,
+        original.label,
+    )
+
+    results: List[Measurement] = []
+    try:
+        for built, sweep in candidate_profiles(args, rows, local):
+            build_started = time.perf_counter()
+            store.build_index(built, collection)
+            build_seconds = time.perf_counter() - build_started
+            for search_params in sweep:
+                profile = IndexProfile.create(built.index_type, built.build_params, search_params)
+                result = measure(store, collection, profile, queries, truth, args.top_k, build_seconds, args.warmup)
+                results.append(result)
+                print(result.row(), flush=True)
+                if result.recall >= args.target_recall and not args.full_sweep:
+                    break  # 更大的 nprobe / ef 只会更慢
+    finally:
+        accepted = [result for result in results if result.recall >= args.target_recall]
+        best: Optional[Measurement] = min(accepted, key=lambda result: (result.p50_ms, result.p99_ms), default=None)
+        # 未指定 --apply 时恢复原索引；索引相同时只会重新记录配置，不会重建
+        store.build_index(best.profile if best is not None and args.apply else original, collection)
+
+    if args.output is not None:
+        args.output.write_text(
+            json.dumps(
+                {
+                    "collection": collection,
+                    "rows": rows,
+                    "queries": len(queries),
+                    "top_k": args.top_k,
+                    "target_recall": args.target_recall,
+                    "results": [
+                        {
+                            **result.profile.to_dict(),
+                            "recall": result.recall,
+                            "p50_ms": result.p50_ms,
+                            "p99_ms": result.p99_ms,
+                            "build_seconds": result.build_seconds,
+                        }
+                        for result in results
+                    ],
+                },
+                ensure_ascii=False,
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+    if best is None:
+        print(f"no setting reached recall@{args.top_k} >= {args.target_recall}; kept {original.label}")
+        raise SystemExit(1)
+    print(f"recommended: {best.profile.label} (recall@{args.top_k}={best.recall:.4f}, p50={best.p50_ms:.2f}ms)")
+    print(f"  MILVUS_INDEX_TYPE={best.profile.index_type}")
+    print(f"  MILVUS_INDEX_PARAMS={json.dumps(best.profile.build_params)}")
+    print(f"  MILVUS_SEARCH_PARAMS={json.dumps(best.profile.search_params)}")
+    print("applied to " + collection if args.apply else "re-run with --apply to use it for " + collection)
+
+
+if __name__ == "__main__":
+    main()
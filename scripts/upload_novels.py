@@ -2,18 +2,22 @@ from __future__ import annotations
 from scripts.utils import make_collection_name_from_path
 import argparse
 import asyncio
-import json
 import logging
-import sys
 from pathlib import Path
-from typing import Iterable, List
-from tqdm import tqdm
+from typing import Iterable
 
+from app.services.catalog import CollectionCatalog
+from app.services.checkpoint import CheckpointStore
+from app.services.chunk_cache import ChunkEmbeddingCache
 from app.services.embedding import EmbeddingService
+from app.services.embedding_pool import EmbeddingWorkerPool
 from app.services.hashing import NovelHasher
+from app.services.ingestion import IngestionPipeline
+from app.services.lexical_index import LexicalIndexRegistry
+from app.config import settings
 from app.logger import configure_logging
-from app.services.text_splitter import ChapterTextSplitter, Chunk
-from app.services.vector_store import MilvusVectorStore, VectorRecord
+from app.services.text_splitter import ChapterTextSplitter
+from app.services.vector_store import MilvusVectorStore, create_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -25,110 +29,33 @@ def iter_text_files(directory: Path) -> Iterable[Path]:
             yield path
 
 
-async def load_file(path: Path) -> str:
-    return await asyncio.to_thread(path.read_text, "utf-8")
-
-
-async def process_file(
-        path: Path,
-        embedding_service: EmbeddingService,
-        vector_store: MilvusVectorStore,
-        splitter: ChapterTextSplitter,
-        hasher: NovelHasher,
-        collection_name: str,
-        extra_collection_name: str | None,
-        force: bool,
-) -> None:
-    logger.info("Reading %s", path)
-
-    extra_store = None
-    if extra_collection_name:
-        logger.info("为文件 %s 使用独立集合 %s", path.name, extra_collection_name)
-        print(f"本书独立集合名：{path.name} -> {extra_collection_name}")
-        extra_store = MilvusVectorStore(collection_name=extra_collection_name)
-
-    content = await load_file(path)
-
-    book_title = path.stem
-    logger.info("当前文件书名自动设置为：%s", book_title)
-
-    file_hash = hasher.hash_file(path, extra_values=[book_title])
-    if not force and vector_store.has_file(file_hash, collection_name):
-        logger.info("检测到 %s 已上传过，未指定 --force，自动跳过", path)
-        return
-
-    # 1⃣️ 切分文本 —— 带进度条
-    logger.info("正在切分章节…")
-    raw_chunks = list(splitter.split(content, book_title=book_title, source_path=path))
-    chunks = []
-
-    for c in tqdm(raw_chunks, desc="📑 分片处理中"):
-        chunks.append(c)
-
-    # 2⃣️ 分批 embedding + 上传，三个真实进度条
-    BATCH_SIZE = 1000  # 每批处理多少条，可以按机器情况改
-
-    total = len(chunks)
-    logger.info("正在分批生成向量并写入 Milvus...")
-
-    MAX_BOOK_TITLE_LEN = 256
-    MAX_CHAPTER_TITLE_LEN = 512
-    MAX_SOURCE_PATH_LEN = 256
-    MAX_FILE_HASH_LEN = 128
-    MAX_CONTENT_LEN = 8192
-
-    # ① 总体进度条：整本小说的分片总进度
-    with tqdm(total=total, desc="📦 总体进度", unit="chunk") as pbar_total:
-        for start in range(0, total, BATCH_SIZE):
-            end = min(start + BATCH_SIZE, total)
-            batch_chunks = chunks[start:end]
-            batch_texts = [c.content for c in batch_chunks]
-
-            # ② 当前批次 embedding 进度条（嵌入 n 条）
-            batch_embeddings: List[List[float]] = []
-            for text in tqdm(batch_texts, desc="🧠 本批 embedding", leave=False):
-                vec = embedding_service.embed_documents([text])[0]
-                batch_embeddings.append(vec)
-
-            # 组装当前批次记录
-            batch_records: list[VectorRecord] = []
-            for chunk, embedding in zip(batch_chunks, batch_embeddings):
-                chapter_title = chunk.chapter_title
-                if len(chapter_title) > MAX_CHAPTER_TITLE_LEN:
-                    logger.warning("跳过一条记录：chapter_title_len=%d, title=%r", len(chapter_title),
-                                   chapter_title[:80])
-                    continue
-                batch_records.append(
-                    VectorRecord(
-                        content=chunk.content,
-                        embedding=embedding,
-                        book_title=chunk.book_title,
-                        chapter_title=chunk.chapter_title,
-                        chunk_index=chunk.chunk_index,
-                        source_path=str(chunk.source_path),
-                        file_hash=file_hash,
-                    )
-                )
-
-            vector_store.insert_records(batch_records, collection_name)
-            # 如果用户启用了 single_collection，再写入新集合
-            if extra_store is not None:
-                extra_store.insert_records(batch_records)
-            # 更新总体进度
-            pbar_total.update(len(batch_chunks))
-
-    logger.info("已向集合 %s 写入 %d 个分片", collection_name, total)
-    if extra_collection_name:
-        logger.info("已向独立集合 %s 额外写入 %d 个分片", extra_collection_name, total)
-
-
 async def main() -> None:
     parser = argparse.ArgumentParser(description="Upload UTF-8 novels into Milvus vector store")
     parser.add_argument("directory", type=Path, help="Directory containing .txt novel files")
     parser.add_argument("--collection", type=str, default=None, help="Target collection name")
-    parser.add_argument("--force", action="store_true", help="Upload even if file hash already exists")
+    parser.add_argument("--force", action="store_true", help="Re-upload the whole book even if unchanged, replacing its existing chunks")
     parser.add_argument("--single_collection", action="store_true",
                         help="为当前上传额外创建并写入一个新集合")
+    parser.add_argument("--no_embedding_cache", action="store_true",
+                        help="不使用分片向量缓存（CHUNK_CACHE_DIR），全部重新计算")
+    parser.add_argument("--no_lexical_index", action="store_true",
+                        help="不构建词法倒排索引（LEXICAL_INDEX_DIR），混合检索将无法使用")
+    parser.add_argument("--no_checkpoint", action="store_true",
+                        help="不记录断点（INGEST_CHECKPOINT_DIR），中断后无法续传")
+    parser.add_argument("--batch_size", type=int, default=1000,
+                        help="每批送入 embedding 与写入 Milvus 的分片数量")
+    parser.add_argument("--files_in_flight", type=int, default=2,
+                        help="同时处于流水线中的文件数量")
+    parser.add_argument("--queue_size", type=int, default=4,
+                        help="各阶段之间最多缓存的批次数（背压上限）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="embedding 子进程数量（默认读取 EMBEDDING_WORKERS，0 表示在当前进程内计算）")
+    parser.add_argument("--threads_per_worker", type=int, default=None,
+                        help="每个 embedding 子进程的计算线程数（默认按 CPU 核数均分）")
+    parser.add_argument("--bulk_import", type=Path, default=None,
+                        help="不直接写入 Milvus，而是在该目录下生成 Parquet 文件，供 scripts/bulk_import.py 提交批量导入")
+    parser.add_argument("--embedding_batch_size", type=int, default=None,
+                        help="每次前向计算的分片数量（默认读取 EMBEDDING_BATCH_SIZE）")
     args = parser.parse_args()
 
     directory: Path = args.directory
@@ -137,20 +64,27 @@ async def main() -> None:
 
     configure_logging()
 
-    embedding_service = EmbeddingService()
-    vector_store = MilvusVectorStore(collection_name=args.collection)
+    workers = args.workers if args.workers is not None else settings.embedding_workers
+    if workers > 0:
+        embedding_service = EmbeddingWorkerPool(
+            num_workers=workers,
+            threads_per_worker=args.threads_per_worker,
+            batch_size=args.embedding_batch_size,
+        )
+    else:
+        embedding_service = EmbeddingService(batch_size=args.embedding_batch_size)
+    vector_store = create_vector_store(args.collection)
+    if args.bulk_import and not isinstance(vector_store, MilvusVectorStore):
+        raise SystemExit("--bulk_import 仅适用于 Milvus 后端（VECTOR_STORE_BACKEND=milvus）")
     target_collection = args.collection or vector_store.collection_name
+    catalog = CollectionCatalog()
 
     if not args.collection:
-        collections = vector_store.list_collections()
-        if collections:
-            logger.info("当前共有 %d 个集合：", len(collections))
-            for name in collections:
-                try:
-                    novels = vector_store.list_books(name)
-                except Exception as exc:  # pragma: no cover - 运行环境可能缺少权限
-                    logger.warning("读取集合 %s 的小说列表失败：%s", name, exc)
-                    novels = []
+        overview = catalog.overview(vector_store)
+        if overview:
+            logger.info("当前共有 %d 个集合：", len(overview))
+            for name, books in overview.items():
+                novels = [book.book_title for book in books]
                 if novels:
                     logger.info("  - %s (%d 本)：%s", name, len(novels), ", ".join(novels))
                 else:
@@ -168,6 +102,17 @@ async def main() -> None:
 
     splitter = ChapterTextSplitter()
     hasher = NovelHasher()
+    chunk_cache = None if args.no_embedding_cache else ChunkEmbeddingCache()
+    checkpoints = None if args.no_checkpoint or args.bulk_import else CheckpointStore()
+    lexical_indexes = LexicalIndexRegistry()
+    if checkpoints is not None:
+        for manifest in checkpoints.pending():
+            logger.info(
+                "发现未完成的上传：《%s》→ %s，已写入 %d 个分片，本次将从断点继续",
+                manifest.book_title,
+                manifest.collection_name,
+                manifest.rows_written,
+            )
 
     # 先把所有要处理的 txt 文件拿出来
     all_files = list(iter_text_files(directory))
@@ -177,6 +122,10 @@ async def main() -> None:
 
     # 如果需要每本小说单独建 collection，先列出全部名字让你确认
     per_file_extra: dict[Path, str] = {}
+    if args.single_collection and vector_store.uses_partition_key(target_collection):
+        # 分区键集合里每本书已有独立分区，按书检索用 book_title 过滤即可，无需再复制一份向量
+        logger.warning("目标集合 %s 以 book_title 为分区键，忽略 --single_collection", target_collection)
+        args.single_collection = False
     if args.single_collection:
         print("你启用了 --single_collection，将为每本小说创建独立集合。")
         print("即将使用如下映射：")
@@ -189,19 +138,49 @@ async def main() -> None:
         confirm = input("确认以上集合名映射无误后继续？[y/N]: ").strip().lower()
         if confirm not in {"y", "yes"}:
             raise SystemExit("已取消上传。")
-    # sys.exit()
-    for file_path in iter_text_files(directory):
-        extra_name = per_file_extra.get(file_path) if args.single_collection else None
-        await process_file(
-            file_path,
-            embedding_service=embedding_service,
-            vector_store=vector_store,
-            splitter=splitter,
-            hasher=hasher,
-            collection_name=vector_store.collection_name,
-            extra_collection_name=extra_name,
-            force=args.force,
+
+    pipeline = IngestionPipeline(
+        embedding_service=embedding_service,
+        vector_store=vector_store,
+        splitter=splitter,
+        hasher=hasher,
+        chunk_cache=chunk_cache,
+        checkpoints=checkpoints,
+        batch_size=args.batch_size,
+        files_in_flight=args.files_in_flight,
+        queue_size=args.queue_size,
+        force=args.force,
+        bulk_import_dir=args.bulk_import,
+        lexical_indexes=None if args.no_lexical_index else lexical_indexes,
+        catalog=catalog,
+    )
+    files = [(path, per_file_extra.get(path)) for path in all_files]
+    try:
+        results = await pipeline.run(files, vector_store.collection_name)
+    finally:
+        if isinstance(embedding_service, EmbeddingWorkerPool):
+            embedding_service.close()
+        lexical_indexes.close()
+        catalog.close()
+    uploaded = [result for result in results if not result.skipped]
+    logger.info(
+        "共处理 %d 本：写入 %d 本（新写入 %d 个分片，复用 %d 个，删除 %d 个），跳过 %d 本",
+        len(results),
+        len(uploaded),
+        sum(result.chunks_indexed for result in uploaded),
+        sum(result.chunks_reused for result in uploaded),
+        sum(result.chunks_deleted for result in uploaded),
+        len(results) - len(uploaded),
+    )
+    if args.bulk_import:
+        logger.info(
+            "Parquet 文件已写入 %s；复制到 Milvus 使用的对象存储后运行 scripts/bulk_import.py 提交导入",
+            args.bulk_import,
         )
+    if chunk_cache is not None:
+        stats = chunk_cache.stats()
+        logger.info("分片向量缓存：命中 %d，新计算 %d，当前共 %d 条", stats["hits"], stats["misses"], stats["entries"])
+        chunk_cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.vector_store import VectorRecord
+
+DIM = 8
+
+
+@pytest.fixture(autouse=True)
+def small_settings(tmp_path, monkeypatch):
+    """Small embeddings and a throw-away data directory for every test."""
+    monkeypatch.setattr(settings, "embedding_dim", DIM)
+    monkeypatch.setattr(settings, "vector_truncate_dim", 0)
+    monkeypatch.setattr(settings, "local_vector_dtype", "float32")
+    monkeypatch.setattr(settings, "local_vector_index", "flat")
+    monkeypatch.setattr(settings, "milvus_metric_type", "COSINE")
+    monkeypatch.setattr(settings, "milvus_collection", "novels")
+    monkeypatch.setattr(settings, "local_vector_dir", tmp_path / "vector_store")
+    monkeypatch.setattr(settings, "lexical_index_dir", tmp_path / "lexical_index")
+
+
+def make_records(
+    book_title: str,
+    file_hash: str,
+    vectors: np.ndarray,
+    contents: list[str] | None = None,
+    chapter_hash: str = "c1",
+) -> list[VectorRecord]:
+    return [
+        VectorRecord(
+            content=contents[index] if contents else f"{book_title} 第{index}段",
+            embedding=np.asarray(vector, dtype=np.float32).tolist(),
+            book_title=book_title,
+            chapter_title=f"第{chapter_hash}章",
+            chunk_index=index,
+            source_path=f"/novels/{book_title}.txt",
+            file_hash=file_hash,
+            chapter_hash=chapter_hash,
+        )
+        for index, vector in enumerate(vectors)
+    ]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.catalog import CollectionCatalog
+
+
+class CountingVersion:
+    def __init__(self, version=1) -> None:
+        self.version = version
+        self.calls = 0
+
+    def __call__(self, collection: str):
+        self.calls += 1
+        return self.version
+
+
+def make_cache(version_fn, version_ttl_seconds: float) -> SemanticAnswerCache:
+    return SemanticAnswerCache(
+        threshold=0.9, max_entries=8, ttl_seconds=0, version_fn=version_fn, version_ttl_seconds=version_ttl_seconds
+    )
+
+
+def test_hits_reuse_the_version_within_its_ttl():
+    version = CountingVersion()
+    cache = make_cache(version, version_ttl_seconds=60)
+    vector = np.ones(4)
+    cache.store(vector, "novels", "model", 4, "答案", [], 1.0)
+
+    for _ in range(5):
+        assert cache.lookup(vector, "novels", "model", 4).answer == "答案"
+
+    assert version.calls == 1
+
+
+def test_changed_version_drops_the_answer_once_the_ttl_expires():
+    version = CountingVersion()
+    cache = make_cache(version, version_ttl_seconds=0)
+    vector = np.ones(4)
+    cache.store(vector, "novels", "model", 4, "答案", [], 1.0)
+
+    version.version = 2
+
+    assert cache.lookup(vector, "novels", "model", 4) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_catalog_version_changes_when_a_book_is_replaced(tmp_path):
+    catalog = CollectionCatalog(tmp_path / "catalog.sqlite3")
+    catalog.record_book("novels", "三体", 10, "h1")
+    catalog.record_book("novels", "球状闪电", 5, "h2")
+    before = catalog.version("novels")
+
+    # 替换章节后分片数不变，版本仍要变化
+    catalog.record_book("novels", "球状闪电", 5, "h2")
+    replaced = catalog.version("novels")
+    catalog.remove_collection("novels")
+
+    assert replaced != before
+    assert catalog.version("novels") != replaced
+    catalog.close()
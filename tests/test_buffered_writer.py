@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import time
+
+import numpy as np
+
+from app.services.local_vector_store import LocalVectorStore
+from app.services.vector_store import BufferedWriter
+
+from .conftest import DIM, make_records
+
+
+class SlowStore(LocalVectorStore):
+    """Local store whose writes take long enough for the timer and close() to overlap."""
+
+    def _write_rows(self, rows, collection_name):
+        time.sleep(0.02)
+        super()._write_rows(rows, collection_name)
+
+
+def test_close_waits_for_batches_taken_by_the_timer():
+    store = SlowStore()
+    writer = BufferedWriter(store, store.collection_name, max_rows=10_000, max_delay=0.01, max_in_flight=2)
+    vectors = np.random.default_rng(0).normal(size=(60, DIM))
+    futures = []
+    for start in range(0, 60, 3):
+        futures.append(writer.add(make_records("三体", "h1", vectors[start:start + 3], chapter_hash=str(start))))
+        time.sleep(0.005)
+
+    writer.close()
+
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert store.book_stats() == {"三体": {"h1": 60}}
+
+
+def test_flush_without_timer_writes_everything():
+    store = LocalVectorStore()
+    writer = BufferedWriter(store, store.collection_name, max_rows=4, max_delay=0)
+    future = writer.add(make_records("三体", "h1", np.ones((10, DIM))))
+
+    writer.close()
+
+    assert future.result(timeout=1) == 10
+    assert store.has_file("h1")
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from app.services.context_budget import ContextBudgeter, format_passage
+
+
+class CharTokenizer:
+    """One token per character; records how many texts were tokenized."""
+
+    def __init__(self) -> None:
+        self.texts = 0
+
+    def __call__(self, texts, add_special_tokens=False):
+        texts = [texts] if isinstance(texts, str) else texts
+        self.texts += len(texts)
+        return {"input_ids": [list(range(len(text))) for text in texts]}
+
+    def decode(self, ids):
+        return "字" * len(ids)
+
+
+def chunk(index: int, content: str, score: float = 0.9) -> dict:
+    return {
+        "book_title": "三体",
+        "chapter_title": "第一章",
+        "chunk_index": index,
+        "source_path": "/novels/三体.txt",
+        "content": content,
+        "score": score,
+    }
+
+
+def test_assemble_merges_neighbours_and_tokenizes_each_passage_once():
+    tokenizer = CharTokenizer()
+    budgeter = ContextBudgeter(tokenizer, token_budget=1000, min_relative_score=0, score_gap=0, max_overlap=4)
+    documents = [chunk(1, "乙乙乙乙丙丙丙丙"), chunk(0, "甲甲甲甲乙乙乙乙"), chunk(5, "戊戊戊戊")]
+
+    passages = budgeter.assemble(documents)
+
+    assert [passage["content"] for passage in passages] == ["甲甲甲甲乙乙乙乙丙丙丙丙", "戊戊戊戊"]
+    assert passages[0]["chunk_indices"] == [0, 1]
+    # 只对合并后的段落分词，原始分片不再分词一遍
+    assert tokenizer.texts == len(passages)
+
+
+def test_assemble_truncates_the_best_passage_to_the_budget():
+    budgeter = ContextBudgeter(CharTokenizer(), token_budget=30, min_relative_score=0, score_gap=0)
+    documents = [chunk(0, "长" * 100), chunk(3, "短")]
+
+    passages = budgeter.assemble(documents)
+
+    assert len(passages) == 1
+    assert len(format_passage(passages[0])) <= 30
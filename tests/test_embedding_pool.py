@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from app.services import embedding_pool
+from app.services.embedding_pool import READY, EmbeddingWorkerPool
+
+from .conftest import DIM
+
+
+def fake_worker(worker_id, model_path, batch_size, num_threads, pin_cores, shm_name, tasks, results) -> None:
+    """Worker without a model: each vector is filled with the text length, and "boom" fails at once."""
+    shm = SharedMemory(name=shm_name)
+    output = np.ndarray((shm.size // 4,), dtype=np.float32, buffer=shm.buf)
+    results.put((READY, worker_id, 0, None))
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job_id, texts = task
+        if "boom" in texts:
+            results.put((job_id, worker_id, 0, "ValueError('boom')"))
+            continue
+        # 让出错的任务先返回，其余任务仍在途
+        time.sleep(0.2)
+        vectors = np.repeat(np.array([len(text) for text in texts], dtype=np.float32)[:, None], DIM, axis=1)
+        output[:vectors.size] = vectors.reshape(-1)
+        results.put((job_id, worker_id, len(texts), None))
+    del output
+    shm.close()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(embedding_pool, "_worker_main", fake_worker)
+    with EmbeddingWorkerPool(num_workers=3, threads_per_worker=1, task_size=2, pin_cores=False, start_timeout=60) as pool:
+        yield pool
+
+
+def test_failed_encode_does_not_poison_the_next_call(pool):
+    with pytest.raises(RuntimeError, match="boom"):
+        pool.encode(["boom", "ab", "abc", "abcd", "abcde", "abcdef"])
+
+    texts = ["一", "二二", "三三三", "四四四四", "五五五五五"]
+    vectors = pool.encode(texts)
+
+    assert vectors.shape == (len(texts), DIM)
+    assert vectors[:, 0].tolist() == [float(len(text)) for text in texts]
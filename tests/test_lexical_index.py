@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.services.lexical_index import LexicalIndex, tokenize
+
+from .conftest import DIM, make_records
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(tmp_path / "novels.sqlite3")
+    yield index
+    index.close()
+
+
+def records(book_title: str, file_hash: str, contents: list[str], chapter_hash: str = "c1"):
+    return make_records(book_title, file_hash, np.zeros((len(contents), DIM)), contents, chapter_hash)
+
+
+def test_tokenize_uses_cjk_bigrams_and_ascii_words():
+    assert tokenize("叶文洁 Red Coast") == ["叶文", "文洁", "red", "coast"]
+
+
+def test_search_ranks_matching_chunks(index):
+    index.add(records("三体", "h1", ["叶文洁在红岸基地", "汪淼看到倒计时", "史强抽着烟"]))
+
+    result = index.search("叶文洁", top_k=3)
+
+    assert [hit.entity["content"] for hit in result.hits] == ["叶文洁在红岸基地"]
+    assert result.terms == 2
+
+
+def test_search_filters_by_book_title(index):
+    index.add(records("三体", "h1", ["罗辑是面壁者"]))
+    index.add(records("球状闪电", "h2", ["林云研究球状闪电", "罗辑不在这本书里"]))
+
+    hits = index.search("罗辑", top_k=5, book_title="三体").hits
+
+    assert [hit.entity["book_title"] for hit in hits] == ["三体"]
+
+
+def test_deletes_remove_documents_from_results(index):
+    index.add(records("三体", "h1", ["程心与云天明"], chapter_hash="a"))
+    index.add(records("三体", "h1", ["云天明的童话"], chapter_hash="b"))
+    index.add(records("球状闪电", "h2", ["云天明并不在此"]))
+
+    assert index.delete_chapters("三体", ["a"]) == 1
+    assert [hit.entity["content"] for hit in index.search("云天明", top_k=5, book_title="三体").hits] == ["云天明的童话"]
+    assert index.delete_file("h2") == 1
+    assert index.delete_book("三体") == 1
+    assert index.search("云天明", top_k=5).hits == []
+
+
+def test_optimize_merges_segments_and_keeps_results(index):
+    index.add(records("三体", "h1", ["章北海驾驶自然选择号"], chapter_hash="a"))
+    index.add(records("三体", "h1", ["自然选择号前进四"], chapter_hash="b"))
+    index.delete_chapters("三体", ["a"])
+    before = [hit.id for hit in index.search("自然选择", top_k=5).hits]
+
+    index.optimize()
+
+    assert [hit.id for hit in index.search("自然选择", top_k=5).hits] == before
+    assert index.stats()["documents"] == 1
+    assert index.stats()["posting_segments"] <= len(set(tokenize("自然选择号前进四")))
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.services.index_profiles import IndexProfile
+from app.services.local_vector_store import LocalVectorStore
+
+from .conftest import DIM, make_records
+
+
+def unit_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def store() -> LocalVectorStore:
+    return LocalVectorStore()
+
+
+def test_insert_and_search_returns_nearest(store):
+    vectors = unit_vectors(20)
+    store.insert_records(make_records("三体", "h1", vectors))
+
+    hits = store.search(vectors[7].tolist(), top_k=3)
+
+    assert len(hits) == 3
+    assert hits[0].entity["chunk_index"] == 7
+    assert hits[0].distance == pytest.approx(1.0, abs=1e-5)
+    assert [hit.distance for hit in hits] == sorted((hit.distance for hit in hits), reverse=True)
+
+
+def test_search_filters_by_book_title(store):
+    vectors = unit_vectors(20)
+    store.insert_records(make_records("三体", "h1", vectors[:10]))
+    store.insert_records(make_records("球状闪电", "h2", vectors[10:]))
+
+    hits = store.search(vectors[3].tolist(), top_k=5, book_title="球状闪电")
+
+    assert len(hits) == 5
+    assert {hit.entity["book_title"] for hit in hits} == {"球状闪电"}
+    assert store.search(vectors[3].tolist(), top_k=5, book_title="不存在") == []
+
+
+def test_upsert_replaces_rows_with_the_same_chunk_id(store):
+    vectors = unit_vectors(6)
+    store.insert_records(make_records("三体", "h1", vectors[:3]))
+    store.insert_records(make_records("三体", "h1", vectors[3:]))
+
+    records = [record for batch in store.iter_records() for record in batch]
+
+    assert len(records) == 3
+    assert store.book_stats() == {"三体": {"h1": 3}}
+    assert store.search(vectors[0].tolist(), top_k=1)[0].distance < 1.0 - 1e-5
+
+
+def test_deletes_and_indexed_lookups(store):
+    vectors = unit_vectors(12)
+    store.insert_records(make_records("三体", "h1", vectors[:4], chapter_hash="a"))
+    store.insert_records(make_records("三体", "h1", vectors[4:8], chapter_hash="b"))
+    store.insert_records(make_records("球状闪电", "h2", vectors[8:]))
+    assert store.list_books() == ["三体", "球状闪电"]
+    assert store.has_file("h1") and store.has_file("h2") and not store.has_file("h3")
+
+    assert store.delete_chapters("三体", ["a"]) == 4
+    assert store.fetch_chapters("三体") == {"b": ("第b章", 4)}
+    assert store.delete_file("h2") == 4
+    assert not store.has_file("h2")
+    assert store.list_books() == ["三体"]
+    assert store.delete_book("三体") == 4
+    assert store.delete_book("三体") == 0
+    assert store.list_books() == []
+    assert store.search(vectors[0].tolist(), top_k=3) == []
+
+
+def test_reload_restores_rows_and_tombstones(store):
+    vectors = unit_vectors(10)
+    store.insert_records(make_records("三体", "h1", vectors[:5]))
+    store.insert_records(make_records("球状闪电", "h2", vectors[5:]))
+    store.delete_file("h1")
+    store.flush()
+
+    reloaded = LocalVectorStore()
+
+    assert reloaded.list_books() == ["球状闪电"]
+    assert not reloaded.has_file("h1")
+    hits = reloaded.search(vectors[6].tolist(), top_k=1)
+    assert hits[0].entity["book_title"] == "球状闪电"
+    assert hits[0].entity["chunk_index"] == 1
+
+
+def test_compaction_keeps_indexed_lookups(store):
+    vectors = unit_vectors(8)
+    store.insert_records(make_records("三体", "h1", vectors[:6]))
+    store.insert_records(make_records("球状闪电", "h2", vectors[6:]))
+    store.delete_file("h1")
+    store.flush()
+
+    assert store.has_file("h2")
+    assert store.list_books() == ["球状闪电"]
+    assert store.search(vectors[7].tolist(), top_k=1, book_title="球状闪电")[0].entity["chunk_index"] == 1
+
+
+def test_ivf_search_matches_exact_search_when_probing_every_list(store):
+    vectors = unit_vectors(400, seed=1)
+    store.insert_records(make_records("三体", "h1", vectors[:200]))
+    store.insert_records(make_records("球状闪电", "h2", vectors[200:]))
+    query = unit_vectors(1, seed=2)[0].tolist()
+    exact = store.search(query, top_k=5, book_title="球状闪电")
+
+    store.build_index(IndexProfile.create("IVF_FLAT", {"nlist": 4}, {"nprobe": 4}))
+
+    assert (store.directory / store.collection_name / "ivf.npz").exists()
+    approximate = store.search(query, top_k=5, book_title="球状闪电")
+    assert [hit.id for hit in approximate] == [hit.id for hit in exact]
+    assert len(store.search(query, top_k=5, search_params={"nprobe": 1})) == 5
+
+
+def test_book_mask_cache_is_bounded_and_cleared_on_write(store):
+    from app.services.local_vector_store import _BOOK_MASK_CACHE_SIZE
+
+    vectors = unit_vectors(4)
+    store.insert_records(make_records("三体", "h1", vectors))
+    collection = store._get(store.collection_name)
+    for number in range(_BOOK_MASK_CACHE_SIZE + 10):
+        store.search(vectors[0].tolist(), top_k=1, book_title=f"书{number}")
+    store.search(vectors[0].tolist(), top_k=1, book_title="三体")
+
+    assert len(collection._book_masks) == _BOOK_MASK_CACHE_SIZE
+    assert next(reversed(collection._book_masks)) == "三体"
+
+    store.insert_records(make_records("球状闪电", "h2", vectors))
+
+    assert not collection._book_masks
+    assert len(store.search(vectors[0].tolist(), top_k=8, book_title="球状闪电")) == 4
+
+
+def test_iter_records_is_a_consistent_snapshot_across_compaction(store):
+    vectors = unit_vectors(10)
+    store.insert_records(make_records("三体", "h1", vectors[:6]))
+    store.insert_records(make_records("球状闪电", "h2", vectors[6:]))
+    batches = store.iter_records(batch_size=2, with_embeddings=True)
+    first = next(batches)
+
+    store.delete_file("h1")
+    store.flush()
+
+    records = first + [record for batch in batches for record in batch]
+    assert [(record.book_title, record.chunk_index) for record in records] == [
+        ("三体", index) for index in range(6)
+    ] + [("球状闪电", index) for index in range(4)]
+    assert np.allclose([record.embedding for record in records], vectors, atol=1e-6)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.text_splitter import READ_BUFFER_CHARS, ChapterTextSplitter
+
+NOVEL = (
+    "楔子：一段没有标题的开场白。\n"
+    + "".join(f"第{number}章 风起{number}\n" + "山雨欲来风满楼。" * (number * 37) + "\n" for number in range(1, 8))
+    + "第八回：尾声\n完。\n"
+)
+NO_HEADINGS = "没有任何章节标题的短文。\n" * 300
+
+
+def large_novel() -> str:
+    # 超过一次读取的缓冲区，split_file 必须跨缓冲区识别章节标题
+    parts = []
+    number = 0
+    while sum(map(len, parts)) <= 2 * READ_BUFFER_CHARS:
+        number += 1
+        parts.append(f"第{number}章 长夜{number}\n" + "月落乌啼霜满天，" * (200 + number % 50) + "\n")
+    return "前言\n" + "".join(parts)
+
+
+@pytest.fixture
+def splitter() -> ChapterTextSplitter:
+    return ChapterTextSplitter(chunk_size=120, chunk_overlap=20)
+
+
+@pytest.mark.parametrize("content", [NOVEL, NO_HEADINGS, "", large_novel()], ids=["novel", "no_headings", "empty", "large"])
+def test_split_file_matches_split(tmp_path, splitter, content):
+    path = tmp_path / "novel.txt"
+    path.write_text(content, encoding="utf-8")
+
+    assert list(splitter.split_file(path, book_title="书")) == list(
+        splitter.split(content, book_title="书", source_path=path)
+    )
+
+
+@pytest.mark.parametrize("content", [NOVEL, NO_HEADINGS, ""], ids=["novel", "no_headings", "empty"])
+@pytest.mark.parametrize("buffer_chars", [7, 64, 1000])
+def test_iter_file_chapters_matches_iter_chapters_for_any_buffer(tmp_path, splitter, content, buffer_chars):
+    path = tmp_path / "novel.txt"
+    path.write_text(content, encoding="utf-8")
+
+    assert list(splitter.iter_file_chapters(path, buffer_chars=buffer_chars)) == list(splitter.iter_chapters(content))